@@ -0,0 +1,243 @@
+"""Chain fixtures for the benchmark stand-in node.
+
+`synthetic_chain()` builds a deterministic chain with a configurable share of
+transfers touching the tracked switch and the campaign address.
+`record_chain()` captures a real block range (blocks, receipts of matching
+transactions, balances) from a live node into the same format.
+"""
+import json
+import math
+import random
+
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
+DEFAULT_TRACKED = '0x7fC04c569767840d164C9CfC80d66115B8557d3F'
+DEFAULT_CAMPAIGN = '0x00000000000000000000000000000000c0ffee01'
+DEFAULT_TOKEN = '0x00000000000000000000000000000000000070c1'
+
+# Mainnet USDC/WETH 0.05% pool and its tokens, so the bot's ETH_USD_POOL_* defaults line up
+WETH = '0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2'
+USDC = '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48'
+ETH_USD_POOL = '0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640'
+
+
+def _hash(prefix, n):
+    return '0x' + prefix + format(n, '0{}x'.format(64 - len(prefix)))
+
+
+def _address(n):
+    return '0x' + format(n, '040x')
+
+
+def _topic(address):
+    return '0x' + address[2:].lower().rjust(64, '0')
+
+
+def pool_sqrt_price_x96(eth_usd, usd_decimals=6, weth_decimals=18):
+    """slot0 sqrtPriceX96 of a stablecoin(token0)/WETH(token1) v3 pool at `eth_usd`"""
+    # raw token1 per raw token0 = 10**(weth_decimals - usd_decimals) / eth_usd
+    return math.isqrt(10 ** (weth_decimals - usd_decimals) * 2 ** 192 // eth_usd)
+
+
+def synthetic_chain(blocks=200, txs_per_block=150, start_block=19_000_000, tracked=DEFAULT_TRACKED,
+                    campaign=DEFAULT_CAMPAIGN, token=DEFAULT_TOKEN, hit_rate=0.02, token_share=0.5, seed=7,
+                    eth_usd=2000, internal_rate=0.0):
+    """Deterministic fixture; `hit_rate` is the share of txs touching the switch or campaign.
+
+    `internal_rate` is the share of txs that pay ETH to the switch or campaign
+    from inside a contract call; every fourth of those reverts its payout.
+    """
+    rng = random.Random(seed)
+    fixture = {
+        'head': start_block + blocks - 1,
+        'blocks': {},
+        'receipts': {},
+        'balances': {campaign.lower(): 5 * 10 ** 18},
+        'tokens': {
+            token.lower(): {'symbol': 'BENCH', 'decimals': 6, 'balances': {campaign.lower(): 10 ** 9}},
+            WETH.lower(): {'symbol': 'WETH', 'decimals': 18},
+            USDC.lower(): {'symbol': 'USDC', 'decimals': 6},
+        },
+        'pools': {ETH_USD_POOL.lower(): {'token0': USDC, 'token1': WETH, 'sqrt_price_x96': pool_sqrt_price_x96(eth_usd)}},
+        'traces': {},
+    }
+    internal_count = 0
+
+    for offset in range(blocks):
+        number = start_block + offset
+        block_hash = _hash('b', number)
+        transactions = []
+
+        for index in range(txs_per_block):
+            tx_hash = _hash('a', number * 10_000 + index)
+            sender = _address(rng.randrange(1, 2 ** 159))
+            recipient = _address(rng.randrange(1, 2 ** 159))
+            value = rng.randrange(10 ** 15, 10 ** 19)
+            logs = []
+
+            internal_to = None
+            if internal_rate and rng.random() < internal_rate:
+                # A router/multisig forwards the value: nothing watched at the top level
+                internal_to = tracked if rng.random() < 0.5 else campaign
+            elif rng.random() < hit_rate:
+                kind = rng.random()
+                if kind < token_share:
+                    # Switch pays out a token: tx from the switch to the token contract
+                    counterparty = _address(rng.randrange(1, 2 ** 159))
+                    sender, recipient, value = tracked, token, 0
+                    logs.append({
+                        'address': token,
+                        'topics': [TRANSFER_TOPIC, _topic(tracked), _topic(counterparty)],
+                        'data': '0x' + format(rng.randrange(10 ** 6, 10 ** 10), '064x'),
+                        'logIndex': hex(index),
+                    })
+                elif kind < (1 + token_share) / 2:
+                    recipient = tracked
+                else:
+                    recipient = campaign
+
+            transactions.append({
+                'hash': tx_hash,
+                'blockHash': block_hash,
+                'blockNumber': hex(number),
+                'transactionIndex': hex(index),
+                'from': sender,
+                'to': recipient,
+                'value': hex(value),
+                'gas': '0x5208',
+                'gasPrice': hex(rng.randrange(10 ** 9, 10 ** 11)),
+                'nonce': hex(rng.randrange(0, 5000)),
+                'input': '0x' if not logs else '0xa9059cbb' + '00' * 64,
+                'type': '0x0',
+                'v': '0x25',
+                'r': _hash('c', index),
+                's': _hash('d', index),
+            })
+
+            if internal_to:
+                router = _address(rng.randrange(1, 2 ** 159))
+                recipient = router
+                reverted = internal_count % 4 == 3
+                internal_count += 1
+                top = {'callType': 'call', 'from': sender, 'to': router, 'value': hex(value), 'gas': '0x30000', 'input': '0x'}
+                payout = {'callType': 'call', 'from': router, 'to': internal_to, 'value': hex(value), 'gas': '0x8fc', 'input': '0x'}
+                common = {'blockHash': block_hash, 'blockNumber': number, 'transactionHash': tx_hash,
+                          'transactionPosition': index, 'type': 'call'}
+                fixture['traces'][tx_hash] = [
+                    dict(common, action=top, result={'gasUsed': '0x9000', 'output': '0x'}, subtraces=1, traceAddress=[]),
+                    dict(common, action=payout, subtraces=0, traceAddress=[0],
+                         **({'error': 'Reverted'} if reverted else {'result': {'gasUsed': '0x0', 'output': '0x'}})),
+                ]
+
+            for log in logs:
+                log.update({
+                    'blockNumber': hex(number),
+                    'blockHash': block_hash,
+                    'transactionHash': tx_hash,
+                    'transactionIndex': hex(index),
+                    'removed': False,
+                })
+            fixture['receipts'][tx_hash] = {
+                'transactionHash': tx_hash,
+                'transactionIndex': hex(index),
+                'blockHash': block_hash,
+                'blockNumber': hex(number),
+                'from': sender,
+                'to': recipient,
+                'cumulativeGasUsed': hex(21000 * (index + 1)),
+                'gasUsed': '0x5208',
+                'effectiveGasPrice': '0x3b9aca00',
+                'contractAddress': None,
+                'logs': logs,
+                'logsBloom': '0x' + '00' * 256,
+                'status': '0x1',
+                'type': '0x0',
+            }
+
+        fixture['blocks'][str(number)] = {
+            'number': hex(number),
+            'hash': block_hash,
+            'parentHash': _hash('b', number - 1),
+            'timestamp': hex(1_700_000_000 + offset * 12),
+            'miner': _address(1),
+            'difficulty': '0x0',
+            'totalDifficulty': '0x0',
+            'extraData': '0x',
+            'size': hex(500 + 110 * txs_per_block),
+            'gasLimit': hex(30_000_000),
+            'gasUsed': hex(21000 * txs_per_block),
+            'baseFeePerGas': '0x3b9aca00',
+            'nonce': '0x0000000000000000',
+            'sha3Uncles': _hash('e', 0),
+            'logsBloom': '0x' + '00' * 256,
+            'stateRoot': _hash('e', 1),
+            'transactionsRoot': _hash('e', 2),
+            'receiptsRoot': _hash('e', 3),
+            'mixHash': _hash('e', 4),
+            'transactions': transactions,
+            'uncles': [],
+        }
+
+    return fixture
+
+
+def record_chain(rpc_url, from_block, to_block, watched_addresses, token_addresses=()):
+    """Record a block range from a live node; only receipts of watched txs are kept"""
+    import requests
+
+    session = requests.Session()
+    request_id = 0
+
+    def call(method, params):
+        nonlocal request_id
+        request_id += 1
+        response = session.post(rpc_url, json={'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params},
+                                timeout=60).json()
+        if 'error' in response:
+            raise RuntimeError(f"{method} failed: {response['error']}")
+        return response['result']
+
+    watched = {addr.lower() for addr in watched_addresses}
+    fixture = {'head': to_block, 'blocks': {}, 'receipts': {}, 'balances': {}, 'tokens': {}}
+
+    for number in range(from_block, to_block + 1):
+        block = call('eth_getBlockByNumber', [hex(number), True])
+        fixture['blocks'][str(number)] = block
+        for tx in block['transactions']:
+            if (tx.get('to') or '').lower() in watched or (tx.get('from') or '').lower() in watched:
+                fixture['receipts'][tx['hash']] = call('eth_getTransactionReceipt', [tx['hash']])
+
+    # Logs touching watched addresses (e.g. campaign token deposits) and their receipts
+    for address in watched:
+        for topics in ([TRANSFER_TOPIC, None, _topic(address)], [TRANSFER_TOPIC, _topic(address)]):
+            for log in call('eth_getLogs', [{'fromBlock': hex(from_block), 'toBlock': hex(to_block), 'topics': topics}]):
+                if log['transactionHash'] not in fixture['receipts']:
+                    fixture['receipts'][log['transactionHash']] = call('eth_getTransactionReceipt', [log['transactionHash']])
+
+    for address in watched:
+        fixture['balances'][address] = int(call('eth_getBalance', [address, hex(to_block)]), 16)
+
+    for token in token_addresses:
+        symbol = call('eth_call', [{'to': token, 'data': '0x95d89b41'}, hex(to_block)])
+        decimals = call('eth_call', [{'to': token, 'data': '0x313ce567'}, hex(to_block)])
+        from eth_abi import decode
+        fixture['tokens'][token.lower()] = {
+            'symbol': decode(['string'], bytes.fromhex(symbol[2:]))[0],
+            'decimals': int(decimals, 16),
+            'balances': {
+                address: int(call('eth_call', [{'to': token, 'data': '0x70a08231' + _topic(address)[2:]}, hex(to_block)]), 16)
+                for address in watched
+            },
+        }
+
+    return fixture
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(fixture, path):
+    with open(path, 'w') as f:
+        json.dump(fixture, f)
@@ -0,0 +1,231 @@
+"""Offline scanner benchmark.
+
+Replays a recorded (or synthetic) chain through a local JSON-RPC stand-in and a
+fake Telegram Bot API, drives check_blocks() and the campaign summary path of
+bot.py end to end, and reports throughput, RPC calls per block,
+notifications/sec, peak RSS and peak traced memory per block (a separate
+tracemalloc replay, so tracing overhead stays out of the timings).
+
+    python bench/run_benchmark.py --blocks 200 --txs-per-block 150
+    python bench/run_benchmark.py --fixture chain.json --output result.json --baseline baseline.json
+    python bench/run_benchmark.py record --rpc-url https://... --from-block N --to-block M --out chain.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fixtures  # noqa: E402
+import stubs  # noqa: E402
+
+
+def start_stand_ins(fixture, telegram_latency):
+    """Run both stand-in servers in a child process so they don't skew RSS or CPU numbers"""
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=stubs.serve_forever, args=(fixture, telegram_latency, ready), daemon=True)
+    process.start()
+    rpc_port, telegram_port = ready.get(timeout=60)
+    return process, f'http://127.0.0.1:{rpc_port}', f'http://127.0.0.1:{telegram_port}'
+
+
+def fetch_stats(base_url):
+    with urllib.request.urlopen(f'{base_url}/__stats', timeout=10) as response:
+        return json.loads(response.read())
+
+
+def bot_env(rpc_url, telegram_url, campaign, data_dir):
+    """Environment pointing the bot at the stand-ins, with all of its state under `data_dir`"""
+    return {
+        'ETHEREUM_RPC_URL': rpc_url,
+        'TELEGRAM_API_URL': f'{telegram_url}/bot',
+        'TELEGRAM_BOT_TOKEN': '123456:bench',
+        'TELEGRAM_CHAT_ID': '-1001,-1002',
+        'CAMPAIGN_ADDRESS': campaign,
+        'STATIC_ETH_PRICE': '2000',
+        'START_BACKGROUND_WORKERS': 'false',
+        'DIGEST_WINDOW_SECONDS': '0',
+        'TELEGRAM_RATE_LIMIT': '0',  # the fake Bot API has no flood limits; measure the pipeline itself
+        'LEDGER_DB_PATH': os.path.join(data_dir, 'ledger.db'),
+        'WALLETS_CONFIG_PATH': os.path.join(data_dir, 'wallets.json'),
+        'CAMPAIGNS_CONFIG_PATH': os.path.join(data_dir, 'campaigns.json'),
+        'DELIVERY_DB_PATH': os.path.join(data_dir, 'deliveries.db'),
+        'STATE_SNAPSHOT_PATH': os.path.join(data_dir, 'bot_state.json'),
+    }
+
+
+def import_bot(rpc_url, telegram_url, campaign, data_dir, extra_env):
+    os.environ.update(bot_env(rpc_url, telegram_url, campaign, data_dir))
+    os.environ.update(extra_env)
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, REPO_ROOT)
+
+    import logging
+    import bot
+    logging.getLogger().setLevel(logging.WARNING)
+    return bot
+
+
+def measure_block_memory(bot, block_numbers):
+    """Peak Python allocation while processing each block, replayed with a ledger-only snapshot"""
+    tracking = bot.tracking
+    config = bot.TrackingConfig(dict(tracking.wallets), tracking.excluded, tracking.campaign_addresses, live=False)
+    peaks = []
+    tracemalloc.start()
+    try:
+        for number in block_numbers:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            bot.process_block(number, config)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def run(args):
+    if args.fixture:
+        fixture = fixtures.load(args.fixture)
+    else:
+        fixture = fixtures.synthetic_chain(blocks=args.blocks, txs_per_block=args.txs_per_block, hit_rate=args.hit_rate,
+                                           internal_rate=args.internal_rate)
+
+    block_numbers = sorted(int(number) for number in fixture['blocks'])
+    first_block, last_block = block_numbers[0], block_numbers[-1]
+    campaign = args.campaign or fixtures.DEFAULT_CAMPAIGN
+
+    process, rpc_url, telegram_url = start_stand_ins(fixture, args.telegram_latency)
+    extra_env = dict(item.split('=', 1) for item in args.env)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        bot = import_bot(rpc_url, telegram_url, campaign, data_dir, extra_env)
+        rpc_before = sum(fetch_stats(rpc_url).values())
+        telegram_before = fetch_stats(telegram_url)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # Scan path: check_blocks -> process_block -> process_transaction -> handlers -> notify
+        # (async_check_blocks on the event loop with --env ASYNC_MODE=true)
+        bot.last_checked = first_block - 1
+        scan_started = time.perf_counter()
+        if bot.ASYNC_MODE:
+            bot.async_runtime.call(bot.async_check_blocks())
+        else:
+            bot.check_blocks()
+        bot.notification_coalescer.flush()
+        bot.async_runtime.drain(timeout=60)
+        scan_seconds = time.perf_counter() - scan_started
+        bot.ledger.flush(timeout=60)
+        ledger_rows = bot.ledger.rows_written
+
+        rpc_after_scan = sum(fetch_stats(rpc_url).values())
+        telegram_after_scan = fetch_stats(telegram_url)
+
+        # Summary path: progress from tracker, chart render, photo + message per chat
+        summary_started = time.perf_counter()
+        for campaign in bot.campaigns.values():
+            if bot.ASYNC_MODE:
+                bot.async_runtime.call(bot.async_send_campaign_summary(campaign))
+            else:
+                bot.send_campaign_summary(campaign)
+        summary_seconds = time.perf_counter() - summary_started
+
+        block_peaks = measure_block_memory(bot, block_numbers[:args.memory_blocks]) if args.memory_blocks else [0]
+
+        blocks = last_block - first_block + 1
+        messages = telegram_after_scan.get('sendMessage', 0) - telegram_before.get('sendMessage', 0)
+        result = {
+            'blocks': blocks,
+            'transactions': sum(len(block['transactions']) for block in fixture['blocks'].values()),
+            'scan_seconds': round(scan_seconds, 3),
+            'blocks_per_sec': round(blocks / scan_seconds, 2),
+            'rpc_calls': rpc_after_scan - rpc_before,
+            'rpc_calls_per_block': round((rpc_after_scan - rpc_before) / blocks, 3),
+            'notifications': messages,
+            'notifications_per_sec': round(messages / scan_seconds, 2),
+            'ledger_rows': ledger_rows,
+            'summary_seconds': round(summary_seconds, 3),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'rss_growth_mb': round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1),
+            'block_peak_kb_mean': round(sum(block_peaks) / len(block_peaks) / 1024, 1),
+            'block_peak_kb_max': round(max(block_peaks) / 1024, 1),
+            'rpc_calls_by_method': fetch_stats(rpc_url),
+        }
+        bot.shutdown()  # while data_dir still exists for the state snapshot
+
+    process.terminate()
+    report(result, args.baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+def report(result, baseline_path=None):
+    baseline = None
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    print(f"\n{'metric':<24}{'value':>14}" + (f"{'baseline':>14}{'change':>10}" if baseline else ''))
+    for key, value in result.items():
+        if isinstance(value, dict):
+            continue
+        line = f"{key:<24}{value:>14}"
+        if baseline and isinstance(baseline.get(key), (int, float)) and baseline[key]:
+            change = (value - baseline[key]) / baseline[key] * 100
+            line += f"{baseline[key]:>14}{change:>+9.1f}%"
+        print(line)
+    print('\nRPC calls by method: ' + ', '.join(f'{k}={v}' for k, v in sorted(result['rpc_calls_by_method'].items())))
+
+
+def record(args):
+    watched = args.watch or [fixtures.DEFAULT_TRACKED]
+    fixture = fixtures.record_chain(args.rpc_url, args.from_block, args.to_block, watched, args.token)
+    fixtures.save(fixture, args.out)
+    print(f"Recorded {len(fixture['blocks'])} blocks and {len(fixture['receipts'])} receipts to {args.out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+
+    record_parser = subparsers.add_parser('record', help='record a block range from a live node')
+    record_parser.add_argument('--rpc-url', required=True)
+    record_parser.add_argument('--from-block', type=int, required=True)
+    record_parser.add_argument('--to-block', type=int, required=True)
+    record_parser.add_argument('--watch', action='append', help='tracked/campaign address (repeatable)')
+    record_parser.add_argument('--token', action='append', default=[], help='token contract to record (repeatable)')
+    record_parser.add_argument('--out', required=True)
+
+    parser.add_argument('--fixture', help='recorded fixture JSON (default: synthetic chain)')
+    parser.add_argument('--blocks', type=int, default=200, help='synthetic chain length')
+    parser.add_argument('--txs-per-block', type=int, default=150)
+    parser.add_argument('--hit-rate', type=float, default=0.02, help='share of txs touching watched addresses')
+    parser.add_argument('--internal-rate', type=float, default=0.0,
+                        help='share of txs paying watched addresses from inside a contract call (see INTERNAL_TRANSFERS)')
+    parser.add_argument('--campaign', help='campaign address (default: synthetic campaign)')
+    parser.add_argument('--telegram-latency', type=float, default=0.0, help='seconds added to each Bot API call')
+    parser.add_argument('--memory-blocks', type=int, default=20,
+                        help='blocks replayed under tracemalloc for per-block peak memory (0 = skip)')
+    parser.add_argument('--env', action='append', default=[], help='extra KEY=VALUE for the bot (repeatable)')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        record(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
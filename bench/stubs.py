@@ -0,0 +1,386 @@
+"""Local stand-ins for the Ethereum JSON-RPC node and the Telegram Bot API.
+
+Both servers answer from in-memory data only, so the bot can be driven end to
+end without network access. Call counts are exposed at GET /__stats.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import decode, encode
+
+MULTICALL3_ADDRESS = '0xca11bde05977b3631167028862be2a173976ca11'
+
+SELECTOR_SYMBOL = '0x95d89b41'
+SELECTOR_DECIMALS = '0x313ce567'
+SELECTOR_BALANCE_OF = '0x70a08231'
+SELECTOR_AGGREGATE3 = '0x82ad56cb'
+SELECTOR_GET_ETH_BALANCE = '0x4d2301cc'
+SELECTOR_TOKEN0 = '0x0dfe1681'
+SELECTOR_TOKEN1 = '0xd21220a7'
+SELECTOR_SLOT0 = '0x3850c7bd'
+SELECTOR_GET_RESERVES = '0x0902f1ac'
+
+
+class RpcError(Exception):
+    def __init__(self, message, code=-32000):
+        super().__init__(message)
+        self.code = code
+
+
+class RecordedChain:
+    """JSON-RPC method implementations backed by a fixture dict.
+
+    Fixture layout (all values in raw JSON-RPC hex form):
+        head: int
+        blocks: {number: block with full transactions}
+        receipts: {tx_hash: receipt}
+        balances: {address: int}
+        tokens: {address: {symbol, decimals, balances: {owner: int}}}
+        pools: optional {address: {token0, token1, sqrt_price_x96 | reserves: [r0, r1]}}
+               Uniswap v3 pools / v2 pairs answering token0, token1, slot0, getReserves
+        max_logs: optional int; larger eth_getLogs results fail like a
+                  hosted provider's result cap
+        traces: optional {tx_hash: [Parity-style trace, ...]}; transactions
+                without recorded traces get a single top-level call trace
+    """
+
+    def __init__(self, fixture):
+        self.head = fixture['head']
+        self.blocks = {int(number): block for number, block in fixture['blocks'].items()}
+        self.receipts = {tx_hash.lower(): receipt for tx_hash, receipt in fixture['receipts'].items()}
+        self.balances = {addr.lower(): value for addr, value in fixture.get('balances', {}).items()}
+        self.tokens = {addr.lower(): info for addr, info in fixture.get('tokens', {}).items()}
+        self.pools = {addr.lower(): info for addr, info in fixture.get('pools', {}).items()}
+        self.max_logs = fixture.get('max_logs')
+        self.traces = {tx_hash.lower(): traces for tx_hash, traces in fixture.get('traces', {}).items()}
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._raw_blocks = {}
+
+        self.logs = []
+        for receipt in self.receipts.values():
+            self.logs.extend(receipt['logs'])
+        self.logs.sort(key=lambda log: (int(log['blockNumber'], 16), int(log['logIndex'], 16)))
+
+    def count(self, method):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def raw_block(self, number):
+        """Pre-serialised block JSON, so the stub isn't the bottleneck"""
+        if number not in self._raw_blocks:
+            self._raw_blocks[number] = json.dumps(self.blocks[number])
+        return self._raw_blocks[number]
+
+    def handle(self, method, params):
+        self.count(method)
+        handler = getattr(self, 'rpc_' + method, None)
+        if handler is None:
+            raise RpcError(f'the method {method} does not exist/is not available', -32601)
+        return handler(*params)
+
+    def rpc_web3_clientVersion(self):
+        return 'recorded-chain/1.0'
+
+    def rpc_eth_chainId(self):
+        return '0x1'
+
+    def rpc_net_version(self):
+        return '1'
+
+    def rpc_eth_blockNumber(self):
+        return hex(self.head)
+
+    def rpc_eth_getBlockByNumber(self, number, full_transactions=False):
+        block = self.blocks.get(self._block_number(number))
+        if block is None or full_transactions:
+            return block
+        return dict(block, transactions=[tx['hash'] for tx in block['transactions']])
+
+    def rpc_eth_getTransactionReceipt(self, tx_hash):
+        return self.receipts.get(tx_hash.lower())
+
+    def rpc_eth_getBalance(self, address, block='latest'):
+        return hex(self.balances.get(address.lower(), 0))
+
+    def rpc_eth_getCode(self, address, block='latest'):
+        if address.lower() == MULTICALL3_ADDRESS or address.lower() in self.tokens or address.lower() in self.pools:
+            return '0x6001'
+        return '0x'
+
+    def rpc_eth_getLogs(self, log_filter):
+        from_block = self._block_number(log_filter.get('fromBlock', 'latest'))
+        to_block = self._block_number(log_filter.get('toBlock', 'latest'))
+        addresses = log_filter.get('address')
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        addresses = {addr.lower() for addr in addresses} if addresses else None
+        topics = log_filter.get('topics') or []
+
+        matches = []
+        for log in self.logs:
+            number = int(log['blockNumber'], 16)
+            if number < from_block or number > to_block:
+                continue
+            if addresses and log['address'].lower() not in addresses:
+                continue
+            if not self._topics_match(log['topics'], topics):
+                continue
+            matches.append(log)
+        if self.max_logs is not None and len(matches) > self.max_logs:
+            raise RpcError(f'query returned more than {self.max_logs} results', -32005)
+        return matches
+
+    def rpc_trace_block(self, number):
+        block = self.blocks.get(self._block_number(number))
+        if block is None:
+            return None
+        traces = []
+        for tx in block['transactions']:
+            traces.extend(self.transaction_traces(tx))
+        return traces
+
+    def rpc_trace_transaction(self, tx_hash):
+        for block in self.blocks.values():
+            for tx in block['transactions']:
+                if tx['hash'].lower() == tx_hash.lower():
+                    return self.transaction_traces(tx)
+        return None
+
+    def rpc_trace_filter(self, trace_filter):
+        """fromAddress/toAddress are ANDed when both are given, as in OpenEthereum"""
+        from_block = self._block_number(trace_filter.get('fromBlock', 'latest'))
+        to_block = self._block_number(trace_filter.get('toBlock', 'latest'))
+        senders = {addr.lower() for addr in trace_filter.get('fromAddress') or []}
+        recipients = {addr.lower() for addr in trace_filter.get('toAddress') or []}
+
+        matches = []
+        for number in range(from_block, to_block + 1):
+            for trace in self.rpc_trace_block(number) or []:
+                sender, recipient = self._trace_parties(trace)
+                if senders and sender not in senders:
+                    continue
+                if recipients and recipient not in recipients:
+                    continue
+                matches.append(trace)
+        return matches
+
+    def transaction_traces(self, tx):
+        """Recorded traces, or a synthesised top-level call for plain transactions"""
+        recorded = self.traces.get(tx['hash'].lower())
+        if recorded is not None:
+            return recorded
+        return [{
+            'action': {'callType': 'call', 'from': tx['from'], 'to': tx['to'], 'value': tx['value'],
+                       'gas': tx['gas'], 'input': tx['input']},
+            'blockHash': tx['blockHash'],
+            'blockNumber': int(tx['blockNumber'], 16),
+            'result': {'gasUsed': '0x5208', 'output': '0x'},
+            'subtraces': 0,
+            'traceAddress': [],
+            'transactionHash': tx['hash'],
+            'transactionPosition': int(tx['transactionIndex'], 16),
+            'type': 'call',
+        }]
+
+    @staticmethod
+    def _trace_parties(trace):
+        action = trace['action']
+        if trace['type'] == 'suicide':
+            return action['address'].lower(), action['refundAddress'].lower()
+        if trace['type'] == 'create':
+            return action['from'].lower(), ((trace.get('result') or {}).get('address') or '').lower()
+        return action['from'].lower(), (action.get('to') or '').lower()
+
+    def rpc_eth_call(self, call, block='latest'):
+        return '0x' + self._call(call['to'].lower(), call.get('data') or call.get('input')).hex()
+
+    def _call(self, target, data):
+        selector, args = data[:10], bytes.fromhex(data[10:])
+
+        if target == MULTICALL3_ADDRESS:
+            if selector == SELECTOR_AGGREGATE3:
+                (calls,) = decode(['(address,bool,bytes)[]'], args)
+                results = []
+                for sub_target, allow_failure, calldata in calls:
+                    try:
+                        results.append((True, self._call(sub_target.lower(), '0x' + calldata.hex())))
+                    except RpcError:
+                        if not allow_failure:
+                            raise
+                        results.append((False, b''))
+                return encode(['(bool,bytes)[]'], [results])
+            if selector == SELECTOR_GET_ETH_BALANCE:
+                (address,) = decode(['address'], args)
+                return encode(['uint256'], [self.balances.get(address.lower(), 0)])
+
+        token = self.tokens.get(target)
+        if token is not None:
+            if selector == SELECTOR_SYMBOL:
+                return encode(['string'], [token['symbol']])
+            if selector == SELECTOR_DECIMALS:
+                return encode(['uint8'], [token['decimals']])
+            if selector == SELECTOR_BALANCE_OF:
+                (owner,) = decode(['address'], args)
+                return encode(['uint256'], [token.get('balances', {}).get(owner.lower(), 0)])
+
+        pool = self.pools.get(target)
+        if pool is not None:
+            if selector == SELECTOR_TOKEN0:
+                return encode(['address'], [pool['token0']])
+            if selector == SELECTOR_TOKEN1:
+                return encode(['address'], [pool['token1']])
+            if selector == SELECTOR_SLOT0 and 'sqrt_price_x96' in pool:
+                return encode(['uint160', 'int24', 'uint16', 'uint16', 'uint16', 'uint8', 'bool'],
+                              [pool['sqrt_price_x96'], 0, 0, 1, 1, 0, True])
+            if selector == SELECTOR_GET_RESERVES and 'reserves' in pool:
+                return encode(['uint112', 'uint112', 'uint32'], [*pool['reserves'], 0])
+
+        raise RpcError('execution reverted')
+
+    def _block_number(self, tag):
+        if isinstance(tag, int):
+            return tag
+        if tag in ('latest', 'safe', 'finalized', 'pending'):
+            return self.head
+        if tag == 'earliest':
+            return 0
+        return int(tag, 16)
+
+    @staticmethod
+    def _topics_match(log_topics, wanted):
+        for position, topic in enumerate(wanted):
+            if topic is None:
+                continue
+            if position >= len(log_topics):
+                return False
+            options = topic if isinstance(topic, list) else [topic]
+            if log_topics[position].lower() not in {option.lower() for option in options}:
+                return False
+        return True
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle on, every keep-alive
+    # reply after the first stalls ~40 ms on the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, status=200):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+
+class _RpcHandler(_JsonHandler):
+    chain = None
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            self._reply(self.chain.calls)
+        else:
+            self._reply({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        request = json.loads(self._body())
+        if isinstance(request, list):
+            self._reply([self._dispatch(item) for item in request])
+            return
+
+        if request.get('method') == 'eth_getBlockByNumber' and request['params'][1]:
+            # Serve full blocks from the pre-serialised cache
+            self.chain.count('eth_getBlockByNumber')
+            number = self.chain._block_number(request['params'][0])
+            if number in self.chain.blocks:
+                raw = self.chain.raw_block(number)
+                self._reply(f'{{"jsonrpc":"2.0","id":{json.dumps(request["id"])},"result":{raw}}}'.encode())
+                return
+
+        self._reply(self._dispatch(request))
+
+    def _dispatch(self, request):
+        try:
+            result = self.chain.handle(request['method'], request.get('params') or [])
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+        except RpcError as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': e.code, 'message': str(e)}}
+
+
+class FakeTelegram:
+    """Minimal Bot API: accepts sends, records them and optionally adds latency"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._message_id = 0
+
+    def handle(self, method):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self._message_id += 1
+            message_id = self._message_id
+
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        if method.startswith('send'):
+            return {'message_id': message_id, 'date': int(time.time()),
+                    'chat': {'id': 1, 'type': 'group', 'title': 'bench'}, 'text': ''}
+        return True
+
+
+class _TelegramHandler(_JsonHandler):
+    telegram = None
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            self._reply(self.telegram.calls)
+            return
+        self.do_POST()
+
+    def do_POST(self):
+        self._body()
+        method = self.path.rstrip('/').rsplit('/', 1)[-1]
+        self._reply({'ok': True, 'result': self.telegram.handle(method)})
+
+
+def _serve(handler_cls, attrs):
+    handler = type(handler_cls.__name__, (handler_cls,), attrs)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_rpc_server(fixture):
+    """Serve a fixture over JSON-RPC; returns (server, chain)"""
+    chain = RecordedChain(fixture)
+    return _serve(_RpcHandler, {'chain': chain}), chain
+
+
+def start_telegram_server(latency=0.0):
+    """Serve a fake Bot API; returns (server, telegram)"""
+    telegram = FakeTelegram(latency)
+    return _serve(_TelegramHandler, {'telegram': telegram}), telegram
+
+
+def serve_forever(fixture, telegram_latency, ready_queue):
+    """Child-process entry point: start both servers and report their ports"""
+    rpc_server, _ = start_rpc_server(fixture)
+    telegram_server, _ = start_telegram_server(telegram_latency)
+    ready_queue.put((rpc_server.server_address[1], telegram_server.server_address[1]))
+    threading.Event().wait()
@@ -0,0 +1,321 @@
+"""Webhook load test.
+
+Boots `gunicorn bot:app` against the stand-in node and Bot API (ETH price from
+the stand-in's on-chain pool), POSTs generated Telegram `Update` payloads to
+/webhook from a closed loop of concurrent clients, and reports throughput,
+p50/p95/p99 latency and error rate per gunicorn worker configuration and
+concurrency level, overall and per command.
+
+    python bench/webhook_load.py --requests 400 --concurrency 1,8,32
+    python bench/webhook_load.py --workers sync:1 --workers gthread:2x8 --mix help=5,staking=3,campaign=1,status=1
+    python bench/webhook_load.py --telegram-latency 0.2 --output load.json
+    python bench/webhook_load.py --telegram-rate-limit 0   # lift the Bot API budget
+
+Worker configs are CLASS:WORKERS[xTHREADS], e.g. sync:2 or gthread:1x8.
+Replies go through the bot's Telegram budget at the production default of
+TELEGRAM_RATE_LIMIT calls/s per worker process unless --telegram-rate-limit
+says otherwise; the budget in effect is reported with the results.
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fixtures  # noqa: E402
+from run_benchmark import bot_env, fetch_stats, start_stand_ins  # noqa: E402
+
+DEFAULT_MIX = 'help=4,staking=3,campaign=2,status=1'
+DEFAULT_WORKERS = ['sync:1', 'sync:4', 'gthread:1x8', 'gthread:4x4']
+DEFAULT_TELEGRAM_RATE_LIMIT = 25.0  # bot.py's TELEGRAM_RATE_LIMIT default, the budget production replies pay
+
+CHAT_ID = -1001  # first chat of the bench TELEGRAM_CHAT_ID, so /campaign picks its campaign
+ADMIN_ID = 4242  # listed in ADMIN_USER_IDS for admin-only commands such as /status
+BOT_USERNAME = 'bench_bot'  # getMe of the fake Bot API
+
+# Admin-only handlers; everything else is sent by ordinary members
+ADMIN_COMMANDS = {'status', 'config', 'ledger', 'top', 'stats', 'switches', 'uptime', 'deadletters'}
+
+
+def parse_mix(spec):
+    """'help=4,status=1' -> [('help', 4.0), ('status', 1.0)]"""
+    mix = []
+    for item in spec.split(','):
+        command, _, weight = item.strip().partition('=')
+        mix.append((command.lstrip('/'), float(weight or 1)))
+    return mix
+
+
+def parse_workers(spec):
+    """'gthread:2x8' -> ('gthread', 2, 8); 'sync:4' -> ('sync', 4, 1)"""
+    worker_class, _, shape = spec.partition(':')
+    workers, _, threads = (shape or '1').partition('x')
+    return worker_class, int(workers), int(threads or 1)
+
+
+def telegram_updates(mix, seed=11):
+    """Endless stream of (command, Update JSON) drawn from the weighted mix, shaped like real group messages"""
+    rng = random.Random(seed)
+    commands, weights = zip(*mix)
+    update_id = 500_000_000
+    while True:
+        update_id += 1
+        command = rng.choices(commands, weights)[0]
+        # Group members often tap the /cmd@bot form from the command menu
+        text = f'/{command}@{BOT_USERNAME}' if rng.random() < 0.3 else f'/{command}'
+        user_id = ADMIN_ID if command in ADMIN_COMMANDS else rng.randrange(10 ** 8, 10 ** 10)
+        yield command, {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id % 10 ** 6,
+                'date': int(time.time()),
+                'chat': {'id': CHAT_ID, 'type': 'supergroup', 'title': 'Bench'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': 'Load', 'username': f'user{user_id}',
+                         'language_code': 'en'},
+                'text': text,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}],
+            },
+        }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(worker_config, env, log_path, boot_timeout=120):
+    """Start gunicorn on a free port and wait until the app answers; returns (process, base_url)"""
+    worker_class, workers, threads = worker_config
+    port = free_port()
+    command = [
+        sys.executable, '-m', 'gunicorn', 'bot:app',
+        '--bind', f'127.0.0.1:{port}',
+        '--worker-class', worker_class,
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--timeout', '120',
+        '--chdir', REPO_ROOT,
+    ]
+    log = open(log_path, 'w')
+    process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+
+    deadline = time.monotonic() + boot_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            if requests.get(f'{base_url}/', timeout=5).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+
+    stop_gunicorn(process)
+    with open(log_path) as f:
+        tail = f.read()[-2000:]
+    raise RuntimeError(f"gunicorn {worker_config} did not come up:\n{tail}")
+
+
+def stop_gunicorn(process, timeout=60):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def latency_summary(samples):
+    ordered = sorted(samples)
+    return {
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 1),
+        'max_ms': round(ordered[-1] * 1000, 1) if ordered else 0.0,
+    }
+
+
+def drive(base_url, updates, total, concurrency, timeout):
+    """Closed loop: `concurrency` clients POST `total` updates; returns [(command, seconds, error or None)]"""
+    lock = threading.Lock()
+    results = []
+    local = threading.local()
+
+    def client():
+        local.session = getattr(local, 'session', None) or requests.Session()
+        while True:
+            with lock:
+                if len(results) + client.in_flight >= total:
+                    return
+                client.in_flight += 1
+                command, payload = next(updates)
+
+            started = time.perf_counter()
+            error = None
+            try:
+                response = local.session.post(f'{base_url}/webhook', json=payload, timeout=timeout)
+                if response.status_code != 200:
+                    error = f'HTTP {response.status_code}'
+            except requests.Timeout:
+                error = 'timeout'
+            except requests.RequestException as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - started
+
+            with lock:
+                client.in_flight -= 1
+                results.append((command, elapsed, error))
+
+    client.in_flight = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client) for _ in range(concurrency)]:
+            future.result()
+    return results
+
+
+def summarize(results, seconds, replies):
+    errors = {}
+    for _, _, error in results:
+        if error:
+            errors[error] = errors.get(error, 0) + 1
+
+    by_command = {}
+    for command, elapsed, error in results:
+        if not error:
+            by_command.setdefault(command, []).append(elapsed)
+
+    ok = [elapsed for _, elapsed, error in results if not error]
+    return {
+        'requests': len(results),
+        'seconds': round(seconds, 3),
+        'throughput_rps': round(len(results) / seconds, 2),
+        **latency_summary(ok),
+        'error_rate': round(sum(errors.values()) / len(results), 4) if results else 0.0,
+        'errors': errors,
+        'replies': replies,
+        'by_command': {command: {'requests': len(samples), **latency_summary(samples)}
+                       for command, samples in sorted(by_command.items())},
+    }
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    worker_configs = [parse_workers(spec) for spec in (args.workers or DEFAULT_WORKERS)]
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    # A short chain is enough: the handlers read the head, balances and the pool price
+    fixture = fixtures.synthetic_chain(blocks=args.blocks, txs_per_block=20)
+    stand_ins, rpc_url, telegram_url = start_stand_ins(fixture, args.telegram_latency)
+    updates = telegram_updates(mix)
+    results = []
+
+    try:
+        for worker_config in worker_configs:
+            label = f'{worker_config[0]}:{worker_config[1]}x{worker_config[2]}'
+            with tempfile.TemporaryDirectory() as data_dir:
+                env = dict(os.environ)
+                env.update(bot_env(rpc_url, telegram_url, fixtures.DEFAULT_CAMPAIGN, data_dir))
+                env.update({
+                    'STATIC_ETH_PRICE': '',  # price /campaign from the stand-in's pool like a live bot
+                    'ETH_USD_POOL_ADDRESS': fixtures.ETH_USD_POOL,
+                    'ETH_USD_POOL_TYPE': 'v3',
+                    'ADMIN_USER_IDS': str(ADMIN_ID),
+                    # bot_env lifts the budget for the scan benchmark; replies here pay it like production
+                    'TELEGRAM_RATE_LIMIT': str(args.telegram_rate_limit),
+                })
+                env.update(dict(item.split('=', 1) for item in args.env))
+                rate_limit = float(env['TELEGRAM_RATE_LIMIT'])
+                print(f"{label}: Telegram budget "
+                      f"{f'{rate_limit:g} calls/s per worker' if rate_limit > 0 else 'off'}", flush=True)
+
+                process, base_url = start_gunicorn(worker_config, env, os.path.join(data_dir, 'gunicorn.log'))
+                try:
+                    # Boots every worker and fills per-process caches before measuring
+                    drive(base_url, updates, args.warmup, max(levels), args.timeout)
+                    for concurrency in levels:
+                        sends_before = fetch_stats(telegram_url).get('sendMessage', 0)
+                        started = time.perf_counter()
+                        samples = drive(base_url, updates, args.requests, concurrency, args.timeout)
+                        seconds = time.perf_counter() - started
+                        replies = fetch_stats(telegram_url).get('sendMessage', 0) - sends_before
+                        summary = summarize(samples, seconds, replies)
+                        results.append({'workers': label, 'concurrency': concurrency,
+                                        'telegram_rate_limit': rate_limit, **summary})
+                        print(f"{label:<14} c={concurrency:<4} {summary['throughput_rps']:>8} req/s  "
+                              f"p50 {summary['p50_ms']:>8} ms  p99 {summary['p99_ms']:>8} ms  "
+                              f"errors {summary['error_rate']:.1%}", flush=True)
+                finally:
+                    stop_gunicorn(process)
+    finally:
+        stand_ins.terminate()
+
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'mix': dict(mix), 'telegram_latency': args.telegram_latency,
+                       'telegram_rate_limit': args.telegram_rate_limit, 'results': results}, f, indent=2)
+    return results
+
+
+def report(results):
+    columns = ('telegram_rate_limit', 'requests', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'error_rate')
+    print(f"\n{'workers':<14}{'conc':>6}" + ''.join(f'{column:>16}' for column in columns))
+    for result in results:
+        print(f"{result['workers']:<14}{result['concurrency']:>6}" + ''.join(f'{result[column]:>16}' for column in columns))
+
+    print(f"\n{'workers':<14}{'conc':>6}  {'command':<12}{'requests':>10}{'p50_ms':>10}{'p95_ms':>10}{'p99_ms':>10}")
+    for result in results:
+        for command, stats in result['by_command'].items():
+            print(f"{result['workers']:<14}{result['concurrency']:>6}  {command:<12}{stats['requests']:>10}"
+                  f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+    failed = [result for result in results if result['errors']]
+    for result in failed:
+        print(f"\n{result['workers']} c={result['concurrency']} errors: "
+              + ', '.join(f'{error}={count}' for error, count in sorted(result['errors'].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', action='append',
+                        help=f"gunicorn worker config CLASS:WORKERS[xTHREADS] (repeatable, default: {' '.join(DEFAULT_WORKERS)})")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='command weights, e.g. help=4,status=1')
+    parser.add_argument('--concurrency', default='1,8,32', help='comma-separated client counts to run in turn')
+    parser.add_argument('--requests', type=int, default=300, help='updates per concurrency level')
+    parser.add_argument('--warmup', type=int, default=40, help='unmeasured updates sent after each boot')
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help='seconds before a request counts as a timeout (Telegram gives up on slow webhooks)')
+    parser.add_argument('--telegram-latency', type=float, default=0.05, help='seconds added to each Bot API call')
+    parser.add_argument('--telegram-rate-limit', type=float, default=DEFAULT_TELEGRAM_RATE_LIMIT,
+                        help=f'Bot API calls/s per worker process, 0 lifts the budget '
+                             f'(default: the production {DEFAULT_TELEGRAM_RATE_LIMIT:g})')
+    parser.add_argument('--blocks', type=int, default=20, help='synthetic chain length behind the stand-in node')
+    parser.add_argument('--env', action='append', default=[], help='extra KEY=VALUE for the bot (repeatable)')
+    parser.add_argument('--output', help='write results as JSON')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
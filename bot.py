@@ -1,19 +1,43 @@
 import time
 import json
-from web3 import Web3
+from web3 import Web3, AsyncWeb3
+from web3.middleware import simple_cache_middleware
+from web3.datastructures import AttributeDict
+from web3._utils.method_formatters import transaction_result_formatter
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import Dispatcher, CommandHandler, CallbackContext
 from telegram.utils.request import Request
 import os
 import logging
 import threading
-from telegram.error import RetryAfter
+from telegram.error import RetryAfter, BadRequest, Unauthorized, NetworkError, TimedOut
 import requests
 import matplotlib.pyplot as plt
 import matplotlib.patheffects as path_effects
 from flask import Flask, request
 import ssl
 import urllib3
+import sqlite3
+import queue
+from types import MappingProxyType
+from collections import OrderedDict
+from array import array
+import bisect
+import sys
+import argparse
+import socket
+import io
+import math
+import heapq
+import itertools
+import hmac
+import hashlib
+import signal
+import atexit
+import asyncio
+import contextvars
+import aiohttp
+from contextlib import contextmanager
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
@@ -39,25 +63,82 @@ class Config:
     SCANNER_MAX_CONSECUTIVE_ERRORS = 5  # max consecutive errors before extended sleep
     SCANNER_EXTENDED_SLEEP = 300  # 5 minutes extended sleep on repeated failures
     RATE_LIMIT_COOLDOWN = 120  # seconds
-    MAX_RETRIES = 3
     PRICE_CACHE_DURATION = 300  # seconds (5 minutes)
+    POOL_PRICE_LATEST_TTL = 30  # seconds a chain-head pool price is reused when no local scan pins the block
+    SCAN_PASS_STALE_SECONDS = 180  # no scan pass for this long: price at the head, not at last_checked
     TELEGRAM_TIMEOUT = 15  # seconds (increased from 10)
     TELEGRAM_RETRY_DELAY = 2  # seconds
+    DELIVERY_MAX_ATTEMPTS = 12  # failed deliveries become dead letters after this many attempts
+    DELIVERY_MAX_BACKOFF = 900  # seconds, cap on per-chat exponential retry backoff
+    DELIVERY_POLL_INTERVAL = 60  # seconds between scans for deliveries queued by other processes
+    DEAD_LETTERS_SHOWN = 10  # dead letters listed by /deadletters
     SUMMARY_RETRY_SLEEP = 600  # 10 minutes retry for summary (increased from 60)
     SUMMARY_MAX_CONSECUTIVE_ERRORS = 3  # max consecutive summary errors
     SUMMARY_EXTENDED_SLEEP = 1800  # 30 minutes extended sleep for summary failures
     IMAGE_DPI = 120  # Summary Image resolution
+    TOKEN_PRICE_REFRESH_INTERVAL = 300  # seconds between bulk token price refreshes
+    TOKEN_PRICE_TTL = 1800  # seconds a token price may be shown after its last refresh
+    TOKEN_PRICE_MAX_ENTRIES = 1000  # least recently used token prices beyond this are evicted
+    TOKEN_PRICE_BATCH_SIZE = 50  # contract addresses per CoinGecko token_price request
+    DIGEST_MAX_TX_LINKS = 5  # transaction links listed in a digest message
+    WALLET_BACKFILL_MAX_BLOCKS = 50000  # max blocks scanned when backfilling a newly added wallet
+    BACKFILL_LOG_WINDOW = 5000  # initial eth_getLogs block window for the backfill CLI
+    BACKFILL_MAX_LOG_WINDOW = 100000  # window growth cap after successful requests
+    BACKFILL_PROGRESS_INTERVAL = 10  # seconds between backfill progress lines
+    BACKFILL_SHARD_CHUNK = 10000  # blocks per interleaved chunk in sharded backfills
+    SHARD_LEASE_SECONDS = 600  # a shard slot is free for takeover once its lease lapses
+    SHARD_LEASE_RENEW_SECONDS = 60  # shards renew their lease on this timer, independent of scan passes
+    SHARD_MERGE_INTERVAL = 5  # seconds between merger passes over the outbox
+    SHARD_OUTBOX_RETENTION = 7 * 24 * 3600  # delivered events kept this long for deduplication
     WEB3_RETRY_DELAY = 5  # seconds
+    BLOCK_STREAM_CHUNK_SIZE = 64 * 1024  # bytes read per step when streaming full blocks
+    BLOCK_STREAM_TIMEOUT = 30  # seconds, connect/read timeout for streamed block requests
+    TRACE_FILTER_WINDOW = 1000  # max blocks per trace_filter request
     WEB3_MAX_RETRIES = 3  # max retries for web3 calls
+    LEDGER_BATCH_SIZE = 500  # max rows per bulk insert
+    LEDGER_FLUSH_INTERVAL = 2  # seconds to wait for more rows before writing a partial batch
+    LEDGER_DEFAULT_WINDOW_HOURS = 24  # default lookback for ledger commands
+    LEDGER_TOP_LIMIT = 10  # rows shown by /top
+    CAMPAIGN_RECONCILE_INTERVAL = 1800  # seconds between on-chain balance reconciliations
+    SUMMARY_STAGGER_SECONDS = 30  # offset between first summaries of different campaigns
+    SCHEDULER_TICK_SECONDS = 1  # timer wheel resolution
+    SCHEDULER_WHEEL_SLOTS = 3600  # slots per wheel revolution (longer delays wrap around)
+    BUDGET_BURST_SECONDS = 1  # rate budgets hold this many seconds worth of requests
+    # Share of each rate budget that lower priority classes may not consume
+    PRIORITY_RESERVED_SHARES = {'interactive': 0.2, 'live': 0.3, 'summary': 0.1}
+    MULTICALL_BATCH_SIZE = 100  # max sub-calls per aggregate3 eth_call
+    PRICE_FETCH_TIMEOUT = 10  # seconds per ETH price API request
+    ASYNC_RPC_CONCURRENCY = 16  # JSON-RPC requests in flight at once in ASYNC_MODE
+    ASYNC_RPC_TIMEOUT = 30  # seconds per JSON-RPC attempt in ASYNC_MODE
+    ASYNC_BLOCK_WINDOW = 8  # blocks fetched concurrently per scan step in ASYNC_MODE
+    ASYNC_HTTP_CONNECTIONS = 32  # pooled connections shared by RPC, price and Telegram requests in ASYNC_MODE
+    SHUTDOWN_DRAIN_TIMEOUT = 20  # seconds for the scanner, pending sends and ledger rows to finish on SIGTERM
+    PROFILE_SAMPLE_INTERVAL = 0.01  # seconds between stack samples of /profile (about 100 Hz)
+    PROFILE_DEFAULT_SECONDS = 30  # profile length when /profile is given none
+    PROFILE_MAX_SECONDS = 300
+    PROFILE_HTTP_MAX_SECONDS = 20  # GET /profile holds its request for the window: stay under gunicorn's 30s worker timeout
+    PROFILE_TOP_FRAMES = 10  # frames listed in the profile summary
+    # /stats rings as (bucket seconds, buckets), finest first: minutes for the last hour, hours for the last week
+    STATS_RESOLUTIONS = ((60, 60), (3600, 168))
+    STATS_WINDOWS = {'1h': 3600, '24h': 86400, '7d': 604800}
+    STATS_DEFAULT_WINDOW = '24h'
+    STATS_MAX_SERIES = 500  # (token, switch, direction) series kept, least recently updated evicted first
+    RESUME_MAX_BLOCKS = 5000  # a restart resumes from the snapshot's block only if the head is at most this far ahead
 
-# Global variables
-w3_lock = threading.Lock()
+# `python bot.py <command> ...` runs a one-off CLI mode (e.g. backfill) instead of the bot service
+CLI_MODE = __name__ == '__main__' and len(sys.argv) > 1
+
+# Global variables (w3_lock, the priority-ordered RPC mutex, is defined under PRIORITY SCHEDULING)
 eth_price_cache = {'price': 0, 'timestamp': 0}
 
 # New optimization globals
 TOKEN_CACHE = {}
 rpc_calls_today = {'count': 0, 'date': time.strftime('%Y-%m-%d')}
 blocks_processed_count = 0
+latest_block_seen = 0
+last_scan_pass = 0.0  # time the local scanner last read the head (0: this process doesn't scan)
+dry_run_output = None  # file object set by `backfill --dry-run`
+shutdown_event = threading.Event()  # set on SIGTERM: loops finish their current step and return
     
 # ---------------- CONFIG ---------------- #
 CAMPAIGN_ADDRESS = os.getenv('CAMPAIGN_ADDRESS')
@@ -65,11 +146,37 @@ CAMPAIGN_TARGET_USD = float(os.getenv('CAMPAIGN_TARGET_USD', '50000'))
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_IDS = [chat_id.strip() for chat_id in os.getenv('TELEGRAM_CHAT_ID', '').split(',') if chat_id.strip()]
 ETHEREUM_RPC_URL = os.getenv('ETHEREUM_RPC_URL')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')  # Optional Bot API base URL override (e.g. local stand-in for benchmarks)
+# Parse full blocks from the raw JSON-RPC stream, keeping only transactions that touch watched
+# addresses (false = decode whole blocks through web3)
+STREAM_BLOCKS = os.getenv('STREAM_BLOCKS', 'true').lower() in ('true', '1', 'yes', 'on')
+# Run scanning, price fetches and Telegram sends as asyncio tasks on one event loop thread instead of
+# the scanner thread and timer wheel (command handlers still run on the webhook thread)
+ASYNC_MODE = os.getenv('ASYNC_MODE', 'false').lower() in ('true', '1', 'yes', 'on')
+# Set to false to import the bot without starting scanner/summary threads (benchmarks, tooling)
+START_BACKGROUND_WORKERS = os.getenv('START_BACKGROUND_WORKERS', 'true').lower() in ('true', '1', 'yes', 'on')
 
 # Campaign summary configuration
 ENABLE_CAMPAIGN_SUMMARY = os.getenv('ENABLE_CAMPAIGN_SUMMARY', 'true').lower() in ('true', '1', 'yes', 'on')
 SUMMARY_INTERVAL_MINUTES = int(os.getenv('SUMMARY_INTERVAL_MINUTES', '120'))  # Default 2 hours
 STATIC_ETH_PRICE = os.getenv('STATIC_ETH_PRICE')  # Optional static price for testing
+LEDGER_DB_PATH = os.getenv('LEDGER_DB_PATH', 'ledger.db')
+DELIVERY_DB_PATH = os.getenv('DELIVERY_DB_PATH', 'deliveries.db')  # failed Telegram sends awaiting retry
+# Scan position, warm caches and rolling /stats written on shutdown and read back on the next start;
+# between shutdowns it holds only the position checkpointed after each scan pass
+STATE_SNAPSHOT_PATH = os.getenv('STATE_SNAPSHOT_PATH', 'bot_state.json')
+
+# Notification coalescing: events are buffered for DIGEST_WINDOW_SECONDS (0 disables buffering).
+# More than DIGEST_THRESHOLD messages in one window, or DIGEST_TX_EVENTS+ events in one tx, become digests.
+DIGEST_WINDOW_SECONDS = float(os.getenv('DIGEST_WINDOW_SECONDS', '15'))
+DIGEST_THRESHOLD = int(os.getenv('DIGEST_THRESHOLD', '3'))
+DIGEST_TX_EVENTS = int(os.getenv('DIGEST_TX_EVENTS', '2'))
+# Optional comma-separated ERC20 contracts whose campaign balance should be tracked from startup
+CAMPAIGN_TOKENS = [addr.strip() for addr in os.getenv('CAMPAIGN_TOKENS', '').split(',') if addr.strip()]
+# Several campaigns can be hosted from a JSON list of {name, address, target_usd, label, chat_ids,
+# summary_interval_minutes, tokens, summary_enabled}; without the file the CAMPAIGN_* settings
+# above describe a single campaign
+CAMPAIGNS_CONFIG_PATH = os.getenv('CAMPAIGNS_CONFIG_PATH', 'campaigns.json')
 
 WALLETS_TO_TRACK = {
     '0x7fC04c569767840d164C9CfC80d66115B8557d3F': 'FRIC/ETH'
@@ -77,8 +184,45 @@ WALLETS_TO_TRACK = {
 
 GLOBAL_LABEL = "HIBT Fundraising Campaign"
 EXCLUDED_TO_ADDRESS = "0x4ca9798a36b287f6675429884fab36563f82552d"
+# Tracked wallets and exclusions are loaded from this file when present (defaults above otherwise)
+WALLETS_CONFIG_PATH = os.getenv('WALLETS_CONFIG_PATH', 'wallets.json')
+# Bearer token for the GET /profile endpoint (disabled when unset); /profile in Telegram is admin-only
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
 ADMIN_USER_IDS = [int(user_id.strip()) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()]
 
+# Scanner sharding: with SCANNER_SHARDS > 0 this process runs no scanner of its own and instead
+# merges the outbox written by `python bot.py scan --shard i/N` processes sharing SHARD_DB_PATH
+SCANNER_SHARDS = int(os.getenv('SCANNER_SHARDS', '0'))
+SHARD_DB_PATH = os.getenv('SHARD_DB_PATH', 'shards.db')
+
+# Request budgets shared by all work, with reserved headroom per priority class (0 = unlimited)
+RPC_RATE_LIMIT = float(os.getenv('RPC_RATE_LIMIT', '0'))  # JSON-RPC requests per second
+TELEGRAM_RATE_LIMIT = float(os.getenv('TELEGRAM_RATE_LIMIT', '25'))  # Bot API calls per second
+
+# ERC20 USD prices come from CoinGecko's token_price endpoint for this platform (optional demo API key)
+TOKEN_PRICE_PLATFORM = os.getenv('TOKEN_PRICE_PLATFORM', 'ethereum')
+COINGECKO_API_KEY = os.getenv('COINGECKO_API_KEY')
+
+# Internal (contract-forwarded) ETH transfers: 'off', 'trace_filter' (a few calls per scanned range)
+# or 'trace_block' (one call per block). Requires a node with the trace_* API (Erigon, Nethermind, Reth).
+INTERNAL_TRANSFERS = os.getenv('INTERNAL_TRANSFERS', 'off').lower()
+
+# Optional on-chain ETH/USD price from a Uniswap-style WETH/stablecoin pool read through ETHEREUM_RPC_URL:
+# ETH_USD_POOL_TYPE is 'v3' (slot0 sqrtPriceX96) or 'v2' (getReserves). API prices remain the fallback.
+ETH_USD_POOL_ADDRESS = os.getenv('ETH_USD_POOL_ADDRESS')
+ETH_USD_POOL_TYPE = os.getenv('ETH_USD_POOL_TYPE', 'v3').lower()
+WETH_ADDRESS = os.getenv('WETH_ADDRESS', '0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2')
+
+# Multicall3 is deployed at the same address on mainnet and most EVM chains
+MULTICALL3_ADDRESS = os.getenv('MULTICALL3_ADDRESS', '0xcA11bde05977b3631167028862bE2a173976CA11')
+
+# Stablecoins valued at $1 in campaign totals
+STABLECOIN_ADDRESSES = {
+    '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48': 'USDC',
+    '0xdAC17F958D2ee523a2206206994597C13D831ec7': 'USDT',
+    '0x6B175474E89094C44Da98b954EedeAC495271d0F': 'DAI'
+}
+
 ERC20_ABI = json.loads('''
 [
   {
@@ -95,6 +239,13 @@ ERC20_ABI = json.loads('''
     "outputs": [{"name": "", "type": "uint8"}],
     "stateMutability": "view"
   },
+  {
+    "type": "function",
+    "name": "balanceOf",
+    "inputs": [{"name": "owner", "type": "address"}],
+    "outputs": [{"name": "", "type": "uint256"}],
+    "stateMutability": "view"
+  },
   {
     "anonymous": false,
     "inputs": [
@@ -107,11 +258,380 @@ ERC20_ABI = json.loads('''
   }
 ]''')
 
+MULTICALL3_ABI = json.loads('''
+[
+  {
+    "type": "function",
+    "name": "aggregate3",
+    "inputs": [{
+      "name": "calls",
+      "type": "tuple[]",
+      "components": [
+        {"name": "target", "type": "address"},
+        {"name": "allowFailure", "type": "bool"},
+        {"name": "callData", "type": "bytes"}
+      ]
+    }],
+    "outputs": [{
+      "name": "returnData",
+      "type": "tuple[]",
+      "components": [
+        {"name": "success", "type": "bool"},
+        {"name": "returnData", "type": "bytes"}
+      ]
+    }],
+    "stateMutability": "payable"
+  },
+  {
+    "type": "function",
+    "name": "getEthBalance",
+    "inputs": [{"name": "addr", "type": "address"}],
+    "outputs": [{"name": "balance", "type": "uint256"}],
+    "stateMutability": "view"
+  }
+]''')
+
+# The read-only pool functions shared by Uniswap v2 pairs and v3 pools (and their forks)
+UNISWAP_POOL_ABI = json.loads('''
+[
+  {
+    "type": "function",
+    "name": "token0",
+    "inputs": [],
+    "outputs": [{"name": "", "type": "address"}],
+    "stateMutability": "view"
+  },
+  {
+    "type": "function",
+    "name": "token1",
+    "inputs": [],
+    "outputs": [{"name": "", "type": "address"}],
+    "stateMutability": "view"
+  },
+  {
+    "type": "function",
+    "name": "slot0",
+    "inputs": [],
+    "outputs": [
+      {"name": "sqrtPriceX96", "type": "uint160"},
+      {"name": "tick", "type": "int24"},
+      {"name": "observationIndex", "type": "uint16"},
+      {"name": "observationCardinality", "type": "uint16"},
+      {"name": "observationCardinalityNext", "type": "uint16"},
+      {"name": "feeProtocol", "type": "uint8"},
+      {"name": "unlocked", "type": "bool"}
+    ],
+    "stateMutability": "view"
+  },
+  {
+    "type": "function",
+    "name": "getReserves",
+    "inputs": [],
+    "outputs": [
+      {"name": "reserve0", "type": "uint112"},
+      {"name": "reserve1", "type": "uint112"},
+      {"name": "blockTimestampLast", "type": "uint32"}
+    ],
+    "stateMutability": "view"
+  }
+]''')
+
+# ---------------- METRICS ---------------- #
+class Counter:
+    """Monotonic counter with optional labels (Prometheus text format)"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Latency histogram with fixed buckets; observe() is a bisect plus one locked update"""
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        """Context manager observing the elapsed wall time of its block"""
+        return _HistogramTimer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames + ('le',), key + (repr(float(bound)),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _format_labels(self.labelnames + ('le',), key + ('+Inf',))
+            lines.append(f"{self.name}_bucket{inf_labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+class _HistogramTimer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+METRICS = []
+
+def register_metric(metric):
+    METRICS.append(metric)
+    return metric
+
+def render_metrics():
+    """Render all registered metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+RPC_LATENCY = register_metric(Histogram('bot_rpc_request_seconds', 'JSON-RPC request latency', ('method',)))
+RPC_ERRORS = register_metric(Counter('bot_rpc_errors_total', 'JSON-RPC requests that failed or returned an error', ('method',)))
+BLOCK_LATENCY = register_metric(Histogram('bot_block_process_seconds', 'Time to fetch and process one block'))
+RECEIPT_LATENCY = register_metric(Histogram('bot_receipt_fetch_seconds', 'Transaction receipt fetch latency'))
+LOG_DECODE_LATENCY = register_metric(Histogram(
+    'bot_log_decode_seconds', 'ERC20 Transfer log decode time',
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+))
+TELEGRAM_LATENCY = register_metric(Histogram('bot_telegram_send_seconds', 'Telegram API send latency', ('method', 'chat')))
+TELEGRAM_FAILURES = register_metric(Counter('bot_telegram_failures_total', 'Failed Telegram send attempts', ('method', 'chat')))
+CHART_LATENCY = register_metric(Histogram('bot_chart_render_seconds', 'Campaign chart render time'))
+PRICE_LATENCY = register_metric(Histogram('bot_price_fetch_seconds', 'ETH price fetch latency', ('source',)))
+PRICE_FAILURES = register_metric(Counter('bot_price_fetch_failures_total', 'Failed ETH price fetches', ('source',)))
+NOTIFICATIONS_QUEUED = register_metric(Counter('bot_notifications_total', 'Transfer notifications queued', ('token',)))
+
+def metrics_middleware(make_request, w3):
+    """web3 middleware timing every JSON-RPC request actually sent to the provider"""
+    def middleware(method, params):
+        start = time.perf_counter()
+        try:
+            response = make_request(method, params)
+        except Exception:
+            RPC_ERRORS.inc(method=method)
+            raise
+        finally:
+            RPC_LATENCY.observe(time.perf_counter() - start, method=method)
+        if 'error' in response:
+            RPC_ERRORS.inc(method=method)
+        return response
+    return middleware
+
+async def async_metrics_middleware(make_request, async_w3):
+    """metrics_middleware for the AsyncWeb3 client of ASYNC_MODE"""
+    async def middleware(method, params):
+        start = time.perf_counter()
+        try:
+            response = await make_request(method, params)
+        except Exception:
+            RPC_ERRORS.inc(method=method)
+            raise
+        finally:
+            RPC_LATENCY.observe(time.perf_counter() - start, method=method)
+        if 'error' in response:
+            RPC_ERRORS.inc(method=method)
+        return response
+    return middleware
+
+PRIORITY_WAIT = register_metric(Histogram(
+    'bot_priority_wait_seconds', 'Time spent waiting for RPC/Telegram capacity', ('resource', 'priority')
+))
+
+# ---------------- PRIORITY SCHEDULING ---------------- #
+class Priority:
+    """Work classes, highest first. Each thread declares its class with work_priority()"""
+    INTERACTIVE = 0  # user commands via the webhook
+    LIVE = 1  # live scanning and transfer notifications
+    SUMMARY = 2  # campaign summary broadcasts
+    BACKFILL = 3  # historical scans
+    NAMES = ('interactive', 'live', 'summary', 'backfill')
+
+_priority_state = threading.local()
+
+def current_priority():
+    """Priority class of the calling thread (live work unless declared otherwise)"""
+    return getattr(_priority_state, 'value', Priority.LIVE)
+
+@contextmanager
+def work_priority(priority):
+    """Run the enclosed block, and every RPC/Telegram call it makes, at `priority`"""
+    previous = current_priority()
+    _priority_state.value = priority
+    try:
+        yield
+    finally:
+        _priority_state.value = previous
+
+class PriorityLock:
+    """Mutex handed to the highest-priority waiter on release (FIFO within a class)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._locked = False
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    def __enter__(self):
+        with self._cond:
+            if not self._locked and not self._waiting:
+                self._locked = True
+                return self
+            ticket = (current_priority(), next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            while self._locked or self._waiting[0] != ticket:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._locked = True
+            return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._cond:
+            self._locked = False
+            self._cond.notify_all()
+
+class PriorityBudget:
+    """Token-bucket rate budget with capacity reserved for higher priority classes.
+
+    A class may only take a token while more than the share reserved for the
+    classes above it remains, so background work can run at the full rate yet
+    never drain the burst that interactive commands rely on. Waiters are served
+    highest class first.
+    """
+
+    def __init__(self, name, rate, reserved_shares):
+        self.name = name
+        self.rate = rate
+        self.capacity = max(1.0, rate * Config.BUDGET_BURST_SECONDS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.floors = [
+            min(self.capacity - 1, self.capacity * sum(
+                reserved_shares.get(Priority.NAMES[higher], 0) for higher in range(priority)
+            ))
+            for priority in range(len(Priority.NAMES))
+        ]
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until the calling thread's class may make one more request"""
+        if not self.rate:
+            return
+        priority = current_priority()
+        ticket = (priority, next(self._sequence))
+        started = time.perf_counter()
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    self._refill()
+                    needed = 1 + self.floors[priority] - self.tokens
+                    if self._waiting[0] == ticket and needed <= 0:
+                        self.tokens -= 1
+                        break
+                    # Only the head waiter polls the bucket; the rest wait for it to leave
+                    self._cond.wait(needed / self.rate if self._waiting[0] == ticket else None)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+        PRIORITY_WAIT.observe(time.perf_counter() - started, resource=self.name, priority=Priority.NAMES[priority])
+
+w3_lock = PriorityLock()
+rpc_budget = PriorityBudget('rpc', RPC_RATE_LIMIT, Config.PRIORITY_RESERVED_SHARES)
+telegram_budget = PriorityBudget('telegram', TELEGRAM_RATE_LIMIT, Config.PRIORITY_RESERVED_SHARES)
+
+class BudgetedRequest(Request):
+    """Bot API transport drawing every call (sends and command replies) from the Telegram budget"""
+
+    def post(self, url, data, timeout=None):
+        telegram_budget.acquire()
+        return super().post(url, data, timeout=timeout)
+
 # ---------------- SETUP ---------------- #
 app = Flask(__name__)
 
 # Validate required environment variables
-required_vars = ['TELEGRAM_BOT_TOKEN', 'ETHEREUM_RPC_URL', 'CAMPAIGN_ADDRESS']
+required_vars = ['TELEGRAM_BOT_TOKEN', 'ETHEREUM_RPC_URL']
+if not os.path.exists(CAMPAIGNS_CONFIG_PATH):
+    required_vars.append('CAMPAIGN_ADDRESS')
 missing_vars = [var for var in required_vars if not os.getenv(var)]
 if missing_vars:
     raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
@@ -119,25 +639,37 @@ if missing_vars:
 if not TELEGRAM_CHAT_IDS:
     raise ValueError("No valid Telegram chat IDs provided")
 
+if INTERNAL_TRANSFERS not in ('off', 'trace_filter', 'trace_block'):
+    raise ValueError(f"INTERNAL_TRANSFERS must be 'off', 'trace_filter' or 'trace_block', got {INTERNAL_TRANSFERS!r}")
+
+if ASYNC_MODE and sys.version_info < (3, 11):
+    raise ValueError("ASYNC_MODE requires Python 3.11+ (asyncio.TaskGroup and asyncio.timeout)")
+
+if ETH_USD_POOL_ADDRESS and ETH_USD_POOL_TYPE not in ('v2', 'v3'):
+    raise ValueError(f"ETH_USD_POOL_TYPE must be 'v2' or 'v3', got {ETH_USD_POOL_TYPE!r}")
+
 if not ADMIN_USER_IDS:
     logger.warning("⚠️ No admin user IDs configured. All admin commands will be inaccessible!")
 else:
     logger.info(f"✅ Admin access configured for {len(ADMIN_USER_IDS)} user(s)")
 
 w3 = Web3(Web3.HTTPProvider(ETHEREUM_RPC_URL))
+# Cache static responses such as eth_chainId, which web3 otherwise re-requests before every eth_call
+w3.middleware_onion.add(simple_cache_middleware)
+w3.middleware_onion.inject(metrics_middleware, 'metrics', layer=0)
 if not w3.is_connected():
     raise ConnectionError("Failed to connect to Ethereum RPC")
 
 # Create Telegram bot with improved connection handling
 try:
     # Create request object with increased timeouts and retries
-    telegram_request = Request(
+    telegram_request = BudgetedRequest(
         connect_timeout=30,
         read_timeout=30,
         con_pool_size=8
     )
     
-    bot = Bot(token=TELEGRAM_BOT_TOKEN, request=telegram_request)
+    bot = Bot(token=TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_URL, request=telegram_request)
     
     # Test the bot connection with retry logic for SSL issues
     logger.info("Testing Telegram bot connection...")
@@ -160,7 +692,7 @@ except Exception as e:
     logger.info("Falling back to basic bot initialization...")
     try:
         # Fallback to basic bot
-        bot = Bot(token=TELEGRAM_BOT_TOKEN)
+        bot = Bot(token=TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_URL, request=BudgetedRequest())
         
         # Test fallback connection with retries
         for attempt in range(3):
@@ -183,14 +715,21 @@ transfer_event_sig = w3.keccak(text="Transfer(address,address,uint256)").hex()
 start_time = time.time()
 
 # ---------------- IMPROVED WEB3 WRAPPER ---------------- #
-def safe_web3_call(func, *args, max_retries=None, **kwargs):
-    """Wrapper for Web3 calls with proper error handling, retries, and RPC monitoring"""
-    global rpc_calls_today
-    
-    if max_retries is None:
-        max_retries = Config.WEB3_MAX_RETRIES
-    
-    # Track RPC usage
+# Error message fragments that mark provider rate limiting (Infura wording included) and transient network trouble
+RATE_LIMIT_TERMS = (
+    '429', 'rate limit', 'too many requests', 'quota exceeded',
+    'request limit', 'throttled', 'rate exceeded',
+    'daily request count exceeded', 'project id request limit'
+)
+NETWORK_ERROR_TERMS = ('connection', 'timeout', 'network', 'unreachable')
+
+def is_rate_limited(error):
+    """Whether an RPC error is the provider throttling us"""
+    error_str = str(error).lower()
+    return any(term in error_str for term in RATE_LIMIT_TERMS)
+
+def count_rpc_call():
+    """Track daily RPC usage"""
     current_date = time.strftime('%Y-%m-%d')
     if current_date != rpc_calls_today['date']:
         rpc_calls_today['count'] = 0
@@ -202,26 +741,36 @@ def safe_web3_call(func, *args, max_retries=None, **kwargs):
     # Log usage at intervals
     if rpc_calls_today['count'] % 1000 == 0:
         logger.info(f"📊 RPC calls today: {rpc_calls_today['count']}")
+
+def safe_web3_call(func, *args, max_retries=None, raise_on=(), **kwargs):
+    """Wrapper for Web3 calls with proper error handling, retries, and RPC monitoring
+
+    Errors whose message contains one of the `raise_on` substrings are raised
+    immediately instead of being retried, unless they are rate limits, which
+    always back off.
+    """
+    if max_retries is None:
+        max_retries = Config.WEB3_MAX_RETRIES
+    
+    count_rpc_call()
         
     for attempt in range(max_retries):
         try:
+            rpc_budget.acquire()
             with w3_lock:
                 return func(*args, **kwargs)
         except Exception as e:
             error_str = str(e).lower()
+            rate_limited = is_rate_limited(e)
+            if not rate_limited and any(term in error_str for term in raise_on):
+                raise
             # Enhanced rate limit detection for Infura
-            if any(term in error_str for term in [
-                '429', 'rate limit', 'too many requests', 'quota exceeded',
-                'request limit', 'throttled', 'rate exceeded',
-                'daily request count exceeded', 'project id request limit'  # Infura specific
-            ]):
+            if rate_limited:
                 # Exponential backoff for rate limits
                 wait_time = min(600, Config.RATE_LIMIT_COOLDOWN * (2 ** attempt))
                 logger.warning(f"🚫 Infura rate limit hit, waiting {wait_time}s...")
                 time.sleep(wait_time)
-            elif any(term in error_str for term in [
-                'connection', 'timeout', 'network', 'unreachable'
-            ]):
+            elif any(term in error_str for term in NETWORK_ERROR_TERMS):
                 logger.warning(f"Network error (attempt {attempt + 1}): {e}")
                 time.sleep(Config.WEB3_RETRY_DELAY * (attempt + 1))
             elif attempt == max_retries - 1:
@@ -231,18 +780,100 @@ def safe_web3_call(func, *args, max_retries=None, **kwargs):
                 logger.warning(f"Web3 call failed (attempt {attempt + 1}): {e}")
                 time.sleep(Config.WEB3_RETRY_DELAY)
 
+# ---------------- TRACKED WALLET CONFIGURATION ---------------- #
+class TrackingConfig:
+    """Immutable snapshot of what the scanner watches.
+
+    Updates build a new snapshot and swap the module-level reference, so the
+    scanner reads one consistent snapshot per block without taking a lock.
+    `live=False` snapshots (used for backfills) record to the ledger only:
+    they neither notify nor touch campaign balances.
+    """
+
+    def __init__(self, wallets, excluded, campaign_addresses=(), live=True):
+        self.wallets = MappingProxyType({
+            w3.to_checksum_address(addr): label for addr, label in wallets.items()
+        })
+        self.excluded = frozenset(addr.lower() for addr in excluded)
+        self.campaign_addresses = frozenset(w3.to_checksum_address(addr) for addr in campaign_addresses)
+        self.watched = frozenset(self.wallets) | self.campaign_addresses
+        self.watched_lower = frozenset(addr.lower() for addr in self.watched)
+        self.live = live
+
+    def with_changes(self, wallets=None, excluded=None):
+        """Copy of this snapshot with replaced wallets and/or exclusions"""
+        return TrackingConfig(
+            self.wallets if wallets is None else wallets,
+            self.excluded if excluded is None else excluded,
+            self.campaign_addresses,
+            self.live
+        )
+
+    def to_dict(self):
+        return {'wallets': dict(self.wallets), 'excluded': sorted(self.excluded)}
+
+tracking_update_lock = threading.Lock()  # serialises writers only, readers never lock
+
+def load_tracking_file(path):
+    """Read wallets/exclusions from a JSON file, or None if it doesn't exist"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    return data.get('wallets', {}), data.get('excluded', [])
+
+def save_tracking_file(config, path):
+    """Atomically persist wallets/exclusions to a JSON file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(config.to_dict(), f, indent=2)
+    os.replace(tmp_path, path)
+
+def update_tracking(wallets=None, excluded=None, persist=True):
+    """Swap in a new tracking snapshot (copy-on-write) and return it"""
+    global tracking
+
+    with tracking_update_lock:
+        new_config = tracking.with_changes(wallets=wallets, excluded=excluded)
+        if persist:
+            save_tracking_file(new_config, WALLETS_CONFIG_PATH)
+        tracking = new_config
+
+    logger.info(f"🔄 Tracking config updated: {len(new_config.wallets)} wallets, {len(new_config.excluded)} exclusions")
+    return new_config
+
+def backfill_wallets(wallets, from_block, to_block):
+    """Scan a past block range for newly added wallets (ledger only, no notifications)"""
+    backfill_config = TrackingConfig(wallets, tracking.excluded, live=False)
+    logger.info(f"⏪ Backfilling {len(wallets)} wallet(s) from block {from_block} to {to_block}")
+
+    with work_priority(Priority.BACKFILL):
+        for block_number in range(from_block, to_block + 1):
+            try:
+                process_block(block_number, backfill_config)
+            except Exception as e:
+                logger.error(f"Backfill error for block {block_number}: {e}")
+
+    logger.info(f"✅ Wallet backfill complete ({from_block}-{to_block})")
+
+_initial_tracking = load_tracking_file(WALLETS_CONFIG_PATH) or (WALLETS_TO_TRACK, [EXCLUDED_TO_ADDRESS])
+# The `tracking` snapshot itself is built once campaigns are loaded (see CAMPAIGN TRACKING)
+
 # ---------------- UTILS ---------------- #
-def build_frictionless_message(tx_type, token_symbol, value, tx_hash, address):
+def build_frictionless_message(tx_type, token_symbol, value, tx_hash, address, usd_value=None):
     """Build formatted message for Frictionless platform notifications"""
-    wallet_label = WALLETS_TO_TRACK.get(address)
+    wallet_label = tracking.wallets.get(address)
     if not wallet_label:
         return None
+
+    usd_text = f"Value: `${usd_value:,.2f}`\n" if usd_value is not None else ""
         
     if tx_type == "incoming":
         return (
             f"🔔 *New Offer Created on the Frictionless Platform*\n\n"
             f"Token Offered: `{token_symbol}`\n"
             f"Amount: `{value:.4f}`\n"
+            f"{usd_text}"
             f"Switch: _{wallet_label}_\n"
             f"Channel: _{GLOBAL_LABEL}_\n"
             f"🔗 [View Transaction](https://etherscan.io/tx/{tx_hash})"
@@ -252,14 +883,41 @@ def build_frictionless_message(tx_type, token_symbol, value, tx_hash, address):
             f"🤝 *Contribution on Offer Wall*\n\n"
             f"Token Received: `{token_symbol}`\n"
             f"Amount: `{value:.4f}`\n"
+            f"{usd_text}"
             f"Switch: _{wallet_label}_\n"
             f"Channel: _{GLOBAL_LABEL}_\n"
             f"🔗 [View Transaction](https://etherscan.io/tx/{tx_hash})"
         )
     return None
 
-def notify(message, tx_type=None):
+_notification_image = {'path': None, 'mtime': None, 'data': None}
+
+def load_notification_image(image_path):
+    """Bytes of the notification image, read again only when the file changes"""
+    try:
+        mtime = os.path.getmtime(image_path)
+    except OSError:
+        logger.warning(f"Image file not found: {image_path}")  # CHANGED: message text
+        return None
+
+    if (_notification_image['path'], _notification_image['mtime']) != (image_path, mtime):
+        with open(image_path, 'rb') as img_file:
+            data = img_file.read()
+        # One shared bytes object: queued sends reference it instead of holding copies
+        _notification_image.update(path=image_path, mtime=mtime, data=data)
+    return _notification_image['data']
+
+def notify(message, tx_type=None, chat_ids=None):
     """Send notification to all configured Telegram chats with improved error handling"""
+    if dry_run_output is not None:
+        # Backfill dry-run: write what would have been sent instead of calling Telegram
+        dry_run_output.write(json.dumps({
+            'chat_ids': chat_ids or TELEGRAM_CHAT_IDS,
+            'tx_type': tx_type,
+            'message': message
+        }, ensure_ascii=False) + '\n')
+        return
+
     image_path = 'campaign.jpg'  # CHANGED: from video_path = 'Friccy_whale.gif'
     
     # Create appropriate keyboard based on transaction type
@@ -272,268 +930,2171 @@ def notify(message, tx_type=None):
     
     reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
 
-    for chat_id in TELEGRAM_CHAT_IDS:
-        # Send image with improved error handling
-        _send_image_with_retry(chat_id, image_path)  # CHANGED: from _send_animation_with_retry
-        
-        # Send message with improved error handling
-        _send_message_with_retry(chat_id, message, reply_markup)
+    photo = load_notification_image(image_path)
 
-def _send_image_with_retry(chat_id, image_path):  # CHANGED: function name and parameter
-    """Helper function to send image with proper error handling"""
-    if not os.path.exists(image_path):
-        logger.warning(f"Image file not found: {image_path}")  # CHANGED: message text
+    if async_runtime.running():
+        # Sends become tasks on the event loop; the calling thread doesn't wait for Telegram
+        async_runtime.submit(async_send_to_chats(chat_ids or TELEGRAM_CHAT_IDS, message, reply_markup, photo))
         return
-        
-    for attempt in range(Config.MAX_RETRIES):
-        try:
-            with open(image_path, 'rb') as img_file:  # CHANGED: variable names
-                bot.send_photo(  # CHANGED: from send_animation
-                    chat_id=chat_id, 
-                    photo=img_file,  # CHANGED: from animation=gif_file
-                    timeout=Config.TELEGRAM_TIMEOUT
-                )
-            logger.debug(f"Image sent successfully to {chat_id}")  # CHANGED: message text
-            return
-            
-        except RetryAfter as e:
-            logger.warning(f"Telegram rate limit (image), retrying in {e.retry_after}s...")  # CHANGED: message text
-            time.sleep(e.retry_after)
-        except Exception as e:
-            error_str = str(e).lower()
-            if 'ssl' in error_str or 'decryption failed' in error_str:
-                logger.warning(f"SSL error on attempt {attempt+1}, retrying: {e}")
-                time.sleep(Config.TELEGRAM_RETRY_DELAY * (attempt + 1))  # Exponential backoff
-            else:
-                logger.warning(f"Attempt {attempt+1} failed to send image to {chat_id}: {e}")  # CHANGED: message text
-                if attempt < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.TELEGRAM_RETRY_DELAY)
-    
-    logger.error(f"❌ Failed to send image to chat_id {chat_id} after {Config.MAX_RETRIES} attempts")  # CHANGED: message text
 
-def _send_message_with_retry(chat_id, message, reply_markup):
-    """Helper function to send message with proper error handling"""
-    for attempt in range(Config.MAX_RETRIES):
-        try:
-            bot.send_message(
-                chat_id=chat_id,
-                text=message,
-                parse_mode='Markdown',
-                reply_markup=reply_markup,
-                timeout=Config.TELEGRAM_TIMEOUT
-            )
-            logger.debug(f"Message sent successfully to {chat_id}")
-            return
-            
-        except RetryAfter as e:
-            logger.warning(f"Telegram rate limit (message), retrying in {e.retry_after}s...")
-            time.sleep(e.retry_after)
-        except Exception as e:
-            error_str = str(e).lower()
-            if 'ssl' in error_str or 'decryption failed' in error_str:
-                logger.warning(f"SSL error on attempt {attempt+1}, retrying: {e}")
-                time.sleep(Config.TELEGRAM_RETRY_DELAY * (attempt + 1))  # Exponential backoff
-            else:
-                logger.warning(f"Attempt {attempt+1} failed to send message to {chat_id}: {e}")
-                if attempt < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.TELEGRAM_RETRY_DELAY)
-    
-    logger.error(f"❌ Failed to send message to chat_id {chat_id} after {Config.MAX_RETRIES} attempts")
+    for chat_id in chat_ids or TELEGRAM_CHAT_IDS:
+        # Failed sends are queued for retry instead of blocking this thread
+        if photo:
+            delivery_queue.send(chat_id, 'photo', photo=photo)
+        delivery_queue.send(chat_id, 'message', text=message, reply_markup=reply_markup)
 
-# ---------------- TOKEN INFO CACHING SYSTEM ---------------- #
-def get_cached_token_info(contract_address):
-    """Get cached token info to avoid repeat RPC calls"""
-    global TOKEN_CACHE
-    
-    if contract_address in TOKEN_CACHE:
-        return TOKEN_CACHE[contract_address]
-    
-    try:
-        contract = w3.eth.contract(address=contract_address, abi=ERC20_ABI)
-        symbol = safe_web3_call(contract.functions.symbol().call)
-        decimals = safe_web3_call(contract.functions.decimals().call)
-        
-        # Cache the result
-        TOKEN_CACHE[contract_address] = {'symbol': symbol, 'decimals': decimals}
-        logger.debug(f"Cached token info for {contract_address}: {symbol}")
-        return TOKEN_CACHE[contract_address]
-    except Exception:
-        # Cache the failure too to avoid repeat attempts
-        TOKEN_CACHE[contract_address] = {'symbol': 'UNKNOWN', 'decimals': 18}
-        logger.debug(f"Cached failed token lookup for {contract_address}")
-        return TOKEN_CACHE[contract_address]
+# ---------------- TELEGRAM DELIVERY QUEUE ---------------- #
+class DeliveryQueue:
+    """Durable per-chat retry queue for Telegram sends.
 
-def get_cached_token_symbol(contract_address):
-    """Get token symbol with aggressive caching"""
-    return get_cached_token_info(contract_address)['symbol']
+    A send is attempted right away unless its chat already has a backlog or is
+    inside a rate-limit window; otherwise, and on failure, it is stored in
+    SQLite. A single worker wakes each chat when its retry is due (RetryAfter
+    or exponential backoff) and delivers that chat's backlog in order, so no
+    caller ever sleeps on Telegram and an outage loses nothing. Permanent
+    errors and sends that keep failing are kept as dead letters.
 
-def get_cached_token_decimals(contract_address):
-    """Get token decimals with aggressive caching"""
-    return get_cached_token_info(contract_address)['decimals']
+    Queued photos are stored once per distinct image (by SHA-256) and rows
+    reference them; after the first retry uploads an image, the other rows
+    holding it resend Telegram's file_id instead of the bytes.
+    """
 
-def process_erc20_transfer(log, tx_hash):
-    """Process ERC20 transfer events from transaction logs"""
-    try:
-        # Use safe_web3_call for contract interactions
-        contract = w3.eth.contract(address=log['address'], abi=ERC20_ABI)
-        from web3._utils.events import get_event_data
-        
-        transfer_event_abi = next(
-            abi for abi in ERC20_ABI 
-            if abi.get("type") == "event" and abi.get("name") == "Transfer"
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS deliveries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        text TEXT,
+        reply_markup TEXT,
+        photo_hash TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL,
+        last_error TEXT,
+        created REAL NOT NULL,
+        dead INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_deliveries_due ON deliveries (dead, chat_id, id);
+    CREATE TABLE IF NOT EXISTS photos (
+        hash TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        file_id TEXT
+    );
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._wakeups = {}  # chat_id -> time its backlog is due
+        self._heap = []
+        self._thread = None
+        self._conn().executescript(self.SCHEMA)
+        self._migrate_photos()
+
+    def _conn(self):
+        """Per-thread connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate_photos(self):
+        """Move photo bytes stored inline by older versions into the photos table"""
+        conn = self._conn()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(deliveries)")}
+        if 'photo_hash' not in columns:
+            conn.execute("ALTER TABLE deliveries ADD COLUMN photo_hash TEXT")
+        if 'photo' in columns:
+            for row_id, photo in conn.execute("SELECT id, photo FROM deliveries WHERE photo IS NOT NULL").fetchall():
+                conn.execute("UPDATE deliveries SET photo_hash = ?, photo = NULL WHERE id = ?",
+                             (self._store_photo(photo), row_id))
+
+    def _store_photo(self, photo):
+        """Keep one copy of an image for queued sends; returns its hash"""
+        photo_hash = hashlib.sha256(photo).hexdigest()
+        self._conn().execute("INSERT OR IGNORE INTO photos (hash, data) VALUES (?, ?)", (photo_hash, photo))
+        return photo_hash
+
+    def _load_photo(self, photo_hash):
+        """Telegram file_id of a queued image once uploaded, else its bytes"""
+        row = self._conn().execute("SELECT data, file_id FROM photos WHERE hash = ?", (photo_hash,)).fetchone()
+        if row is None:
+            raise ValueError(f"queued photo {photo_hash[:12]} is missing")
+        return row[1] or row[0]
+
+    def _prune_photos(self):
+        # Called with self._cond held, so no send is between storing an image and queuing its row
+        self._conn().execute(
+            "DELETE FROM photos WHERE hash NOT IN (SELECT photo_hash FROM deliveries WHERE photo_hash IS NOT NULL)"
         )
-        decoded_log = get_event_data(w3.codec, transfer_event_abi, log)
 
-        from_addr = w3.to_checksum_address(decoded_log['args']['from'])
-        to_addr = w3.to_checksum_address(decoded_log['args']['to'])
-        value = decoded_log['args']['value']
+    def start(self):
+        """Start the retry worker"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
 
-        # Determine transaction type and tracked address
-        if to_addr in WALLETS_TO_TRACK:
-            tx_type = "incoming"
-            tracked_addr = to_addr
-        elif from_addr in WALLETS_TO_TRACK:
-            if to_addr.lower() == EXCLUDED_TO_ADDRESS.lower():
-                return False  # Skip excluded address
-            tx_type = "outgoing"
-            tracked_addr = from_addr
-        else:
+    def send(self, chat_id, kind, text=None, reply_markup=None, photo=None):
+        """Deliver a 'message' or 'photo' now, or queue it behind the chat's backlog; True if sent"""
+        chat_id = str(chat_id)
+        markup_json = reply_markup.to_json() if reply_markup else None
+        if self._queue_behind_backlog(chat_id, kind, text, markup_json, photo):
             return False
 
-        # Get token info using safe wrapper
         try:
-            token_symbol = safe_web3_call(contract.functions.symbol().call)
-        except Exception:
-            token_symbol = "UNKNOWN"
+            self._deliver(chat_id, kind, text, markup_json, photo)
+            return True
+        except Exception as e:
+            self._queue_failed(chat_id, kind, text, markup_json, photo, e)
+            return False
 
-        try:
-            decimals = safe_web3_call(contract.functions.decimals().call)
-        except Exception:
-            decimals = 18
+    async def async_send(self, chat_id, kind, text=None, reply_markup=None, photo=None):
+        """send() for ASYNC_MODE: the first attempt is awaited on the event loop, retries stay with the worker.
 
-        value_human = value / (10 ** decimals)
-        if value_human == 0:
+        Queueing takes the worker's lock and writes SQLite, so it runs off the loop.
+        """
+        chat_id = str(chat_id)
+        markup_json = reply_markup.to_json() if reply_markup else None
+        # Unlocked peek so sends to chats without a backlog never leave the loop
+        if chat_id in self._wakeups and await offload(
+                self._queue_behind_backlog, chat_id, kind, text, markup_json, photo):
             return False
 
-        message = build_frictionless_message(tx_type, token_symbol, value_human, tx_hash, tracked_addr)
-        if message:
-            logger.info(f"Sending ERC20 message: {message[:100]}...")
-            notify(message, tx_type)
+        try:
+            await async_telegram_send(chat_id, kind, text, markup_json, photo)
             return True
-            
-    except Exception as e:
-        logger.warning(f"ERC20 decode error: {e}")
-    
-    return False
-
-def process_eth_transfer(tx):
-    """Process native ETH transfers"""
-    from_addr = w3.to_checksum_address(tx['from']) if tx['from'] else None
-    to_addr = w3.to_checksum_address(tx['to']) if tx['to'] else None
-    value = tx['value']
+        except Exception as e:
+            await offload(self._queue_failed, chat_id, kind, text, markup_json, photo, e)
+            return False
 
-    if not from_addr or not to_addr or value == 0:
+    def _queue_behind_backlog(self, chat_id, kind, text, markup_json, photo):
+        """Queue the send if its chat is waiting on a retry, keeping the chat's messages in order"""
+        with self._cond:
+            if chat_id in self._wakeups:
+                self._enqueue(chat_id, kind, text, markup_json, photo, 0, self._wakeups[chat_id], None)
+                return True
         return False
 
-    # Check if transaction involves tracked wallets
-    if to_addr in WALLETS_TO_TRACK:
-        tx_type = "incoming"
-        tracked_addr = to_addr
-    elif from_addr in WALLETS_TO_TRACK:
-        if to_addr.lower() == EXCLUDED_TO_ADDRESS.lower():
-            return False  # Skip excluded address
-        tx_type = "outgoing"
-        tracked_addr = from_addr
-    else:
-        return False
+    def _queue_failed(self, chat_id, kind, text, markup_json, photo, error):
+        delay, permanent = self._classify(error, 0)
+        logger.warning(f"Telegram {kind} to {chat_id} failed, {'dead-lettered' if permanent else f'retrying in {delay:.0f}s'}: {error}")
+        with self._cond:
+            self._enqueue(chat_id, kind, text, markup_json, photo, 1, time.time() + delay, str(error), dead=permanent)
 
-    value_eth = w3.from_wei(value, 'ether')
-    message = build_frictionless_message(tx_type, 'ETH', value_eth, tx['hash'].hex(), tracked_addr)
-    if message:
-        logger.info(f"Sending ETH message: {message[:100]}...")
-        notify(message, tx_type)
-        return True
-    
-    return False
+    def _enqueue(self, chat_id, kind, text, markup_json, photo, attempts, next_attempt, error, dead=False):
+        # Called with self._cond held so the worker can't retire the chat in between
+        photo_hash = self._store_photo(photo) if photo else None
+        self._conn().execute(
+            """INSERT INTO deliveries (chat_id, kind, text, reply_markup, photo_hash, attempts, next_attempt,
+                                       last_error, created, dead)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (chat_id, kind, text, markup_json, photo_hash, attempts, next_attempt, error, time.time(), int(dead))
+        )
+        if not dead and chat_id not in self._wakeups:
+            self._schedule(chat_id, next_attempt)
 
-# ---------------- IMPROVED MAIN LOGIC ---------------- #
-def check_blocks():
-    """Main function to check new blocks for relevant transactions"""
-    global last_checked
-    
-    try:
-        latest = safe_web3_call(lambda: w3.eth.block_number)
-    except Exception as e:
-        logger.error(f"Failed to get latest block number: {e}")
-        return
+    def _schedule(self, chat_id, when):
+        self._wakeups[chat_id] = when
+        heapq.heappush(self._heap, (when, chat_id))
+        self._cond.notify()
+
+    def _deliver(self, chat_id, kind, text, markup_json, photo):
+        """Send once; `photo` is image bytes or an already uploaded file_id. Returns the sent Message"""
+        reply_markup = InlineKeyboardMarkup.de_json(json.loads(markup_json), bot) if markup_json else None
+        method = 'sendPhoto' if kind == 'photo' else 'sendMessage'
+        try:
+            with TELEGRAM_LATENCY.time(method=method, chat=chat_id):
+                if kind == 'photo':
+                    return bot.send_photo(chat_id=chat_id, photo=photo if isinstance(photo, str) else io.BytesIO(photo),
+                                          timeout=Config.TELEGRAM_TIMEOUT)
+                else:
+                    return bot.send_message(
+                        chat_id=chat_id,
+                        text=text,
+                        parse_mode='Markdown',
+                        reply_markup=reply_markup,
+                        timeout=Config.TELEGRAM_TIMEOUT
+                    )
+        except Exception:
+            TELEGRAM_FAILURES.inc(method=method, chat=chat_id)
+            raise
+
+    @staticmethod
+    def _classify(error, attempts):
+        """(retry delay, permanent?) for a failed send"""
+        if isinstance(error, (BadRequest, Unauthorized)):
+            return 0, True  # malformed message, unknown chat or bot removed: retrying won't help
+        if isinstance(error, RetryAfter):
+            return error.retry_after, False
+        return min(Config.DELIVERY_MAX_BACKOFF, Config.TELEGRAM_RETRY_DELAY * 2 ** attempts), False
+
+    def _run(self):
+        logger.info(f"✅ Telegram delivery queue started ({self.db_path})")
+        last_poll = 0
+        while True:
+            if time.time() - last_poll >= Config.DELIVERY_POLL_INTERVAL:
+                last_poll = time.time()
+                self._load_backlog()
+
+            with self._cond:
+                chat_id = None
+                while chat_id is None:
+                    now = time.time()
+                    if self._heap and self._heap[0][0] <= now:
+                        when, candidate = heapq.heappop(self._heap)
+                        if self._wakeups.get(candidate) == when:
+                            chat_id = candidate
+                        continue
+                    timeout = Config.DELIVERY_POLL_INTERVAL - (now - last_poll)
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(min(timeout, self._heap[0][0] - now) if self._heap else timeout)
+
+            if chat_id is not None:
+                try:
+                    self._drain(chat_id)
+                except Exception as e:
+                    logger.error(f"Delivery queue error for {chat_id}: {e}")
+                    with self._cond:
+                        self._schedule(chat_id, time.time() + Config.DELIVERY_MAX_BACKOFF)
+
+    def _load_backlog(self):
+        """Schedule chats with queued sends this worker doesn't know about (restarts, other processes)"""
+        rows = self._conn().execute(
+            "SELECT chat_id, MIN(next_attempt) FROM deliveries WHERE dead = 0 GROUP BY chat_id"
+        ).fetchall()
+        with self._cond:
+            for chat_id, next_attempt in rows:
+                if chat_id not in self._wakeups:
+                    self._schedule(chat_id, next_attempt)
+
+    def _drain(self, chat_id):
+        """Deliver a chat's backlog in order until it is empty or a send fails"""
+        conn = self._conn()
+        while True:
+            row = conn.execute(
+                """SELECT id, kind, text, reply_markup, photo_hash, attempts FROM deliveries
+                   WHERE dead = 0 AND chat_id = ? ORDER BY id LIMIT 1""",
+                (chat_id,)
+            ).fetchone()
+
+            if row is None:
+                with self._cond:
+                    # Re-check under the lock: send() may have queued something meanwhile
+                    if conn.execute("SELECT 1 FROM deliveries WHERE dead = 0 AND chat_id = ? LIMIT 1",
+                                    (chat_id,)).fetchone() is None:
+                        del self._wakeups[chat_id]
+                        self._prune_photos()
+                        return
+                continue
+
+            row_id, kind, text, markup_json, photo_hash, attempts = row
+            try:
+                photo = self._load_photo(photo_hash) if photo_hash else None
+                message = self._deliver(chat_id, kind, text, markup_json, photo)
+                if isinstance(photo, bytes) and getattr(message, 'photo', None):
+                    # Later rows with this image send the file_id instead of uploading it again
+                    conn.execute("UPDATE photos SET file_id = ? WHERE hash = ?", (message.photo[-1].file_id, photo_hash))
+                conn.execute("DELETE FROM deliveries WHERE id = ?", (row_id,))
+                continue
+            except Exception as e:
+                attempts += 1
+                delay, permanent = self._classify(e, attempts)
+                error = str(e)
+
+            if permanent or attempts >= Config.DELIVERY_MAX_ATTEMPTS:
+                logger.error(f"☠️ Telegram {kind} to {chat_id} dead-lettered after {attempts} attempt(s): {error}")
+                conn.execute("UPDATE deliveries SET dead = 1, attempts = ?, last_error = ? WHERE id = ?",
+                             (attempts, error, row_id))
+                continue
+
+            logger.warning(f"Telegram {kind} to {chat_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+            next_attempt = time.time() + delay
+            conn.execute("UPDATE deliveries SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                         (attempts, next_attempt, error, row_id))
+            with self._cond:
+                self._schedule(chat_id, next_attempt)
+            return
+
+    def pending(self):
+        """Sends waiting for retry"""
+        return self._conn().execute("SELECT COUNT(*) FROM deliveries WHERE dead = 0").fetchone()[0]
+
+    def dead_count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM deliveries WHERE dead = 1").fetchone()[0]
+
+    def dead_letters(self, limit):
+        """Oldest dead letters as (id, chat_id, kind, text, attempts, last_error, created)"""
+        return self._conn().execute(
+            """SELECT id, chat_id, kind, text, attempts, last_error, created FROM deliveries
+               WHERE dead = 1 ORDER BY id LIMIT ?""",
+            (limit,)
+        ).fetchall()
+
+    def retry_dead(self):
+        """Move every dead letter back into the queue; returns how many"""
+        now = time.time()
+        with self._cond:
+            cursor = self._conn().execute(
+                "UPDATE deliveries SET dead = 0, attempts = 0, next_attempt = ? WHERE dead = 1", (now,)
+            )
+        self._load_backlog()
+        return cursor.rowcount
+
+    def purge_dead(self):
+        """Delete every dead letter; returns how many"""
+        with self._cond:
+            purged = self._conn().execute("DELETE FROM deliveries WHERE dead = 1").rowcount
+            self._prune_photos()
+        return purged
+
+delivery_queue = DeliveryQueue(DELIVERY_DB_PATH)
+
+# ---------------- NOTIFICATION COALESCING ---------------- #
+def build_digest_message(events):
+    """Build one digest message summarising several transfer events"""
+    totals = {}
+    for event in events:
+        key = (event['tx_type'], event['token_symbol'])
+        count, amount, usd = totals.get(key, (0, 0, 0))
+        # A USD total is only shown when every event in the group was priced
+        event_usd = event.get('usd_value')
+        usd = usd + event_usd if usd is not None and event_usd is not None else None
+        totals[key] = (count + 1, amount + event['amount'], usd)
+
+    sections = []
+    for tx_type, heading in (("incoming", "🔔 *Offers Created:*"), ("outgoing", "🤝 *Contributions:*")):
+        lines = [
+            f"• `{symbol}`: `{amount:.4f}` ({count}x)" + (f" ≈ `${usd:,.2f}`" if usd is not None else "")
+            for (kind, symbol), (count, amount, usd) in totals.items() if kind == tx_type
+        ]
+        if lines:
+            sections.append(heading + "\n" + "\n".join(lines))
+
+    switches = sorted({tracking.wallets.get(event['switch_address'], event['switch_address']) for event in events})
+    tx_hashes = list(dict.fromkeys(event['tx_hash'] for event in events))
+    links = " · ".join(
+        f"[{tx_hash[:10]}](https://etherscan.io/tx/{tx_hash})"
+        for tx_hash in tx_hashes[:Config.DIGEST_MAX_TX_LINKS]
+    )
+    if len(tx_hashes) > Config.DIGEST_MAX_TX_LINKS:
+        links += f" +{len(tx_hashes) - Config.DIGEST_MAX_TX_LINKS} more"
+
+    return (
+        f"📦 *Frictionless Activity Digest* ({len(events)} transfers)\n\n"
+        + "\n\n".join(sections) + "\n\n"
+        f"Switch: _{', '.join(switches)}_\n"
+        f"Channel: _{GLOBAL_LABEL}_\n"
+        f"🔗 {links}"
+    )
+
+class NotificationCoalescer:
+    """Buffer transfer notifications briefly and merge bursts into digests.
+
+    Events are grouped per set of target chats. Within a window, transactions
+    with several transfer events are merged into one message, and if the window
+    still holds more than the threshold of messages everything is sent as a
+    single digest, keeping bursts well below Telegram's flood limits.
+    """
+
+    def __init__(self, window_seconds, threshold, tx_events):
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self.tx_events = tx_events
+        self._events = []
+        self._first_event_at = None
+        self._inflight = 0  # batches the flusher thread has taken but not finished delivering
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Start the background flusher thread"""
+        if self._thread is None and self.window_seconds > 0:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def add(self, event):
+        """Queue an event dict (tx_type, token_symbol, amount, tx_hash, block_number, log_index,
+        switch_address, message, chat_ids)"""
+        NOTIFICATIONS_QUEUED.inc(token=event['token_symbol'])
+        if self._thread is None:
+            self._deliver([event])
+            return
+
+        with self._cond:
+            self._events.append(event)
+            if self._first_event_at is None:
+                self._first_event_at = time.time()
+            self._cond.notify()
+
+    def pending(self):
+        """Number of buffered events"""
+        with self._cond:
+            return len(self._events)
+
+    def flush(self, timeout=None):
+        """Deliver everything buffered right now.
+
+        Also waits up to `timeout` seconds (forever by default) for a batch the
+        flusher thread is already delivering, so nothing is still being sent
+        when this returns; False if that batch was still going at the deadline.
+        """
+        with self._cond:
+            batch, self._events, self._first_event_at = self._events, [], None
+        if batch:
+            self._deliver(batch)
+        with self._cond:
+            return self._cond.wait_for(lambda: self._inflight == 0, timeout)
+
+    def _run(self):
+        logger.info(f"✅ Notification coalescer started - window: {self.window_seconds}s, threshold: {self.threshold}")
+        while True:
+            with self._cond:
+                while not self._events:
+                    self._cond.wait()
+                remaining = self._first_event_at + self.window_seconds - time.time()
+                while remaining > 0:
+                    self._cond.wait(remaining)
+                    remaining = self._first_event_at + self.window_seconds - time.time()
+                batch, self._events, self._first_event_at = self._events, [], None
+                self._inflight += 1
+
+            try:
+                self._deliver(batch)
+            except Exception as e:
+                logger.error(f"Notification delivery error: {e}")
+            finally:
+                with self._cond:
+                    self._inflight -= 1
+                    self._cond.notify_all()
+
+    def _deliver(self, events):
+        by_chats = {}
+        for event in events:
+            by_chats.setdefault(tuple(event.get('chat_ids') or TELEGRAM_CHAT_IDS), []).append(event)
+
+        for chat_ids, chat_events in by_chats.items():
+            by_tx = {}
+            for event in chat_events:
+                by_tx.setdefault(event['tx_hash'], []).append(event)
+
+            messages = []
+            for tx_events in by_tx.values():
+                if len(tx_events) >= self.tx_events:
+                    messages.append((build_digest_message(tx_events), tx_events[0]['tx_type']))
+                else:
+                    messages.extend((event['message'], event['tx_type']) for event in tx_events)
+
+            if len(messages) > self.threshold:
+                logger.info(f"📦 Sending digest of {len(chat_events)} events to {len(chat_ids)} chat(s)")
+                messages = [(build_digest_message(chat_events), chat_events[0]['tx_type'])]
+
+            for message, tx_type in messages:
+                notify(message, tx_type, list(chat_ids))
+
+notification_coalescer = NotificationCoalescer(DIGEST_WINDOW_SECONDS, DIGEST_THRESHOLD, DIGEST_TX_EVENTS)
+
+# ---------------- MULTICALL BATCH READER ---------------- #
+class MulticallReader:
+    """Batch balance and ERC20 metadata reads into Multicall3 aggregate3 calls.
+
+    Every sub-call is sent with allowFailure=True, so a reverting token only
+    yields None for its own slot. If Multicall3 is not deployed on the chain,
+    or the aggregate call itself fails, the batch degrades to individual calls.
+    """
+
+    def __init__(self, address):
+        self.address = w3.to_checksum_address(address)
+        self.contract = w3.eth.contract(address=self.address, abi=MULTICALL3_ABI)
+        self.erc20 = w3.eth.contract(abi=ERC20_ABI)
+        self._available = None
+
+    def is_available(self):
+        """Whether Multicall3 has code on this chain (checked once)"""
+        if self._available is None:
+            try:
+                code = safe_web3_call(lambda: w3.eth.get_code(self.address))
+                self._available = len(code) > 0
+            except Exception as e:
+                logger.warning(f"Could not check Multicall3 deployment: {e}")
+                return False
+            if not self._available:
+                logger.warning(f"⚠️ No Multicall3 contract at {self.address}, batched reads will use single calls")
+        return self._available
+
+    def _encode(self, contract, fn_name, args=None):
+        return bytes.fromhex(contract.encodeABI(fn_name=fn_name, args=args or [])[2:])
+
+    @staticmethod
+    def _decode_uint(data):
+        return w3.codec.decode(['uint256'], data)[0]
+
+    @staticmethod
+    def _decode_symbol(data):
+        # Some older tokens (e.g. MKR) return bytes32 instead of string
+        try:
+            return w3.codec.decode(['string'], data)[0]
+        except Exception:
+            return w3.codec.decode(['bytes32'], data)[0].rstrip(b'\x00').decode('utf-8', 'ignore')
+
+    def execute(self, calls, block_identifier='latest'):
+        """Run (target, calldata, decoder) calls in batches; failed items come back as None"""
+        results = []
+        for start in range(0, len(calls), Config.MULTICALL_BATCH_SIZE):
+            chunk = calls[start:start + Config.MULTICALL_BATCH_SIZE]
+            raw = None
+            if self.is_available():
+                try:
+                    raw = safe_web3_call(
+                        self.contract.functions.aggregate3(
+                            [(target, True, calldata) for target, calldata, _ in chunk]
+                        ).call,
+                        block_identifier=block_identifier
+                    )
+                except Exception as e:
+                    logger.warning(f"Multicall aggregate3 failed, falling back to single calls: {e}")
+            if raw is None:
+                raw = [self._single_call(target, calldata, block_identifier) for target, calldata, _ in chunk]
+
+            for (success, data), (_, _, decoder) in zip(raw, chunk):
+                if not success or not data:
+                    results.append(None)
+                    continue
+                try:
+                    results.append(decoder(data))
+                except Exception:
+                    results.append(None)
+        return results
+
+    def _single_call(self, target, calldata, block_identifier):
+        try:
+            data = safe_web3_call(
+                lambda: w3.eth.call({'to': target, 'data': calldata}, block_identifier),
+                max_retries=1
+            )
+            return True, bytes(data)
+        except Exception:
+            return False, b''
+
+    def eth_balances(self, addresses, block_identifier='latest'):
+        """Native balances for many addresses in one call"""
+        if not self.is_available():
+            balances = {}
+            for addr in addresses:
+                try:
+                    balances[addr] = safe_web3_call(lambda: w3.eth.get_balance(addr, block_identifier))
+                except Exception:
+                    balances[addr] = None
+            return balances
+
+        calls = [
+            (self.address, self._encode(self.contract, 'getEthBalance', [addr]), self._decode_uint)
+            for addr in addresses
+        ]
+        return dict(zip(addresses, self.execute(calls, block_identifier)))
+
+    def token_balance_calls(self, pairs):
+        """balanceOf calls for (token, owner) pairs, for batching with other reads"""
+        return [
+            (token, self._encode(self.erc20, 'balanceOf', [owner]), self._decode_uint)
+            for token, owner in pairs
+        ]
+
+    def token_balances(self, pairs, block_identifier='latest'):
+        """ERC20 balanceOf for many (token, owner) pairs in one call"""
+        return dict(zip(pairs, self.execute(self.token_balance_calls(pairs), block_identifier)))
+
+    def token_metadata(self, tokens):
+        """symbol and decimals for many tokens in one call; failed fields are None"""
+        symbol_data = self._encode(self.erc20, 'symbol')
+        decimals_data = self._encode(self.erc20, 'decimals')
+        calls = []
+        for token in tokens:
+            calls.append((token, symbol_data, self._decode_symbol))
+            calls.append((token, decimals_data, self._decode_uint))
+
+        results = self.execute(calls)
+        return {
+            token: {'symbol': results[2 * i], 'decimals': results[2 * i + 1]}
+            for i, token in enumerate(tokens)
+        }
+
+multicall = MulticallReader(MULTICALL3_ADDRESS)
+
+# ---------------- ON-CHAIN PRICE ORACLE ---------------- #
+class PoolPriceOracle:
+    """ETH/USD from a Uniswap-style WETH/stablecoin pool, read through our own node.
+
+    v3 pools are priced from slot0's sqrtPriceX96, v2 pairs from getReserves.
+    Token order and decimals are read once. Prices are cached per block, so
+    pricing costs at most one eth_call per block, and `call()` lets batched
+    reads (e.g. campaign reconciliation) carry the price in their multicall.
+    'latest' reads are cached for POOL_PRICE_LATEST_TTL seconds instead.
+    """
+
+    def __init__(self, pool_address, pool_type, weth_address):
+        self.address = w3.to_checksum_address(pool_address)
+        self.pool_type = pool_type
+        self.weth = w3.to_checksum_address(weth_address)
+        self.contract = w3.eth.contract(address=self.address, abi=UNISWAP_POOL_ABI)
+        fn_name = 'slot0' if pool_type == 'v3' else 'getReserves'
+        self._calldata = bytes.fromhex(self.contract.encodeABI(fn_name=fn_name)[2:])
+        self._layout = None  # (weth_is_token0, token0 decimals, token1 decimals)
+        self._cached = (None, 0)  # (block number, price), swapped as one tuple
+        self._latest = (0.0, 0)  # (read time, price) of the last 'latest' read
+
+    def _load_layout(self):
+        """Which side of the pool is WETH, plus both decimals (read once)"""
+        if self._layout is None:
+            decode_address = lambda data: w3.to_checksum_address(w3.codec.decode(['address'], data)[0])
+            token0, token1 = multicall.execute([
+                (self.address, bytes.fromhex(self.contract.encodeABI(fn_name=fn_name)[2:]), decode_address)
+                for fn_name in ('token0', 'token1')
+            ])
+            if self.weth not in (token0, token1):
+                raise ValueError(f"Pool {self.address} ({token0}/{token1}) does not hold WETH {self.weth}")
+            prefetch_token_info([token0, token1])
+            self._layout = (token0 == self.weth, get_cached_token_decimals(token0), get_cached_token_decimals(token1))
+        return self._layout
+
+    def call(self):
+        """(target, calldata, decoder) for MulticallReader.execute; decodes to the USD price"""
+        return self.address, self._calldata, self._decode
+
+    def _decode(self, data):
+        weth_is_token0, decimals0, decimals1 = self._load_layout()
+        if self.pool_type == 'v3':
+            sqrt_price_x96 = w3.codec.decode(['uint160'], data[:32])[0]
+            # token1 per token0 in raw units is (sqrtPriceX96 / 2**96) ** 2
+            ratio = sqrt_price_x96 * sqrt_price_x96 / 2 ** 192
+        else:
+            reserve0, reserve1 = w3.codec.decode(['uint112', 'uint112'], data[:64])
+            ratio = reserve1 / reserve0 if reserve0 else 0
+        ratio *= 10 ** (decimals0 - decimals1)  # token1 per token0 in whole units
+        if ratio <= 0:
+            return 0
+        return ratio if weth_is_token0 else 1 / ratio
+
+    def remember(self, block_number, price):
+        """Cache a price read as part of another batch"""
+        if not price:
+            return
+        if block_number == 'latest':
+            self._latest = (time.time(), price)
+        elif isinstance(block_number, int):
+            self._cached = (block_number, price)
+
+    def price(self, block_number):
+        """ETH/USD at `block_number` (or 'latest'), from cache or one eth_call; 0 if the pool can't be read"""
+        if block_number == 'latest':
+            read_at, cached_price = self._latest
+            if time.time() - read_at < Config.POOL_PRICE_LATEST_TTL:
+                return cached_price
+        else:
+            cached_block, cached_price = self._cached
+            if cached_block == block_number:
+                return cached_price
+
+        try:
+            with PRICE_LATENCY.time(source='pool'):
+                data = safe_web3_call(
+                    lambda: w3.eth.call({'to': self.address, 'data': self._calldata}, block_number),
+                    max_retries=1
+                )
+                price = self._decode(bytes(data))
+        except Exception as e:
+            PRICE_FAILURES.inc(source='pool')
+            logger.warning(f"Failed to read ETH price from pool {self.address}: {e}")
+            return 0
+
+        self.remember(block_number, price)
+        return price
+
+price_oracle = PoolPriceOracle(ETH_USD_POOL_ADDRESS, ETH_USD_POOL_TYPE, WETH_ADDRESS) if ETH_USD_POOL_ADDRESS else None
+
+# ---------------- CONTRIBUTION LEDGER ---------------- #
+class ContributionLedger:
+    """Append-only SQLite ledger of detected transfers.
+
+    The scanner only enqueues rows; a background writer drains the queue and
+    bulk-inserts them so disk I/O never blocks block processing.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transfers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            block_number INTEGER NOT NULL,
+            block_timestamp INTEGER NOT NULL,
+            tx_hash TEXT NOT NULL,
+            log_index INTEGER NOT NULL,
+            source TEXT NOT NULL,
+            token_address TEXT,
+            token_symbol TEXT NOT NULL,
+            amount REAL NOT NULL,
+            amount_raw TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            switch_address TEXT NOT NULL,
+            switch_label TEXT,
+            counterparty TEXT NOT NULL,
+            UNIQUE (tx_hash, source, log_index, switch_address)
+        );
+        CREATE INDEX IF NOT EXISTS idx_transfers_time ON transfers (block_timestamp);
+        -- Symbols collide ('UNKNOWN', copycat tokens); per-token lookups go by contract address
+        DROP INDEX IF EXISTS idx_transfers_token;
+        CREATE INDEX IF NOT EXISTS idx_transfers_token_address ON transfers (token_address, block_timestamp);
+        CREATE INDEX IF NOT EXISTS idx_transfers_switch ON transfers (switch_address, block_timestamp);
+        CREATE INDEX IF NOT EXISTS idx_transfers_counterparty ON transfers (counterparty, block_timestamp);
+    """
+
+    INSERT_SQL = """
+        INSERT OR IGNORE INTO transfers (
+            block_number, block_timestamp, tx_hash, log_index, source,
+            token_address, token_symbol, amount, amount_raw, direction,
+            switch_address, switch_label, counterparty
+        ) VALUES (
+            :block_number, :block_timestamp, :tx_hash, :log_index, :source,
+            :token_address, :token_symbol, :amount, :amount_raw, :direction,
+            :switch_address, :switch_label, :counterparty
+        )
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._queue = queue.Queue()
+        self._writer_thread = None
+        self.rows_written = 0
+        self.enabled = True
+
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        """Start the background writer thread"""
+        if self._writer_thread is None:
+            self._writer_thread = threading.Thread(target=self._run_writer, daemon=True)
+            self._writer_thread.start()
+
+    def record(self, block_number, block_timestamp, tx_hash, log_index, source, token_address,
+               token_symbol, amount, amount_raw, direction, switch_address, counterparty):
+        """Queue a transfer for insertion (never blocks on disk)"""
+        if not self.enabled:
+            return
+        self._queue.put({
+            'block_number': int(block_number),
+            'block_timestamp': int(block_timestamp),
+            'tx_hash': tx_hash,
+            'log_index': int(log_index),
+            'source': source,
+            'token_address': token_address,
+            'token_symbol': token_symbol,
+            'amount': float(amount),
+            'amount_raw': str(amount_raw),
+            'direction': direction,
+            'switch_address': switch_address,
+            'switch_label': tracking.wallets.get(switch_address),
+            'counterparty': counterparty,
+        })
+
+    def pending(self):
+        """Number of rows waiting to be written"""
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        """Block until every queued row has been written (or timeout expires)"""
+        deadline = time.time() + timeout if timeout is not None else None
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _run_writer(self):
+        """Drain the queue in batches and bulk-insert them"""
+        logger.info(f"✅ Ledger writer started ({self.db_path})")
+        conn = self._connect()
+
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + Config.LEDGER_FLUSH_INTERVAL
+            while len(batch) < Config.LEDGER_BATCH_SIZE:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                with conn:
+                    conn.executemany(self.INSERT_SQL, batch)
+                self.rows_written += len(batch)
+                logger.debug(f"Ledger wrote {len(batch)} rows")
+            except Exception as e:
+                logger.error(f"Ledger write failed for {len(batch)} rows: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def totals_since(self, since_ts):
+        """Transfer count and volume per token and direction since a unix timestamp"""
+        return self._query(
+            """
+            SELECT token_address, token_symbol, direction, COUNT(*), SUM(amount)
+            FROM transfers
+            WHERE block_timestamp >= ?
+            GROUP BY token_address, token_symbol, direction
+            ORDER BY token_symbol, direction
+            """,
+            (int(since_ts),)
+        )
+
+    def top_counterparties(self, since_ts, limit):
+        """Most active counterparties per token since a unix timestamp"""
+        return self._query(
+            """
+            SELECT counterparty, token_symbol, COUNT(*), SUM(amount)
+            FROM transfers
+            WHERE block_timestamp >= ?
+            GROUP BY counterparty, token_symbol
+            ORDER BY COUNT(*) DESC, SUM(amount) DESC
+            LIMIT ?
+            """,
+            (int(since_ts), int(limit))
+        )
+
+ledger = ContributionLedger(LEDGER_DB_PATH)
+
+# ---------------- ROLLING CONTRIBUTION STATS ---------------- #
+class RollingStats:
+    """Constant-memory rolling transfer totals per (token, switch, direction).
+
+    Every series keeps one fixed ring of buckets per STATS_RESOLUTIONS entry
+    (e.g. 60 one-minute and 168 one-hour buckets). Each bucket remembers which
+    period it holds, so slots from an earlier lap read as empty and are reused
+    on the next add without any sweeping. A windowed total is answered from
+    the finest ring spanning the window in O(buckets), whatever the transfer
+    volume. Beyond STATS_MAX_SERIES, the least recently updated series are evicted.
+    """
+
+    def __init__(self, resolutions, max_series):
+        self.resolutions = tuple(tuple(resolution) for resolution in resolutions)  # ((bucket seconds, buckets), ...)
+        self.max_series = max_series
+        self._series = OrderedDict()  # (token, switch, direction) -> {'symbol', 'rings'}
+        self._lock = threading.Lock()
+
+    def _new_rings(self):
+        # Per resolution: bucket periods, transfer counts, amounts, USD values
+        return [
+            [array('q', [-1]) * buckets, array('q', [0]) * buckets, array('d', [0.0]) * buckets, array('d', [0.0]) * buckets]
+            for _, buckets in self.resolutions
+        ]
+
+    def add(self, timestamp, token, symbol, switch, direction, amount, usd_value=None, now=None):
+        """Count one transfer at `timestamp` (seconds); usd_value None when it had no price"""
+        now = time.time() if now is None else now
+        timestamp = min(timestamp, now)  # clock skew must not place transfers in the future
+        key = (token, switch, direction)
+
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'symbol': symbol, 'rings': self._new_rings()}
+            self._series.move_to_end(key)
+
+            for (width, buckets), (periods, counts, amounts, usd) in zip(self.resolutions, series['rings']):
+                period = int(timestamp // width)
+                if period <= int(now // width) - buckets:
+                    continue  # older than this ring reaches back
+                slot = period % buckets
+                if periods[slot] != period:
+                    periods[slot], counts[slot], amounts[slot], usd[slot] = period, 0, 0.0, 0.0
+                counts[slot] += 1
+                amounts[slot] += float(amount)
+                usd[slot] += usd_value or 0.0
+
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+
+    def totals(self, window_seconds, now=None):
+        """[(token, symbol, switch, direction, count, amount, usd)] over the last `window_seconds`"""
+        now = time.time() if now is None else now
+        ring = next(
+            (index for index, (width, buckets) in enumerate(self.resolutions) if width * buckets >= window_seconds),
+            len(self.resolutions) - 1
+        )
+        width, buckets = self.resolutions[ring]
+        newest = int(now // width)
+        oldest = newest - min(buckets, math.ceil(window_seconds / width)) + 1
+
+        rows = []
+        with self._lock:
+            for (token, switch, direction), series in self._series.items():
+                periods, counts, amounts, usd = series['rings'][ring]
+                count, amount, usd_total = 0, 0.0, 0.0
+                for slot in range(buckets):
+                    if oldest <= periods[slot] <= newest:
+                        count += counts[slot]
+                        amount += amounts[slot]
+                        usd_total += usd[slot]
+                if count:
+                    rows.append((token, series['symbol'], switch, direction, count, amount, usd_total))
+        return rows
+
+    def __len__(self):
+        return len(self._series)
+
+    def snapshot(self):
+        """JSON-ready copy of every ring for the state snapshot"""
+        with self._lock:
+            return {
+                'resolutions': [list(resolution) for resolution in self.resolutions],
+                'series': [
+                    [token, switch, direction, series['symbol'], [[list(column) for column in ring] for ring in series['rings']]]
+                    for (token, switch, direction), series in self._series.items()
+                ],
+            }
+
+    def restore(self, state):
+        """Reload a snapshot taken with the same resolutions (other layouts are ignored)"""
+        if [tuple(resolution) for resolution in state.get('resolutions', [])] != list(self.resolutions):
+            logger.warning("Rolling stats snapshot uses different resolutions, starting empty")
+            return
+        with self._lock:
+            for token, switch, direction, symbol, rings in state.get('series', []):
+                self._series[(token, switch, direction)] = {
+                    'symbol': symbol,
+                    'rings': [
+                        [array('q', periods), array('q', counts), array('d', amounts), array('d', usd)]
+                        for periods, counts, amounts, usd in rings
+                    ],
+                }
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+
+contribution_stats = RollingStats(Config.STATS_RESOLUTIONS, Config.STATS_MAX_SERIES)
+
+# ---------------- SHARD COORDINATION ---------------- #
+def parse_shard(value):
+    """Parse an `i/N` shard spec into (index, count)"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like i/N, got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 0 and {count - 1}")
+    return index, count
+
+def shard_wallets(wallets, index, count):
+    """Stable, disjoint subset of the tracked wallets for shard `index` of `count`"""
+    return {addr: label for addr, label in wallets.items() if int(addr, 16) % count == index}
+
+class ShardCoordinator:
+    """SQLite-backed coordination between scanner processes (no external service).
+
+    Each shard process leases its (job, shard) slot, reports a watermark (every
+    block up to it has been scanned by that shard) and writes notification
+    events to a shared outbox instead of Telegram. The merger releases outbox
+    events up to the lowest watermark of a job in chain order; the outbox's
+    unique key drops events that several shards or jobs produce twice.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS shards (
+        job TEXT NOT NULL,
+        shard INTEGER NOT NULL,
+        shard_count INTEGER NOT NULL,
+        watermark INTEGER NOT NULL,
+        finished INTEGER NOT NULL DEFAULT 0,
+        owner TEXT NOT NULL,
+        lease_expires REAL NOT NULL,
+        PRIMARY KEY (job, shard)
+    );
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job TEXT NOT NULL,
+        block_number INTEGER NOT NULL,
+        log_index INTEGER NOT NULL,
+        tx_hash TEXT NOT NULL,
+        switch_address TEXT NOT NULL,
+        event TEXT NOT NULL,
+        created REAL NOT NULL,
+        delivered INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (tx_hash, log_index, switch_address)
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (delivered, job, block_number, log_index);
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        self._last_pruned = 0
+        self._stale_warned = set()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        """Per-thread autocommit connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, job, shard, shard_count, watermark, resume=True):
+        """Lease a shard slot and return the watermark to start from.
+
+        Raises if another live process holds the slot. With `resume` a
+        restarted shard continues from its stored watermark.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT owner, lease_expires, watermark FROM shards WHERE job = ? AND shard = ?", (job, shard)
+            ).fetchone()
+            if row and row[0] != self.owner and row[1] > time.time():
+                raise RuntimeError(f"{job} shard {shard}/{shard_count} is leased by {row[0]}")
+            if row and resume:
+                watermark = row[2]
+            conn.execute(
+                """INSERT INTO shards (job, shard, shard_count, watermark, finished, owner, lease_expires)
+                   VALUES (?, ?, ?, ?, 0, ?, ?)
+                   ON CONFLICT (job, shard) DO UPDATE SET shard_count = excluded.shard_count,
+                       watermark = excluded.watermark, finished = 0, owner = excluded.owner,
+                       lease_expires = excluded.lease_expires""",
+                (job, shard, shard_count, watermark, self.owner, time.time() + Config.SHARD_LEASE_SECONDS)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return watermark
+
+    def heartbeat(self, job, shard, watermark, finished=False):
+        """Advance the watermark and renew the lease; False if the lease was lost"""
+        cursor = self._conn().execute(
+            "UPDATE shards SET watermark = ?, finished = ?, lease_expires = ? WHERE job = ? AND shard = ? AND owner = ?",
+            (watermark, int(finished), time.time() + Config.SHARD_LEASE_SECONDS, job, shard, self.owner)
+        )
+        return cursor.rowcount == 1
+
+    def renew(self, job, shard):
+        """Extend the lease without moving the watermark; False if the lease was lost"""
+        cursor = self._conn().execute(
+            "UPDATE shards SET lease_expires = ? WHERE job = ? AND shard = ? AND owner = ?",
+            (time.time() + Config.SHARD_LEASE_SECONDS, job, shard, self.owner)
+        )
+        return cursor.rowcount == 1
+
+    def release(self, job, shard):
+        """Give up a lease so a replacement process can take over immediately"""
+        self._conn().execute(
+            "UPDATE shards SET lease_expires = 0 WHERE job = ? AND shard = ? AND owner = ?", (job, shard, self.owner)
+        )
+
+    def publish(self, job, event):
+        """Append a notification event to the outbox (duplicates are ignored)"""
+        self._conn().execute(
+            """INSERT OR IGNORE INTO outbox (job, block_number, log_index, tx_hash, switch_address, event, created)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (job, int(event['block_number']), int(event['log_index']), event['tx_hash'],
+             event['switch_address'], json.dumps(event), time.time())
+        )
+
+    def pending(self):
+        """Outbox events not yet handed to the merger's coalescer"""
+        return self._conn().execute("SELECT COUNT(*) FROM outbox WHERE delivered = 0").fetchone()[0]
+
+    @staticmethod
+    def _owner_gone(owner):
+        """Whether a lease owner ('host:pid') is a process on this host that no longer exists"""
+        host, _, pid = owner.rpartition(':')
+        if host != socket.gethostname():
+            return False  # can't tell for other hosts
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (PermissionError, ValueError):
+            pass
+        return False
+
+    def release_points(self, live_shards):
+        """Highest block per job below which every shard has finished scanning.
+
+        A shard whose lease lapsed is merged without only once it is known to
+        be gone (released, or its process no longer exists). A shard that may
+        still be scanning holds its job back: releasing past it would deliver
+        its later events out of chain order.
+        """
+        slots = {}
+        for job, shard, shard_count, watermark, finished, owner, lease_expires in self._conn().execute(
+            "SELECT job, shard, shard_count, watermark, finished, owner, lease_expires FROM shards"
+        ):
+            slots.setdefault(job, []).append((shard, shard_count, watermark, finished, owner, lease_expires))
+
+        points = {}
+        now = time.time()
+        for job, job_slots in slots.items():
+            expected = live_shards if job == 'live' else job_slots[0][1]
+            job_slots = [slot for slot in job_slots if slot[0] < expected]
+            if len(job_slots) < expected:
+                continue  # some shard has not reported yet, so ordering can't be guaranteed
+
+            # A dead shard must not hold back everyone else's notifications forever
+            active = []
+            held = False
+            for shard, _, watermark, finished, owner, lease_expires in job_slots:
+                if finished or lease_expires > now:
+                    active.append(watermark)
+                    self._stale_warned.discard((job, shard))
+                    continue
+                gone = lease_expires == 0 or self._owner_gone(owner)
+                if not gone:
+                    held = True
+                if (job, shard) not in self._stale_warned:
+                    self._stale_warned.add((job, shard))
+                    if gone:
+                        logger.warning(f"⚠️ {job} shard {shard}/{expected} is gone, merging without it")
+                    else:
+                        logger.critical(f"🚨 {job} shard {shard}/{expected} lease expired but {owner} may still be "
+                                        f"scanning, holding {job} notifications until it renews or is restarted")
+            if active and not held:
+                points[job] = min(active)
+        return points
+
+    def merge_once(self, live_shards):
+        """Hand releasable outbox events to the notification coalescer in chain order"""
+        conn = self._conn()
+        merged = 0
+        for job, upto in self.release_points(live_shards).items():
+            rows = conn.execute(
+                """SELECT id, event FROM outbox WHERE delivered = 0 AND job = ? AND block_number <= ?
+                   ORDER BY block_number, log_index, id""",
+                (job, upto)
+            ).fetchall()
+            for row_id, event in rows:
+                event = json.loads(event)
+                if job == 'live':
+                    # Scanner shards run in other processes; their live transfers are counted here
+                    contribution_stats.add(event.get('block_timestamp') or time.time(), event.get('token_address'),
+                                           event['token_symbol'], event['switch_address'], event['tx_type'],
+                                           event['amount'], event.get('usd_value'))
+                notification_coalescer.add(event)
+                conn.execute("UPDATE outbox SET delivered = 1 WHERE id = ?", (row_id,))
+            merged += len(rows)
+
+        if time.time() - self._last_pruned > 3600:
+            self._last_pruned = time.time()
+            conn.execute(
+                "DELETE FROM outbox WHERE delivered = 1 AND created < ?",
+                (time.time() - Config.SHARD_OUTBOX_RETENTION,)
+            )
+        return merged
+
+class ShardOutbox:
+    """Takes the notification coalescer's place in shard processes: events go to the shared outbox"""
+
+    def __init__(self, coordinator, job):
+        self.coordinator = coordinator
+        self.job = job
+
+    def add(self, event):
+        NOTIFICATIONS_QUEUED.inc(token=event['token_symbol'])
+        self.coordinator.publish(self.job, event)
+
+    def pending(self):
+        return 0
+
+    def flush(self, timeout=None):
+        return True  # publish() writes through
+
+shard_coordinator = None  # set up in initialization (merger) or by the scan/backfill CLI
+
+# ---------------- CAMPAIGN TRACKING ---------------- #
+class CampaignTracker:
+    """Campaign balances maintained incrementally from scanned transfers.
+
+    Balances are raw integer amounts keyed by token contract ('ETH' for the
+    native balance). Reads are plain dict lookups; drift from gas costs or
+    missed blocks is corrected by periodic on-chain reconciliation.
+    """
+
+    NATIVE = 'ETH'
+
+    def __init__(self, address, tokens=()):
+        self.address = w3.to_checksum_address(address)
+        self._lock = threading.Lock()
+        self.balances = {self.NATIVE: 0}
+        for token in tokens:
+            self.balances[w3.to_checksum_address(token)] = 0
+        self.last_reconciled = 0
+        self.reconciled_block = None
+
+    def apply(self, token, delta, block_number=None):
+        """Apply a signed raw-amount change for a token.
+
+        Changes from blocks at or before the last reconciled block are already
+        in the on-chain balances and are skipped.
+        """
+        with self._lock:
+            if isinstance(self.reconciled_block, int) and block_number is not None \
+                    and block_number <= self.reconciled_block:
+                return
+            self.balances[token] = self.balances.get(token, 0) + delta
+
+    def snapshot(self):
+        """Copy of the current raw balances"""
+        with self._lock:
+            return dict(self.balances)
+
+    def tokens(self):
+        """Token contracts with a tracked balance (excluding native ETH)"""
+        with self._lock:
+            return [token for token in self.balances if token != self.NATIVE]
+
+    def apply_onchain(self, onchain, block_identifier):
+        """Replace tracked balances with on-chain values and log any drift.
+
+        Returns how many balances were read; with none, the tracker still counts
+        as unreconciled so the next pass tries again.
+        """
+        applied = 0
+        with self._lock:
+            for token, balance in onchain.items():
+                if balance is None:
+                    logger.warning(f"Campaign {self.address} reconcile failed for token {token}")
+                    continue
+                drift = balance - self.balances.get(token, 0)
+                if drift and self.last_reconciled:
+                    logger.info(f"🔧 Campaign balance drift corrected for {token}: {drift}")
+                self.balances[token] = balance
+                applied += 1
+            if applied:
+                self.last_reconciled = time.time()
+                self.reconciled_block = block_identifier
+        return applied
+
+    def progress(self, eth_price, target_usd):
+        """Compute ETH balance, USD value, progress percent and per-token lines"""
+        balances = self.snapshot()
+        prefetch_token_info([token for token in balances if token != self.NATIVE])
+        bal_eth = w3.from_wei(balances.get(self.NATIVE, 0), 'ether')
+        current_usd = float(bal_eth) * eth_price
+        token_lines = []
+
+        for token, raw in balances.items():
+            if token == self.NATIVE or raw == 0:
+                continue
+            info = get_cached_token_info(token)
+            amount = raw / (10 ** info['decimals'])
+            usd = token_prices.usd_value(token, amount)
+            if usd is None:
+                token_lines.append(f"{amount:,.4f} {info['symbol']}")
+                continue
+            current_usd += usd
+            if token in STABLECOIN_ADDRESSES:
+                token_lines.append(f"{amount:,.4f} {info['symbol']}")
+            else:
+                token_lines.append(f"{amount:,.4f} {info['symbol']} (≈ ${usd:,.2f})")
+
+        percent = min(100, (current_usd / target_usd) * 100)
+        return bal_eth, current_usd, percent, token_lines
+
+class Campaign:
+    """One hosted campaign: its settings plus the balance tracker fed by the shared scanner"""
+
+    def __init__(self, name, address, target_usd, label=GLOBAL_LABEL, chat_ids=None,
+                 summary_interval_minutes=SUMMARY_INTERVAL_MINUTES, tokens=(), summary_enabled=True):
+        self.name = name
+        self.label = label
+        self.address = w3.to_checksum_address(address)
+        self.target_usd = float(target_usd)
+        self.chat_ids = [str(chat_id) for chat_id in chat_ids] if chat_ids else TELEGRAM_CHAT_IDS
+        self.summary_interval = int(summary_interval_minutes) * 60
+        self.summary_enabled = summary_enabled
+        self.summary_errors = 0
+        self.tracker = CampaignTracker(self.address, tokens)
+
+    def progress(self, eth_price):
+        """ETH balance, USD value, progress percent and token lines for this campaign"""
+        return self.tracker.progress(eth_price, self.target_usd)
+
+def load_campaigns(path):
+    """Campaigns from a JSON file, or the single env-configured campaign if the file doesn't exist"""
+    if not os.path.exists(path):
+        campaign = Campaign('default', CAMPAIGN_ADDRESS, CAMPAIGN_TARGET_USD, tokens=CAMPAIGN_TOKENS)
+        if campaign.summary_interval <= 0:
+            raise ValueError(f"SUMMARY_INTERVAL_MINUTES must be positive, got {SUMMARY_INTERVAL_MINUTES}")
+        return {'default': campaign}
+
+    with open(path) as f:
+        entries = json.load(f)
+
+    loaded = {}
+    for entry in entries:
+        campaign = Campaign(
+            entry['name'], entry['address'], entry['target_usd'],
+            label=entry.get('label', GLOBAL_LABEL),
+            chat_ids=entry.get('chat_ids'),
+            summary_interval_minutes=entry.get('summary_interval_minutes', SUMMARY_INTERVAL_MINUTES),
+            tokens=entry.get('tokens', ()),
+            summary_enabled=entry.get('summary_enabled', True)
+        )
+        if campaign.name in loaded:
+            raise ValueError(f"Duplicate campaign name in {path}: {campaign.name}")
+        if campaign.summary_interval <= 0:
+            # A zero interval would re-run the summary job on every timer wheel tick
+            raise ValueError(f"summary_interval_minutes must be positive for campaign {campaign.name} in {path}")
+        if any(other.address == campaign.address for other in loaded.values()):
+            raise ValueError(f"Campaign address used twice in {path}: {campaign.address}")
+        loaded[campaign.name] = campaign
+
+    logger.info(f"✅ Loaded {len(loaded)} campaign(s) from {path}")
+    return loaded
+
+def reconcile_campaigns(block_identifier='latest'):
+    """Re-read every campaign's balances on-chain in one batched multicall.
+
+    If nothing could be read at an older block (e.g. a warm-start block on a
+    non-archive node), reconciles at the chain head instead.
+    """
+    trackers = [campaign.tracker for campaign in campaigns.values()]
+    tokens = {tracker.address: tracker.tokens() for tracker in trackers}
+    eth_balances = multicall.eth_balances([tracker.address for tracker in trackers], block_identifier)
+    pairs = [(token, address) for address, address_tokens in tokens.items() for token in address_tokens]
+    # The pool price rides along in the same batch and is cached for this block
+    calls = multicall.token_balance_calls(pairs) + ([price_oracle.call()] if price_oracle else [])
+    results = multicall.execute(calls, block_identifier)
+    token_balances = dict(zip(pairs, results))
+    if price_oracle:
+        price_oracle.remember(block_identifier, results[-1])
+
+    applied = 0
+    for tracker in trackers:
+        onchain = {CampaignTracker.NATIVE: eth_balances[tracker.address]}
+        for token in tokens[tracker.address]:
+            onchain[token] = token_balances[(token, tracker.address)]
+        applied += tracker.apply_onchain(onchain, block_identifier)
+
+    if trackers and not applied:
+        head = safe_web3_call(lambda: w3.eth.block_number)
+        if head is not None and block_identifier not in ('latest', head):
+            logger.warning(f"⚠️ No campaign balance readable at block {block_identifier}, reconciling at head {head}")
+            return reconcile_campaigns(head)
+        raise RuntimeError(f"No campaign balance readable at block {block_identifier}")
+
+    logger.info(f"✅ Balances of {len(trackers)} campaign(s) reconciled at block {block_identifier}")
+
+def record_campaign_eth_transfer(tx, receipt):
+    """Update campaign trackers for a top-level ETH transfer"""
+    if not tx['value'] or receipt.get('status') == 0:
+        return
+
+    from_addr = w3.to_checksum_address(tx['from']) if tx['from'] else None
+    to_addr = w3.to_checksum_address(tx['to']) if tx['to'] else None
+
+    for address, sign in ((to_addr, 1), (from_addr, -1)):
+        campaign = campaigns_by_address.get(address)
+        if campaign:
+            campaign.tracker.apply(CampaignTracker.NATIVE, sign * tx['value'], tx.get('blockNumber'))
+
+def scan_campaign_token_transfers(from_block, to_block):
+    """Update campaign trackers from ERC20 Transfer logs touching any campaign address.
+
+    Two eth_getLogs calls cover all campaigns (OR-ed address topics).
+    """
+    campaign_topics = ['0x' + address[2:].lower().rjust(64, '0') for address in campaigns_by_address]
+
+    for topics, position, sign in (
+        ([transfer_event_sig, None, campaign_topics], 2, 1),
+        ([transfer_event_sig, campaign_topics], 1, -1)
+    ):
+        logs = safe_web3_call(lambda: w3.eth.get_logs({
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'topics': topics
+        }))
+        for log in logs:
+            # Skip non-standard events that share the signature (e.g. ERC721 transfers)
+            if len(log['topics']) != 3 or len(log['data']) != 32:
+                continue
+            value = int.from_bytes(log['data'], 'big')
+            campaign = campaigns_by_address.get(w3.to_checksum_address(log['topics'][position][-20:]))
+            if value and campaign:
+                campaign.tracker.apply(w3.to_checksum_address(log['address']), sign * value, log['blockNumber'])
+
+campaigns = load_campaigns(CAMPAIGNS_CONFIG_PATH)
+campaigns_by_address = {campaign.address: campaign for campaign in campaigns.values()}
+
+# Live tracking snapshot: the scanner watches the switch wallets plus every campaign address
+tracking = TrackingConfig(*_initial_tracking, campaign_addresses=campaigns_by_address)
+
+# ---------------- TOKEN INFO CACHING SYSTEM ---------------- #
+def get_cached_token_info(contract_address):
+    """Get cached token info to avoid repeat RPC calls"""
+    global TOKEN_CACHE
+    
+    if contract_address in TOKEN_CACHE:
+        return TOKEN_CACHE[contract_address]
+    
+    try:
+        contract = w3.eth.contract(address=contract_address, abi=ERC20_ABI)
+        symbol = safe_web3_call(contract.functions.symbol().call)
+        decimals = safe_web3_call(contract.functions.decimals().call)
+        
+        # Cache the result
+        TOKEN_CACHE[contract_address] = {'symbol': symbol, 'decimals': decimals}
+        logger.debug(f"Cached token info for {contract_address}: {symbol}")
+        return TOKEN_CACHE[contract_address]
+    except Exception:
+        # Cache the failure too to avoid repeat attempts
+        TOKEN_CACHE[contract_address] = {'symbol': 'UNKNOWN', 'decimals': 18}
+        logger.debug(f"Cached failed token lookup for {contract_address}")
+        return TOKEN_CACHE[contract_address]
+
+def prefetch_token_info(contract_addresses):
+    """Warm TOKEN_CACHE for several tokens with a single multicall"""
+    missing = list(dict.fromkeys(addr for addr in contract_addresses if addr not in TOKEN_CACHE))
+    if not missing:
+        return
+
+    try:
+        metadata = multicall.token_metadata(missing)
+    except Exception as e:
+        logger.debug(f"Token metadata prefetch failed: {e}")
+        return
+
+    for addr, info in metadata.items():
+        TOKEN_CACHE[addr] = {
+            'symbol': info['symbol'] if info['symbol'] is not None else 'UNKNOWN',
+            'decimals': info['decimals'] if info['decimals'] is not None else 18
+        }
+    logger.debug(f"Prefetched token info for {len(missing)} tokens")
+
+def get_cached_token_symbol(contract_address):
+    """Get token symbol with aggressive caching"""
+    return get_cached_token_info(contract_address)['symbol']
+
+def get_cached_token_decimals(contract_address):
+    """Get token decimals with aggressive caching"""
+    return get_cached_token_info(contract_address)['decimals']
+
+# ---------------- TOKEN PRICE CACHE ---------------- #
+class TokenPriceCache:
+    """USD prices keyed by token contract, refreshed in bulk off the hot path.
+
+    Lookups only read memory, so messages and aggregates can show USD values
+    without a network call. A timer-wheel job re-prices ETH and every token in
+    TOKEN_CACHE, batching contracts into CoinGecko token_price requests.
+    Prices older than TOKEN_PRICE_TTL are not shown, and the least recently
+    used entries beyond TOKEN_PRICE_MAX_ENTRIES are evicted.
+    """
+
+    NATIVE = 'ETH'
+    URL = 'https://api.coingecko.com/api/v3/simple/token_price/{platform}'
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._prices = OrderedDict()  # address -> (usd price, refreshed at)
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        """Fresh USD price for a token address (or NATIVE), else None"""
+        if token in STABLECOIN_ADDRESSES:
+            return 1.0
+        with self._lock:
+            entry = self._prices.get(token)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.ttl:
+                del self._prices[token]
+                return None
+            self._prices.move_to_end(token)
+            return entry[0]
+
+    def usd_value(self, token, amount):
+        """amount times the cached price, or None when the token has no fresh price"""
+        price = self.get(token)
+        return float(amount) * price if price is not None else None
+
+    def _store(self, prices):
+        now = time.time()
+        with self._lock:
+            for token, price in prices.items():
+                self._prices[token] = (price, now)
+                self._prices.move_to_end(token)
+            while len(self._prices) > self.max_entries:
+                self._prices.popitem(last=False)
+
+    def __len__(self):
+        return len(self._prices)
+
+    def snapshot(self):
+        """{token: [usd price, refreshed at]} for the state snapshot"""
+        with self._lock:
+            return {token: list(entry) for token, entry in self._prices.items()}
+
+    def restore(self, entries):
+        """Reload snapshot entries that are still within the TTL, keeping their refresh times"""
+        now = time.time()
+        with self._lock:
+            for token, (price, refreshed) in entries.items():
+                if now - refreshed <= self.ttl:
+                    self._prices[token] = (price, refreshed)
+            while len(self._prices) > self.max_entries:
+                self._prices.popitem(last=False)
+
+    def _fetch(self, tokens):
+        """One CoinGecko token_price request; returns {address: usd}"""
+        headers = {'User-Agent': 'Frictionless-Bot/1.0'}
+        if COINGECKO_API_KEY:
+            headers['x-cg-demo-api-key'] = COINGECKO_API_KEY
+        with PRICE_LATENCY.time(source='coingecko_tokens'):
+            response = requests.get(
+                self.URL.format(platform=TOKEN_PRICE_PLATFORM),
+                params={'contract_addresses': ','.join(tokens), 'vs_currencies': 'usd'},
+                timeout=10,
+                headers=headers
+            )
+        response.raise_for_status()
+        by_lower = {token.lower(): token for token in tokens}
+        return {
+            by_lower[address.lower()]: float(quote['usd'])
+            for address, quote in response.json().items()
+            if address.lower() in by_lower and quote.get('usd')
+        }
+
+    def refresh(self):
+        """Re-price ETH and every known token; returns how many prices were updated"""
+        prices = {}
+        eth_price = get_eth_price()
+        if eth_price > 0:
+            prices[self.NATIVE] = eth_price
+
+        tokens = [
+            token for token, info in list(TOKEN_CACHE.items())
+            if info['symbol'] != 'UNKNOWN' and token not in STABLECOIN_ADDRESSES
+        ]
+        for start in range(0, len(tokens), Config.TOKEN_PRICE_BATCH_SIZE):
+            batch = tokens[start:start + Config.TOKEN_PRICE_BATCH_SIZE]
+            try:
+                prices.update(self._fetch(batch))
+            except Exception as e:
+                PRICE_FAILURES.inc(source='coingecko_tokens')
+                logger.warning(f"Failed to refresh prices for {len(batch)} token(s): {e}")
+
+        self._store(prices)
+        return len(prices)
+
+token_prices = TokenPriceCache(Config.TOKEN_PRICE_TTL, Config.TOKEN_PRICE_MAX_ENTRIES)
+
+def process_erc20_transfer(log, tx_hash, block_timestamp=None, config=None):
+    """Process ERC20 transfer events from transaction logs"""
+    config = config or tracking
+    try:
+        from web3._utils.events import get_event_data
+        
+        transfer_event_abi = next(
+            abi for abi in ERC20_ABI 
+            if abi.get("type") == "event" and abi.get("name") == "Transfer"
+        )
+        with LOG_DECODE_LATENCY.time():
+            decoded_log = get_event_data(w3.codec, transfer_event_abi, log)
+
+            from_addr = w3.to_checksum_address(decoded_log['args']['from'])
+            to_addr = w3.to_checksum_address(decoded_log['args']['to'])
+            value = decoded_log['args']['value']
+
+        # Determine transaction type and tracked address
+        if to_addr in config.wallets:
+            tx_type = "incoming"
+            tracked_addr = to_addr
+            counterparty = from_addr
+        elif from_addr in config.wallets:
+            if to_addr.lower() in config.excluded:
+                return False  # Skip excluded address
+            tx_type = "outgoing"
+            tracked_addr = from_addr
+            counterparty = to_addr
+        else:
+            return False
+
+        # Token info comes from the cache (warmed in batches by process_transaction)
+        token_info = get_cached_token_info(log['address'])
+        token_symbol = token_info['symbol']
+        decimals = token_info['decimals']
+
+        value_human = value / (10 ** decimals)
+        if value_human == 0:
+            return False
+
+        ledger.record(
+            block_number=log['blockNumber'],
+            block_timestamp=block_timestamp or time.time(),
+            tx_hash=tx_hash,
+            log_index=log['logIndex'],
+            source='erc20',
+            token_address=log['address'],
+            token_symbol=token_symbol,
+            amount=value_human,
+            amount_raw=value,
+            direction=tx_type,
+            switch_address=tracked_addr,
+            counterparty=counterparty
+        )
+
+        usd_value = token_prices.usd_value(log['address'], value_human)
+        if config.live:
+            contribution_stats.add(block_timestamp or time.time(), log['address'], token_symbol, tracked_addr, tx_type,
+                                   value_human, usd_value)
+
+        message = build_frictionless_message(tx_type, token_symbol, value_human, tx_hash, tracked_addr, usd_value)
+        if message and config.live:
+            logger.info(f"Queueing ERC20 message: {message[:100]}...")
+            notification_coalescer.add({
+                'tx_type': tx_type,
+                'token_address': log['address'],
+                'token_symbol': token_symbol,
+                'amount': value_human,
+                'usd_value': usd_value,
+                'tx_hash': tx_hash,
+                'block_number': log['blockNumber'],
+                'block_timestamp': block_timestamp,
+                'log_index': log['logIndex'],
+                'switch_address': tracked_addr,
+                'message': message
+            })
+            return True
+            
+    except Exception as e:
+        logger.warning(f"ERC20 decode error: {e}")
+    
+    return False
+
+def process_eth_transfer(tx, block_timestamp=None, config=None):
+    """Process native ETH transfers"""
+    from_addr = w3.to_checksum_address(tx['from']) if tx['from'] else None
+    to_addr = w3.to_checksum_address(tx['to']) if tx['to'] else None
+    return record_eth_transfer(from_addr, to_addr, tx['value'], tx['hash'].hex(), tx['blockNumber'],
+                               block_timestamp, config)
+
+def record_eth_transfer(from_addr, to_addr, value, tx_hash, block_number, block_timestamp=None, config=None,
+                        source='eth', log_index=-1):
+    """Ledger and notify one ETH movement touching a tracked wallet.
+
+    Top-level transfers use source 'eth' with log_index -1; internal ones use
+    source 'trace' with their trace position as log_index.
+    """
+    config = config or tracking
+
+    if not from_addr or not to_addr or value == 0:
+        return False
+
+    # Check if transaction involves tracked wallets
+    if to_addr in config.wallets:
+        tx_type = "incoming"
+        tracked_addr = to_addr
+        counterparty = from_addr
+    elif from_addr in config.wallets:
+        if to_addr.lower() in config.excluded:
+            return False  # Skip excluded address
+        tx_type = "outgoing"
+        tracked_addr = from_addr
+        counterparty = to_addr
+    else:
+        return False
+
+    value_eth = w3.from_wei(value, 'ether')
+    ledger.record(
+        block_number=block_number,
+        block_timestamp=block_timestamp or time.time(),
+        tx_hash=tx_hash,
+        log_index=log_index,  # -1: native transfers have no log
+        source=source,
+        token_address=None,
+        token_symbol='ETH',
+        amount=value_eth,
+        amount_raw=value,
+        direction=tx_type,
+        switch_address=tracked_addr,
+        counterparty=counterparty
+    )
+
+    usd_value = token_prices.usd_value(TokenPriceCache.NATIVE, float(value_eth))
+    if config.live:
+        contribution_stats.add(block_timestamp or time.time(), TokenPriceCache.NATIVE, 'ETH', tracked_addr, tx_type,
+                               value_eth, usd_value)
+
+    message = build_frictionless_message(tx_type, 'ETH', value_eth, tx_hash, tracked_addr, usd_value)
+    if message and config.live:
+        logger.info(f"Queueing ETH message: {message[:100]}...")
+        notification_coalescer.add({
+            'tx_type': tx_type,
+            'token_address': TokenPriceCache.NATIVE,
+            'token_symbol': 'ETH',
+            'amount': float(value_eth),
+            'usd_value': usd_value,
+            'tx_hash': tx_hash,
+            'block_number': block_number,
+            'block_timestamp': block_timestamp,
+            # Events share one (tx, log_index) key space with ERC20 logs: top-level ETH is -1, traces -2 and below
+            'log_index': -1 if source == 'eth' else -2 - log_index,
+            'switch_address': tracked_addr,
+            'message': message
+        })
+        return True
+    
+    return False
+
+# ---------------- INTERNAL TRANSFERS ---------------- #
+def _trace_int(value):
+    return int(value, 16) if isinstance(value, str) else int(value or 0)
+
+def _trace_hash(value):
+    return value if isinstance(value, str) else value.hex()
+
+def _trace_call(method, *args):
+    # safe_web3_call returns None once rate-limit retries run out; a missing trace must fail the range
+    result = safe_web3_call(getattr(w3.tracing, method), *args)
+    if result is None:
+        raise RuntimeError(f"{method} still rate limited after retries")
+    return result
+
+def internal_value_transfers(traces):
+    """(trace position, from, to, wei) for each internal frame of one transaction that moved ETH.
+
+    Top-level frames (empty traceAddress) are skipped because process_eth_transfer
+    already reports them. Frames at or below a reverted frame moved nothing.
+    """
+    reverted = [tuple(trace['traceAddress']) for trace in traces if trace.get('error')]
+    for position, trace in enumerate(traces):
+        path = tuple(trace['traceAddress'])
+        if not path or any(path[:len(failed)] == failed for failed in reverted):
+            continue
+        action = trace['action']
+        if trace['type'] == 'call' and action.get('callType', 'call') == 'call':
+            sender, recipient, value = action['from'], action['to'], action['value']
+        elif trace['type'] == 'create' and trace.get('result'):
+            sender, recipient, value = action['from'], trace['result']['address'], action['value']
+        elif trace['type'] == 'suicide':
+            sender, recipient, value = action['address'], action['refundAddress'], action['balance']
+        else:
+            continue  # delegatecall/staticcall frames move no ETH of their own
+        value = _trace_int(value)
+        if value:
+            yield position, sender, recipient, value
+
+def _touches(trace, addresses):
+    action = trace['action']
+    parties = (action.get('from'), action.get('to'), action.get('address'), action.get('refundAddress'),
+               (trace.get('result') or {}).get('address'))
+    return any(party and party.lower() in addresses for party in parties)
+
+def fetch_transaction_traces(from_block, to_block, addresses):
+    """{tx_hash: (block_number, traces)} for transactions with internal frames touching `addresses`.
+
+    trace_block returns whole blocks, grouped here per transaction. trace_filter
+    is asked once per direction and window, and only transactions with a
+    matching internal frame are re-read whole with trace_transaction, because
+    revert status lives on ancestor frames that the address filter leaves out.
+    """
+    transactions = {}
+
+    if INTERNAL_TRANSFERS == 'trace_block':
+        for number in range(from_block, to_block + 1):
+            grouped = {}
+            for trace in _trace_call('trace_block', number):
+                if trace.get('transactionHash'):  # block and uncle rewards have none
+                    grouped.setdefault(_trace_hash(trace['transactionHash']), []).append(trace)
+            for tx_hash, traces in grouped.items():
+                if any(trace['traceAddress'] and _touches(trace, addresses) for trace in traces):
+                    transactions[tx_hash] = (number, traces)
+        return transactions
+
+    candidates = {}
+    watched = sorted(w3.to_checksum_address(address) for address in addresses)  # web3 rejects lowercase here
+    for start in range(from_block, to_block + 1, Config.TRACE_FILTER_WINDOW):
+        end = min(to_block, start + Config.TRACE_FILTER_WINDOW - 1)
+        for direction in ('fromAddress', 'toAddress'):
+            matches = _trace_call('trace_filter', {
+                'fromBlock': hex(start),
+                'toBlock': hex(end),
+                direction: watched
+            })
+            for trace in matches:
+                if trace['traceAddress']:
+                    candidates[_trace_hash(trace['transactionHash'])] = trace['blockNumber']
+
+    for tx_hash, number in candidates.items():
+        transactions[tx_hash] = (number, _trace_call('trace_transaction', tx_hash))
+    return transactions
+
+def scan_internal_transfers(from_block, to_block, config=None):
+    """Report ETH moved to/from watched addresses inside contract calls; returns how many were found.
+
+    Every RPC read happens before anything is recorded, so a range that raises
+    can be scanned again without duplicate notifications.
+    """
+    config = config or tracking
+    transfers = []
+
+    for tx_hash, (block_number, traces) in fetch_transaction_traces(from_block, to_block, config.watched_lower).items():
+        for position, sender, recipient, value in internal_value_transfers(traces):
+            from_addr = w3.to_checksum_address(sender)
+            to_addr = w3.to_checksum_address(recipient)
+            if from_addr in config.watched or to_addr in config.watched:
+                transfers.append((tx_hash, block_number, position, from_addr, to_addr, value))
+
+    block_timestamps = {}
+    for block_number in {transfer[1] for transfer in transfers}:
+        block = safe_web3_call(lambda: w3.eth.get_block(block_number))
+        if block is None:
+            raise RuntimeError(f"eth_getBlockByNumber {block_number} still rate limited after retries")
+        block_timestamps[block_number] = block.timestamp
+
+    for tx_hash, block_number, position, from_addr, to_addr, value in transfers:
+        if config.live:
+            for address, sign in ((to_addr, 1), (from_addr, -1)):
+                if address in config.campaign_addresses:
+                    campaigns_by_address[address].tracker.apply(CampaignTracker.NATIVE, sign * value, block_number)
+
+        record_eth_transfer(from_addr, to_addr, value, tx_hash, block_number, block_timestamps[block_number],
+                            config, source='trace', log_index=position)
+
+    if transfers:
+        logger.info(f"🔍 {len(transfers)} internal ETH transfer(s) in blocks {from_block}-{to_block}")
+    return len(transfers)
+
+# ---------------- STREAMING BLOCK READER ---------------- #
+_json_decoder = json.JSONDecoder()
+
+class JsonStream:
+    """Incremental reader over a JSON document arriving as text chunks.
+
+    Only the unread tail of the document is buffered. Values are decoded one at
+    a time with JSONDecoder.raw_decode, so callers can walk into objects and
+    arrays without materialising the whole document.
+    """
+
+    WHITESPACE = ' \t\r\n'
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        for chunk in self._chunks:
+            if chunk:
+                self._buf = self._buf[self._pos:] + chunk
+                self._pos = 0
+                return True
+        self._eof = True
+        return False
+
+    def peek(self):
+        """Next non-whitespace character, without consuming it"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in self.WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def _consume(self, expected):
+        char = self.peek()
+        if char not in expected:
+            raise ValueError(f"Malformed JSON stream: expected one of {expected!r}, got {char!r}")
+        self._pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(self._buf, self._pos)
+                # A number or literal ending at the buffer edge may continue in the next chunk
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def members(self):
+        """Iterate an object's keys; the caller reads or walks each value before advancing"""
+        self._consume('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self._consume(':')
+            yield key
+            if self._consume(',}') == '}':
+                return
+
+    def elements(self):
+        """Iterate an array, decoding one element at a time"""
+        self._consume('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self._consume(',]') == ']':
+                return
+
+block_stream_session = requests.Session()
+_block_stream_ids = itertools.count(1)
+
+def block_request(block_number):
+    """JSON-RPC payload for a full block"""
+    return {'jsonrpc': '2.0', 'id': next(_block_stream_ids), 'method': 'eth_getBlockByNumber',
+            'params': [hex(block_number), True]}
+
+def read_block_transactions(stream, block_number, addresses):
+    """Walk a full-block JSON-RPC response, keeping only transactions from/to `addresses`.
+
+    Returns (timestamp, matches) with matches formatted as web3's get_block would.
+    """
+    timestamp, matches, found = None, [], False
+
+    for key in stream.members():
+        if key == 'error':
+            raise ValueError(f"eth_getBlockByNumber failed: {stream.value()}")
+        if key != 'result' or stream.peek() != '{':
+            stream.value()
+            continue
+        found = True
+        for field in stream.members():
+            if field == 'timestamp':
+                timestamp = int(stream.value(), 16)
+            elif field == 'transactions':
+                for tx in stream.elements():
+                    if (tx.get('from') or '').lower() in addresses or (tx.get('to') or '').lower() in addresses:
+                        matches.append(tx)
+            else:
+                stream.value()
+
+    if not found:
+        raise ValueError(f"Block {block_number} not found")
+    return timestamp, [AttributeDict.recursive(transaction_result_formatter(tx)) for tx in matches]
+
+def stream_block_transactions(block_number, addresses):
+    """Fetch a full block, keeping only transactions from/to `addresses` (lowercase hex).
+
+    Each transaction is decoded on its own from the response stream, checked on
+    its from/to fields and dropped unless it matches, so peak memory no longer
+    grows with block size.
+    """
+    method = 'eth_getBlockByNumber'
+    started = time.perf_counter()
+
+    try:
+        with block_stream_session.post(ETHEREUM_RPC_URL, json=block_request(block_number), stream=True,
+                                       timeout=Config.BLOCK_STREAM_TIMEOUT) as response:
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+            stream = JsonStream(response.iter_content(Config.BLOCK_STREAM_CHUNK_SIZE, decode_unicode=True))
+            return read_block_transactions(stream, block_number, addresses)
+    except Exception:
+        RPC_ERRORS.inc(method=method)
+        raise
+    finally:
+        RPC_LATENCY.observe(time.perf_counter() - started, method=method)
+
+def fetch_block_transactions(block_number, addresses):
+    """(timestamp, transactions from/to `addresses`) for one block; `addresses` are lowercase hex"""
+    if STREAM_BLOCKS:
+        return safe_web3_call(stream_block_transactions, block_number, addresses)
+
+    block = safe_web3_call(lambda: w3.eth.get_block(block_number, full_transactions=True))
+    return block.timestamp, [
+        tx for tx in block.transactions
+        if (tx['from'] or '').lower() in addresses or (tx['to'] or '').lower() in addresses
+    ]
+
+# ---------------- IMPROVED MAIN LOGIC ---------------- #
+def check_blocks(config=None):
+    """Main function to check new blocks for relevant transactions.
+
+    `config` pins the tracking snapshot (e.g. the campaign-only scan of a shard
+    merger); by default every block reads the live `tracking`.
+    """
+    global last_checked, latest_block_seen, last_scan_pass
+    
+    try:
+        latest = safe_web3_call(lambda: w3.eth.block_number)
+    except Exception as e:
+        logger.error(f"Failed to get latest block number: {e}")
+        return
+
+    latest_block_seen = latest
+    last_scan_pass = time.time()
     
     if latest <= last_checked:
         return
         
     logger.info(f"Checking blocks {last_checked + 1} to {latest}")
 
+    scanned_to = last_checked
     for block_number in range(last_checked + 1, latest + 1):
+        if shutdown_event.is_set():
+            logger.info(f"🛑 Shutdown requested, checkpointing after block {scanned_to}")
+            break
         try:
-            process_block(block_number)
+            process_block(block_number, config)
         except Exception as e:
             logger.error(f"Block processing error for block {block_number}: {e}")
             # Continue processing other blocks even if one fails
+        scanned_to = block_number
+
+    if scanned_to == last_checked:
+        return
+
+    scan_range_stages(last_checked + 1, scanned_to, config)
+    last_checked = scanned_to
+
+    if (config or tracking).campaign_addresses and not shutdown_event.is_set():
+        reconcile_campaign_if_due(latest)
+
+pending_internal_ranges = []  # (from, to) block ranges whose internal transfer scan failed, retried next pass
+
+def scan_range_stages(from_block, to_block, config=None):
+    """Range-wide passes that follow the per-block scan: internal transfers and campaign token logs"""
+    config = config or tracking
+    if INTERNAL_TRANSFERS != 'off':
+        ranges = pending_internal_ranges + [(from_block, to_block)]
+        pending_internal_ranges.clear()
+        for start, end in ranges:
+            try:
+                scan_internal_transfers(start, end, config)
+            except Exception as e:
+                logger.error(f"Internal transfer scan error for blocks {start}-{end}, retrying next pass: {e}")
+                if pending_internal_ranges and pending_internal_ranges[-1][1] + 1 == start:
+                    pending_internal_ranges[-1] = (pending_internal_ranges[-1][0], end)
+                else:
+                    pending_internal_ranges.append((start, end))
 
-    last_checked = latest
+    # Shard processes watch no campaign; the merging process runs a campaign-only scan instead
+    if config.campaign_addresses:
+        try:
+            scan_campaign_token_transfers(from_block, to_block)
+        except Exception as e:
+            logger.error(f"Campaign token scan error for blocks {from_block}-{to_block}: {e}")
+
+def reconcile_campaign_if_due(block_identifier='latest'):
+    """Re-read campaign balances on-chain every CAMPAIGN_RECONCILE_INTERVAL"""
+    last_reconciled = min(campaign.tracker.last_reconciled for campaign in campaigns.values())
+    if time.time() - last_reconciled >= Config.CAMPAIGN_RECONCILE_INTERVAL:
+        try:
+            reconcile_campaigns(block_identifier)
+        except Exception as e:
+            logger.error(f"Campaign reconciliation failed: {e}")
 
-def process_block(block_number):
+def process_block(block_number, config=None):
     """Process a single block for relevant transactions"""
     global blocks_processed_count
-    
-    try:
-        block = safe_web3_call(lambda: w3.eth.get_block(block_number, full_transactions=True))
-        
-        for tx in block.transactions:
-            if not tx['to'] and not tx['from']:
-                continue
 
-            to_address = w3.to_checksum_address(tx['to']) if tx['to'] else None
-            from_address = w3.to_checksum_address(tx['from']) if tx['from'] else None
+    # One snapshot per block: config updates apply from the next block on
+    config = config or tracking
+    
+    block_started = time.perf_counter()
 
-            # Skip if transaction doesn't involve tracked wallets
-            if (to_address not in WALLETS_TO_TRACK and 
-                from_address not in WALLETS_TO_TRACK):
-                continue
+    try:
+        # Only transactions involving tracked wallets or a campaign come back
+        block_timestamp, transactions = fetch_block_transactions(block_number, config.watched_lower)
 
-            process_transaction(tx)
+        for tx in transactions:
+            process_transaction(tx, block_timestamp, config)
         
         # Increment blocks processed counter
         blocks_processed_count += 1
+        BLOCK_LATENCY.observe(time.perf_counter() - block_started)
                 
     except Exception as e:
         logger.error(f"Error processing block {block_number}: {e}")
         raise
 
-def process_transaction(tx):
+def process_transaction(tx, block_timestamp=None, config=None):
     """Process a single transaction for token transfers and ETH transfers"""
+    config = config or tracking
+
+    try:
+        with RECEIPT_LATENCY.time():
+            receipt = safe_web3_call(lambda: w3.eth.get_transaction_receipt(tx.hash))
+        handle_transaction_receipt(tx, receipt, block_timestamp, config)
+    except Exception as e:
+        logger.error(f"Transaction processing error for {tx.hash.hex()}: {e}")
+
+def transfer_logs_of(receipt):
+    """ERC20-style Transfer logs (three topics) of a receipt"""
+    return [
+        log for log in receipt.logs
+        if len(log['topics']) == 3 and log['topics'][0].hex() == transfer_event_sig
+    ]
+
+def handle_transaction_receipt(tx, receipt, block_timestamp=None, config=None):
+    """Report the token and ETH transfers of a fetched transaction receipt"""
+    config = config or tracking
+
     try:
-        receipt = safe_web3_call(lambda: w3.eth.get_transaction_receipt(tx.hash))
         found_token_transfer = False
 
+        if config.live:
+            record_campaign_eth_transfer(tx, receipt)
+
+        transfer_logs = transfer_logs_of(receipt)
+        prefetch_token_info([log['address'] for log in transfer_logs])
+
         # Check for ERC20 transfers in transaction logs
-        for log in receipt.logs:
-            if (len(log['topics']) == 3 and 
-                log['topics'][0].hex() == transfer_event_sig):
-                if process_erc20_transfer(log, tx.hash.hex()):
-                    found_token_transfer = True
+        for log in transfer_logs:
+            if process_erc20_transfer(log, tx.hash.hex(), block_timestamp, config):
+                found_token_transfer = True
 
         # If no ERC20 transfers found, check for ETH transfer
         if not found_token_transfer:
-            process_eth_transfer(tx)
+            process_eth_transfer(tx, block_timestamp, config)
             
     except Exception as e:
         logger.error(f"Transaction processing error for {tx.hash.hex()}: {e}")
 
 # ---------------- IMPROVED CAMPAIGN SUMMARY ---------------- #
 def get_eth_price():
-    """Get ETH price with caching and multiple fallbacks"""
-    global eth_price_cache
-    
+    """Get ETH price with caching and multiple fallbacks"""
+    price = current_eth_price()
+    if price is not None:
+        return price
+    return settle_eth_price(fetch_eth_price_from_apis())
+
+def current_eth_price():
+    """ETH price available without an API request (static, pool or fresh cache), else None"""
     # Use static price if configured
     if STATIC_ETH_PRICE:
         try:
@@ -542,15 +3103,28 @@ def get_eth_price():
             return static_price
         except ValueError:
             logger.warning(f"Invalid STATIC_ETH_PRICE value: {STATIC_ETH_PRICE}")
+
+    # On-chain pool price: no third-party HTTP. While a local scanner keeps last_checked current the
+    # price is pinned to it (one eth_call per block); otherwise (shard merger, webhook-only process,
+    # stalled scanner) it is read at the chain head and reused for POOL_PRICE_LATEST_TTL
+    if price_oracle:
+        scanning = time.time() - last_scan_pass <= Config.SCAN_PASS_STALE_SECONDS
+        block = last_checked if scanning else 'latest'
+        price = price_oracle.price(block)
+        if price > 0:
+            logger.debug(f"Using pool ETH price at block {block}: ${price:.2f}")
+            return price
     
     # Return cached price if still valid
     if (time.time() - eth_price_cache['timestamp']) < Config.PRICE_CACHE_DURATION:
         logger.debug(f"Using cached ETH price: ${eth_price_cache['price']}")
         return eth_price_cache['price']
-    
-    # Try to get fresh price
-    price = fetch_eth_price_from_apis()
-    
+    return None
+
+def settle_eth_price(price):
+    """Cache a freshly fetched API price, falling back to the expired cache when the fetch failed"""
+    global eth_price_cache
+
     if price > 0:
         # Update cache
         eth_price_cache = {
@@ -567,37 +3141,39 @@ def get_eth_price():
     logger.error("Could not fetch ETH price from any source")
     return 0
 
+# ETH/USD APIs tried in order (raced concurrently in ASYNC_MODE) when no static or pool price applies
+ETH_PRICE_SOURCES = [
+    {
+        'name': 'CoinGecko',
+        'url': 'https://api.coingecko.com/api/v3/simple/price',
+        'params': {'ids': 'ethereum', 'vs_currencies': 'usd'},
+        'parser': lambda data: data.get('ethereum', {}).get('usd', 0)
+    },
+    {
+        'name': 'CryptoCompare',
+        'url': 'https://min-api.cryptocompare.com/data/price',
+        'params': {'fsym': 'ETH', 'tsyms': 'USD'},
+        'parser': lambda data: data.get('USD', 0)
+    },
+    {
+        'name': 'Binance',
+        'url': 'https://api.binance.com/api/v3/ticker/price',
+        'params': {'symbol': 'ETHUSDT'},
+        'parser': lambda data: float(data.get('price', 0))
+    }
+]
+
 def fetch_eth_price_from_apis():
     """Fetch ETH price from multiple API sources"""
-    price_sources = [
-        {
-            'name': 'CoinGecko',
-            'url': 'https://api.coingecko.com/api/v3/simple/price',
-            'params': {'ids': 'ethereum', 'vs_currencies': 'usd'},
-            'parser': lambda data: data.get('ethereum', {}).get('usd', 0)
-        },
-        {
-            'name': 'CryptoCompare',
-            'url': 'https://min-api.cryptocompare.com/data/price',
-            'params': {'fsym': 'ETH', 'tsyms': 'USD'},
-            'parser': lambda data: data.get('USD', 0)
-        },
-        {
-            'name': 'Binance',
-            'url': 'https://api.binance.com/api/v3/ticker/price',
-            'params': {'symbol': 'ETHUSDT'},
-            'parser': lambda data: float(data.get('price', 0))
-        }
-    ]
-    
-    for source in price_sources:
+    for source in ETH_PRICE_SOURCES:
         try:
-            response = requests.get(
-                source['url'],
-                params=source['params'],
-                timeout=10,
-                headers={'User-Agent': 'Frictionless-Bot/1.0'}
-            )
+            with PRICE_LATENCY.time(source=source['name']):
+                response = requests.get(
+                    source['url'],
+                    params=source['params'],
+                    timeout=Config.PRICE_FETCH_TIMEOUT,
+                    headers={'User-Agent': 'Frictionless-Bot/1.0'}
+                )
             
             if response.status_code == 200:
                 price_data = response.json()
@@ -606,13 +3182,16 @@ def fetch_eth_price_from_apis():
                 if price > 0:
                     logger.info(f"ETH price updated from {source['name']}: ${price}")
                     return price
+
+            PRICE_FAILURES.inc(source=source['name'])
                     
         except Exception as e:
+            PRICE_FAILURES.inc(source=source['name'])
             logger.warning(f"Failed to get price from {source['name']}: {e}")
     
     return 0
 
-def create_enhanced_progress_chart(bal_eth, current_usd, percent):
+def create_enhanced_progress_chart(bal_eth, current_usd, percent, target_usd):
     """Create progress chart with optional background image"""
     import numpy as np
     import matplotlib.pyplot as plt
@@ -729,174 +3308,1219 @@ def create_enhanced_progress_chart(bal_eth, current_usd, percent):
         
         return text_obj
 
-    # For other text elements:
-    if percent > 10:
-        add_outlined_text_v2(percent/2, bar_y, f'{percent:.1f}%', 16, outline_width=3)
-    else:
-        add_outlined_text_v2(percent + 8, bar_y, f'{percent:.1f}%', 16, outline_width=3)
-    
-    # Add value labels with outline - ADJUSTED POSITIONS
-    add_outlined_text_v2(11, bar_y - .4, "Raised = "f'${current_usd:,.0f}', 14, 
-                        color='#cccccc', outline_color='black', outline_width=4) #moved down from -.4
-    add_outlined_text_v2(89, bar_y - .4, "Goal = "f'${CAMPAIGN_TARGET_USD:,.0f}', 14, 
-                        color='#cccccc', outline_color='black', outline_width=4) #moved down from -.4
-    
-    # Removed corners
-    
-    # Customize the chart
-    ax.set_xlim(-2, 102)
-    ax.set_ylim(-1, 1.5)
-    ax.axis('off')
-    
-    return fig
+    # For other text elements:
+    if percent > 10:
+        add_outlined_text_v2(percent/2, bar_y, f'{percent:.1f}%', 16, outline_width=3)
+    else:
+        add_outlined_text_v2(percent + 8, bar_y, f'{percent:.1f}%', 16, outline_width=3)
+    
+    # Add value labels with outline - ADJUSTED POSITIONS
+    add_outlined_text_v2(11, bar_y - .4, "Raised = "f'${current_usd:,.0f}', 14, 
+                        color='#cccccc', outline_color='black', outline_width=4) #moved down from -.4
+    add_outlined_text_v2(89, bar_y - .4, "Goal = "f'${target_usd:,.0f}', 14, 
+                        color='#cccccc', outline_color='black', outline_width=4) #moved down from -.4
+    
+    # Removed corners
+    
+    # Customize the chart
+    ax.set_xlim(-2, 102)
+    ax.set_ylim(-1, 1.5)
+    ax.axis('off')
+    
+    return fig
+
+def send_campaign_summary(campaign):
+    """Send periodic fundraising campaign updates with enhanced visuals.
+
+    Errors propagate so the summary job can retry and back off (next_summary_delay).
+    """
+    price_usd = get_eth_price()
+    if price_usd == 0:
+        raise RuntimeError("Could not fetch ETH price - summary skipped")
+
+    photo, msg, reply_markup = render_campaign_summary(campaign, price_usd)
+
+    # Send to all Telegram chats
+    send_campaign_to_chats(photo, msg, reply_markup, campaign.chat_ids)
+
+chart_lock = threading.Lock()  # pyplot keeps global state; one chart is drawn at a time
+
+def render_campaign_summary(campaign, price_usd):
+    """(chart PNG bytes, status message, keyboard) for one campaign summary"""
+    # Balances are maintained by the scanner, no RPC needed here
+    bal_eth, current_usd, percent, token_lines = campaign.progress(price_usd)
+
+    # Status message logic
+    status_emoji, status_text = get_status_emoji_and_text(percent)
+
+    msg = build_campaign_status_message(campaign, status_emoji, status_text, bal_eth, token_lines, current_usd, percent)
+
+    keyboard = [[InlineKeyboardButton("💰 Contribute Here", url="https://app.frictionless.network/contribute")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    image = io.BytesIO()
+    with chart_lock, CHART_LATENCY.time():
+        # Create chart
+        fig = create_enhanced_progress_chart(bal_eth, current_usd, percent, campaign.target_usd)
+        try:
+            # Save with high quality
+            fig.savefig(image, format='png', bbox_inches='tight', dpi=Config.IMAGE_DPI,
+                       facecolor='#95C511', edgecolor='none', #changed face color from 1a1a1a
+                       transparent=True, pad_inches=0) #Reduced padding from .15
+        finally:
+            plt.close(fig)
+
+    return image.getvalue(), msg, reply_markup
+
+def build_campaign_status_message(campaign, status_emoji, status_text, bal_eth, token_lines, current_usd, percent):
+    """Build the campaign progress message shared by summaries and /campaign"""
+    token_text = ''.join(f"🪙 **Token:** `{line}`\n" for line in token_lines)
+    # Name the campaign once several share the same chats
+    header = f"🏷 *{campaign.label}*\n" if len(campaigns) > 1 else ''
+    return (
+        f"{header}{status_emoji} *{status_text}*\n\n"
+        f"💰 **Balance:** `{bal_eth:.4f} ETH`\n"
+        f"{token_text}"
+        f"💵 **Value:** `${current_usd:,.2f}` / `${campaign.target_usd:,.2f}`\n"
+        f"📊 **Progress:** `{percent:.1f}%`"
+    )
+
+def get_status_emoji_and_text(percent):
+    """Get appropriate emoji and status text based on progress percentage"""
+    if percent >= 100:
+        return "🎉", "GOAL ACHIEVED!"
+    elif percent >= 75:
+        return "🔥", "Almost There!"
+    elif percent >= 50:
+        return "📈", "Halfway Mark!"
+    elif percent >= 25:
+        return "💪", "Building Momentum"
+    else:
+        return "🚀", "Getting Started"
+
+def send_campaign_to_chats(photo, msg, reply_markup, chat_ids=None):
+    """Send campaign update to the campaign's chats; failed sends are queued for retry"""
+    for chat_id in chat_ids or TELEGRAM_CHAT_IDS:
+        delivery_queue.send(chat_id, 'photo', photo=photo)
+        delivery_queue.send(chat_id, 'message', text=msg, reply_markup=reply_markup)
+
+# ---------------- SCHEDULER ---------------- #
+class TimerWheel:
+    """Hashed timer wheel running many timed jobs on a single thread.
+
+    A job due in `delay` seconds goes into slot (tick + delay/tick_seconds)
+    modulo the wheel size, with a count of full revolutions still to wait.
+    Each tick only the current slot is inspected, so scheduling and expiry cost
+    the same whether one campaign or hundreds are hosted. Jobs run on the wheel
+    thread and reschedule themselves for periodic work.
+    """
+
+    def __init__(self, tick_seconds, slots):
+        self.tick_seconds = tick_seconds
+        self.slots = slots
+        self._wheel = [[] for _ in range(slots)]
+        self._tick = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def schedule(self, delay, callback, name=''):
+        """Run `callback` once after `delay` seconds (rounded up to the next tick)"""
+        ticks = max(1, math.ceil(delay / self.tick_seconds))
+        with self._lock:
+            slot = (self._tick + ticks) % self.slots
+            self._wheel[slot].append([(ticks - 1) // self.slots, callback, name])
+
+    def pending(self):
+        """Number of scheduled jobs"""
+        with self._lock:
+            return sum(len(slot) for slot in self._wheel)
+
+    def start(self):
+        """Start the wheel thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def join(self, timeout=None):
+        """Wait for the wheel thread to return after shutdown_event is set"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        logger.info(f"✅ Scheduler started - {self.pending()} job(s), tick: {self.tick_seconds}s")
+        next_tick = time.monotonic()
+        while True:
+            # Ticks missed while a job ran are caught up without sleeping
+            next_tick += self.tick_seconds
+            if shutdown_event.wait(max(0, next_tick - time.monotonic())):
+                return
+
+            with self._lock:
+                self._tick += 1
+                slot = self._tick % self.slots
+                due, waiting = [], []
+                for timer in self._wheel[slot]:
+                    if timer[0] == 0:
+                        due.append(timer)
+                    else:
+                        timer[0] -= 1
+                        waiting.append(timer)
+                self._wheel[slot] = waiting
+
+            for _, callback, name in due:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Scheduled job {name} failed: {e}")
+
+scheduler = TimerWheel(Config.SCHEDULER_TICK_SECONDS, Config.SCHEDULER_WHEEL_SLOTS)
+
+# ---------------- IMPROVED BACKGROUND THREADS ---------------- #
+def run_scanner(on_cycle=None, config=None):
+    """Background thread for blockchain scanning with better error handling.
+
+    `on_cycle` runs after every successful pass; returning False stops the loop.
+    `config` pins the tracking snapshot (see check_blocks).
+    """
+    logger.info("✅ Scanner thread started")
+    consecutive_errors = 0
+    
+    while not shutdown_event.is_set():
+        try:
+            check_blocks(config)
+            if on_cycle and on_cycle() is False:
+                return
+            consecutive_errors = 0  # Reset error counter on success
+            shutdown_event.wait(Config.BLOCK_CHECK_INTERVAL)
+            
+        except Exception as e:
+            consecutive_errors += 1
+            logger.error(f"🔥 Scanner loop error ({consecutive_errors}/{Config.SCANNER_MAX_CONSECUTIVE_ERRORS}): {repr(e)}")
+            
+            if consecutive_errors >= Config.SCANNER_MAX_CONSECUTIVE_ERRORS:
+                logger.critical("Too many consecutive scanner errors. Extending sleep time.")
+                shutdown_event.wait(Config.SCANNER_EXTENDED_SLEEP)
+                consecutive_errors = 0  # Reset counter
+            else:
+                shutdown_event.wait(Config.SCANNER_ERROR_SLEEP)
+
+    logger.info(f"🛑 Scanner stopped after block {last_checked}")
+
+def run_campaign_summary(campaign):
+    """Timer-wheel job: send one campaign's summary, then schedule the next one"""
+    try:
+        with work_priority(Priority.SUMMARY):
+            send_campaign_summary(campaign)
+        delay = next_summary_delay(campaign)
+    except Exception as e:
+        delay = next_summary_delay(campaign, e)
+
+    scheduler.schedule(delay, lambda: run_campaign_summary(campaign), name=f"summary:{campaign.name}")
+
+def next_summary_delay(campaign, error=None):
+    """Seconds until a campaign's next summary, backing off after repeated errors"""
+    if error is None:
+        campaign.summary_errors = 0
+        logger.info(f"Next {campaign.name} campaign summary in {campaign.summary_interval // 60} minutes")
+        return campaign.summary_interval
+
+    campaign.summary_errors += 1
+    logger.error(f"Summary error for {campaign.name} ({campaign.summary_errors}/{Config.SUMMARY_MAX_CONSECUTIVE_ERRORS}): {error}")
+
+    if campaign.summary_errors >= Config.SUMMARY_MAX_CONSECUTIVE_ERRORS:
+        logger.warning(f"Too many consecutive summary errors for {campaign.name}. Extending sleep time.")
+        campaign.summary_errors = 0  # Reset counter
+        return Config.SUMMARY_EXTENDED_SLEEP
+    return Config.SUMMARY_RETRY_SLEEP
+
+def summary_campaigns():
+    """Campaigns that get periodic summaries"""
+    if not ENABLE_CAMPAIGN_SUMMARY:
+        logger.info("📊 Campaign summary disabled via ENABLE_CAMPAIGN_SUMMARY")
+        return []
+    return [campaign for campaign in campaigns.values() if campaign.summary_enabled]
+
+def schedule_campaign_summaries():
+    """Put every enabled campaign's summary on the timer wheel, staggered to spread the sends"""
+    for position, campaign in enumerate(summary_campaigns()):
+        scheduler.schedule(position * Config.SUMMARY_STAGGER_SECONDS,
+                           lambda campaign=campaign: run_campaign_summary(campaign),
+                           name=f"summary:{campaign.name}")
+        logger.info(f"✅ Summary scheduled for {campaign.name} - interval: {campaign.summary_interval // 60} minutes")
+
+def run_token_price_refresh():
+    """Timer-wheel job: bulk-refresh token USD prices, then schedule the next refresh"""
+    try:
+        with work_priority(Priority.SUMMARY):
+            updated = token_prices.refresh()
+        logger.info(f"💲 Refreshed {updated} token price(s)")
+    except Exception as e:
+        logger.error(f"Token price refresh failed: {e}")
+    scheduler.schedule(Config.TOKEN_PRICE_REFRESH_INTERVAL, run_token_price_refresh, name='token-prices')
+
+def run_shard_merger():
+    """Background thread merging shard outboxes into ordered, deduplicated notifications"""
+    logger.info(f"✅ Shard merger started - {SCANNER_SHARDS} scanner shard(s), db: {SHARD_DB_PATH}")
+
+    while not shutdown_event.is_set():
+        try:
+            merged = shard_coordinator.merge_once(SCANNER_SHARDS)
+            if merged:
+                logger.info(f"🔀 Merged {merged} event(s) from scanner shards")
+        except Exception as e:
+            logger.error(f"Shard merger error: {e}")
+        shutdown_event.wait(Config.SHARD_MERGE_INTERVAL)
+
+def run_shard_scanner(index, count):
+    """Live scanning for one wallet shard; notifications go to the shared outbox"""
+    global last_checked, tracking, notification_coalescer
+
+    last_checked = shard_coordinator.acquire('live', index, count, last_checked)
+    notification_coalescer = ShardOutbox(shard_coordinator, 'live')
+    wallets_mtime = None
+
+    def sync_wallets():
+        # Follow /addswitch etc. made in the bot process through the shared wallets file
+        nonlocal wallets_mtime
+        global tracking
+        mtime = os.path.getmtime(WALLETS_CONFIG_PATH) if os.path.exists(WALLETS_CONFIG_PATH) else None
+        if wallets_mtime is not None and mtime == wallets_mtime:
+            return
+        wallets_mtime = mtime
+        wallets, excluded = load_tracking_file(WALLETS_CONFIG_PATH) or (WALLETS_TO_TRACK, [EXCLUDED_TO_ADDRESS])
+        tracking = TrackingConfig(shard_wallets(wallets, index, count), excluded)
+        logger.info(f"🧩 Shard {index}/{count} watching {len(tracking.wallets)} of {len(wallets)} wallet(s)")
+
+    def on_cycle():
+        sync_wallets()
+        if not shard_coordinator.heartbeat('live', index, last_checked):
+            logger.critical(f"Lost lease on live shard {index}/{count}, stopping")
+            return False
+
+    def keep_lease():
+        # A catch-up pass can outlast the lease; renew it while the pass runs, not only after it
+        while not lease_stop.wait(Config.SHARD_LEASE_RENEW_SECONDS):
+            if not shard_coordinator.renew('live', index):
+                logger.critical(f"Lost lease on live shard {index}/{count}, stopping")
+                shutdown_event.set()
+                return
+
+    sync_wallets()
+    logger.info(f"🧩 Live shard {index}/{count} resuming after block {last_checked}")
+    lease_stop = threading.Event()
+    threading.Thread(target=keep_lease, daemon=True).start()
+    try:
+        run_scanner(on_cycle)
+    finally:
+        lease_stop.set()
+        # Checkpoint the last fully scanned block for whichever process takes the slot next
+        shard_coordinator.heartbeat('live', index, last_checked)
+        shard_coordinator.release('live', index)
+    return 1
+
+# ---------------- ASYNC RUNTIME ---------------- #
+class AsyncRuntime:
+    """Event loop thread running scans, price fetches and Telegram sends as tasks (ASYNC_MODE).
+
+    Every task lives in one TaskGroup under a shared aiohttp session, so
+    stop() cancels them all, waits for their cleanup and closes the connection
+    pool. Long-running loops are started with start() and sleep through idle(),
+    which finish_services() cuts short; other threads hand in one-off work with
+    submit() (fire and forget) or call() (wait for the result).
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.session = None
+        self.w3 = None
+        self.rpc_slots = None
+        self._group = None
+        self._main = None
+        self._stopping = None
+        self._services = []
+        self._thread = None
+        self._ready = threading.Event()
+        self._inflight = set()
+        self._chat_locks = {}
+
+    def start(self, *services):
+        """Start the loop thread and run each service coroutine as a task until stop()"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=asyncio.run, args=(self._run(services),), daemon=True)
+            self._thread.start()
+            self._ready.wait()
+
+    def running(self):
+        return self._group is not None
+
+    async def _run(self, services):
+        self.loop = asyncio.get_running_loop()
+        self._main = asyncio.current_task()
+        self.rpc_slots = asyncio.Semaphore(Config.ASYNC_RPC_CONCURRENCY)
+        self._stopping = asyncio.Event()
+        connector = aiohttp.TCPConnector(limit=Config.ASYNC_HTTP_CONNECTIONS)
+        try:
+            async with aiohttp.ClientSession(connector=connector) as session:
+                self.session = session
+                provider = AsyncWeb3.AsyncHTTPProvider(
+                    ETHEREUM_RPC_URL, request_kwargs={'timeout': aiohttp.ClientTimeout(Config.ASYNC_RPC_TIMEOUT)}
+                )
+                await provider.cache_async_session(session)
+                self.w3 = AsyncWeb3(provider)
+                self.w3.middleware_onion.inject(async_metrics_middleware, 'metrics', layer=0)
+
+                async with asyncio.TaskGroup() as group:
+                    self._group = group
+                    self._services = [group.create_task(self._guard(service)) for service in services]
+                    self._ready.set()
+                    logger.info(f"✅ Async runtime started - {len(services)} service(s), "
+                                f"{Config.ASYNC_RPC_CONCURRENCY} concurrent RPC request(s)")
+                    await asyncio.Event().wait()  # until stop() cancels this task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._group = None
+            self._ready.set()
+            logger.info("🛑 Async runtime stopped")
+
+    @staticmethod
+    async def _guard(coro):
+        # A failing task must not cancel its siblings in the TaskGroup
+        try:
+            await coro
+        except Exception as e:
+            logger.error(f"Async task failed: {e!r}")
+
+    def _spawn(self, coro):
+        if self._group is None:
+            coro.close()
+            logger.warning("Async runtime stopped, dropping task")
+            return
+        task = self._group.create_task(self._guard(coro))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    def submit(self, coro):
+        """Run a coroutine as a runtime task, from any thread, without waiting for it"""
+        if threading.current_thread() is self._thread:
+            self._spawn(coro)
+        else:
+            self.loop.call_soon_threadsafe(self._spawn, coro)
+
+    def call(self, coro, timeout=None):
+        """Run a coroutine on the loop and block the calling thread for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def _drain(self):
+        while self._inflight:
+            await asyncio.wait(list(self._inflight))
+
+    def drain(self, timeout=None):
+        """Wait for every submitted task (e.g. queued sends) to finish; False on timeout"""
+        if not self.running():
+            return True
+        try:
+            self.call(self._drain(), timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def stop(self, timeout=None):
+        """Cancel every task, close the session and join the loop thread"""
+        if self._thread is not None and self._main is not None:
+            self.loop.call_soon_threadsafe(self._main.cancel)
+            self._thread.join(timeout)
+
+    async def idle(self, seconds):
+        """Sleep up to `seconds`; True once finish_services() has been called"""
+        try:
+            async with asyncio.timeout(seconds):
+                await self._stopping.wait()
+        except TimeoutError:
+            pass
+        return self._stopping.is_set()
+
+    async def _finish(self):
+        self._stopping.set()
+        if self._services:
+            await asyncio.wait(self._services)
+
+    def finish_services(self, timeout=None):
+        """Wake the services from idle() and wait for them to return; False on timeout"""
+        if not self.running():
+            return True
+        try:
+            self.call(self._finish(), timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def chat_lock(self, chat_id):
+        """Per-chat lock keeping a chat's sends in submission order"""
+        return self._chat_locks.setdefault(str(chat_id), asyncio.Lock())
+
+async_runtime = AsyncRuntime()
+async_priority = contextvars.ContextVar('async_priority', default=Priority.LIVE)  # work_priority() for tasks
+
+def call_at_priority(priority, func, *args):
+    with work_priority(priority):
+        return func(*args)
+
+async def offload(func, *args):
+    """Run a blocking helper in a worker thread at the calling task's priority"""
+    return await asyncio.to_thread(call_at_priority, async_priority.get(), func, *args)
+
+async def acquire_async(budget):
+    """PriorityBudget.acquire() for a task; the wait happens off the loop"""
+    if budget.rate:
+        await offload(budget.acquire)
+
+async def async_rpc(call, max_retries=None):
+    """safe_web3_call() for tasks: `call` returns a fresh awaitable per attempt.
+
+    Requests share the RPC budget and are capped at ASYNC_RPC_CONCURRENCY in
+    flight; each attempt gets ASYNC_RPC_TIMEOUT. Retries follow the same rules
+    as safe_web3_call, and the last error is raised once they run out.
+    """
+    if max_retries is None:
+        max_retries = Config.WEB3_MAX_RETRIES
+
+    count_rpc_call()
+
+    for attempt in range(max_retries):
+        try:
+            await acquire_async(rpc_budget)
+            async with async_runtime.rpc_slots:
+                async with asyncio.timeout(Config.ASYNC_RPC_TIMEOUT):
+                    return await call()
+        except Exception as e:
+            if attempt == max_retries - 1:
+                logger.error(f"Web3 call failed after {max_retries} attempts: {e!r}")
+                raise
+            error_str = str(e).lower()
+            if is_rate_limited(e):
+                wait_time = min(600, Config.RATE_LIMIT_COOLDOWN * (2 ** attempt))
+                logger.warning(f"🚫 Infura rate limit hit, waiting {wait_time}s...")
+            elif isinstance(e, (TimeoutError, aiohttp.ClientConnectionError)) or \
+                    any(term in error_str for term in NETWORK_ERROR_TERMS):
+                wait_time = Config.WEB3_RETRY_DELAY * (attempt + 1)
+                logger.warning(f"Network error (attempt {attempt + 1}): {e!r}")
+            else:
+                wait_time = Config.WEB3_RETRY_DELAY
+                logger.warning(f"Web3 call failed (attempt {attempt + 1}): {e!r}")
+            await asyncio.sleep(wait_time)
+
+async def async_read_block(block_number, addresses):
+    """stream_block_transactions() over the shared aiohttp session"""
+    method = 'eth_getBlockByNumber'
+    started = time.perf_counter()
+    try:
+        async with async_runtime.session.post(ETHEREUM_RPC_URL, json=block_request(block_number)) as response:
+            response.raise_for_status()
+            body = await response.text()
+        return read_block_transactions(JsonStream([body]), block_number, addresses)
+    except Exception:
+        RPC_ERRORS.inc(method=method)
+        raise
+    finally:
+        RPC_LATENCY.observe(time.perf_counter() - started, method=method)
+
+async def async_fetch_block_transactions(block_number, addresses):
+    """fetch_block_transactions() for tasks"""
+    if STREAM_BLOCKS:
+        return await async_rpc(lambda: async_read_block(block_number, addresses))
+
+    block = await async_rpc(lambda: async_runtime.w3.eth.get_block(block_number, full_transactions=True))
+    return block.timestamp, [
+        tx for tx in block.transactions
+        if (tx['from'] or '').lower() in addresses or (tx['to'] or '').lower() in addresses
+    ]
+
+async def async_fetch_receipt(tx):
+    started = time.perf_counter()
+    receipt = await async_rpc(lambda: async_runtime.w3.eth.get_transaction_receipt(tx.hash))
+    RECEIPT_LATENCY.observe(time.perf_counter() - started)
+    return receipt
+
+async def async_fetch_block(block_number, config):
+    """(timestamp, [(tx, receipt or error)], started) for a block's watched transactions"""
+    started = time.perf_counter()
+    timestamp, transactions = await async_fetch_block_transactions(block_number, config.watched_lower)
+    receipts = await asyncio.gather(*(async_fetch_receipt(tx) for tx in transactions), return_exceptions=True)
+    return timestamp, list(zip(transactions, receipts)), started
+
+def warm_token_cache(contract_addresses):
+    """Token metadata for several contracts: one multicall, per-token calls for what it missed"""
+    prefetch_token_info(contract_addresses)
+    for address in contract_addresses:
+        get_cached_token_info(address)
+
+async def async_check_blocks():
+    """check_blocks() for ASYNC_MODE.
+
+    Blocks are fetched ASYNC_BLOCK_WINDOW at a time and every watched
+    transaction's receipt concurrently; events are then handled in chain order
+    with the same handlers as the threaded scanner. Config updates apply from
+    the next window on.
+    """
+    global last_checked, latest_block_seen, last_scan_pass, blocks_processed_count
+
+    try:
+        latest = await async_rpc(lambda: async_runtime.w3.eth.block_number)
+    except Exception as e:
+        logger.error(f"Failed to get latest block number: {e}")
+        return
+
+    latest_block_seen = latest
+    last_scan_pass = time.time()
+
+    if latest <= last_checked:
+        return
+
+    from_block = last_checked + 1
+    logger.info(f"Checking blocks {from_block} to {latest}")
+
+    scanned_to = last_checked
+    for window_start in range(from_block, latest + 1, Config.ASYNC_BLOCK_WINDOW):
+        if shutdown_event.is_set():
+            logger.info(f"🛑 Shutdown requested, checkpointing after block {scanned_to}")
+            break
+        config = tracking
+        numbers = range(window_start, min(window_start + Config.ASYNC_BLOCK_WINDOW, latest + 1))
+        fetched = await asyncio.gather(*(async_fetch_block(number, config) for number in numbers),
+                                       return_exceptions=True)
+
+        for block_number, result in zip(numbers, fetched):
+            if isinstance(result, Exception):
+                logger.error(f"Block processing error for block {block_number}: {result}")
+                continue
+
+            block_timestamp, transactions, started = result
+            tokens = {
+                log['address'] for _, receipt in transactions if not isinstance(receipt, Exception)
+                for log in transfer_logs_of(receipt)
+            }
+            missing = [address for address in tokens if address not in TOKEN_CACHE]
+            if missing:
+                await offload(warm_token_cache, missing)
+
+            for tx, receipt in transactions:
+                if isinstance(receipt, Exception):
+                    logger.error(f"Transaction processing error for {tx.hash.hex()}: {receipt}")
+                else:
+                    handle_transaction_receipt(tx, receipt, block_timestamp, config)
+
+            blocks_processed_count += 1
+            BLOCK_LATENCY.observe(time.perf_counter() - started)
+        scanned_to = numbers[-1]
+
+    if scanned_to == last_checked:
+        return
+
+    await offload(scan_range_stages, from_block, scanned_to)
+    last_checked = scanned_to
+
+    if tracking.campaign_addresses and not shutdown_event.is_set():
+        await offload(reconcile_campaign_if_due, latest)
+
+async def async_scan_loop():
+    """run_scanner() as a task"""
+    logger.info("✅ Async scanner started")
+    consecutive_errors = 0
+
+    while not shutdown_event.is_set():
+        try:
+            await async_check_blocks()
+            checkpoint_scan_position()
+            consecutive_errors = 0
+            await async_runtime.idle(Config.BLOCK_CHECK_INTERVAL)
+
+        except Exception as e:
+            consecutive_errors += 1
+            logger.error(f"🔥 Scanner loop error ({consecutive_errors}/{Config.SCANNER_MAX_CONSECUTIVE_ERRORS}): {repr(e)}")
+
+            if consecutive_errors >= Config.SCANNER_MAX_CONSECUTIVE_ERRORS:
+                logger.critical("Too many consecutive scanner errors. Extending sleep time.")
+                await async_runtime.idle(Config.SCANNER_EXTENDED_SLEEP)
+                consecutive_errors = 0
+            else:
+                await async_runtime.idle(Config.SCANNER_ERROR_SLEEP)
+
+    logger.info(f"🛑 Async scanner stopped after block {last_checked}")
+
+def telegram_error(status, body):
+    """The python-telegram-bot exception a failed Bot API reply maps to"""
+    description = body.get('description') or f"HTTP {status}"
+    retry_after = (body.get('parameters') or {}).get('retry_after')
+    if retry_after is not None:
+        return RetryAfter(retry_after)
+    if status == 400:
+        return BadRequest(description)
+    if status in (401, 403):
+        return Unauthorized(description)
+    return NetworkError(description)
+
+async def async_telegram_send(chat_id, kind, text=None, markup_json=None, photo=None):
+    """One Bot API sendMessage/sendPhoto over the shared session, raising what Bot would raise"""
+    method = 'sendPhoto' if kind == 'photo' else 'sendMessage'
+    await acquire_async(telegram_budget)
+
+    started = time.perf_counter()
+    try:
+        if kind == 'photo':
+            data = aiohttp.FormData()
+            data.add_field('chat_id', chat_id)
+            data.add_field('photo', photo, filename='photo.png', content_type='image/png')  # charts are savefig PNGs
+            request = {'data': data}
+        else:
+            payload = {'chat_id': chat_id, 'text': text, 'parse_mode': 'Markdown'}
+            if markup_json:
+                payload['reply_markup'] = markup_json
+            request = {'json': payload}
+
+        try:
+            async with asyncio.timeout(Config.TELEGRAM_TIMEOUT):
+                async with async_runtime.session.post(f"{bot.base_url}/{method}", **request) as response:
+                    body = await response.json(content_type=None)
+        except TimeoutError:
+            raise TimedOut()
+        except aiohttp.ClientError as e:
+            raise NetworkError(f"{type(e).__name__}: {e}")
+
+        if not body.get('ok'):
+            raise telegram_error(response.status, body)
+    except Exception:
+        TELEGRAM_FAILURES.inc(method=method, chat=chat_id)
+        raise
+    finally:
+        TELEGRAM_LATENCY.observe(time.perf_counter() - started, method=method, chat=chat_id)
+
+async def async_send_to_chats(chat_ids, text, reply_markup=None, photo=None):
+    """Send an optional photo and a message to every chat concurrently, in order within each chat"""
+    async def send_to_chat(chat_id):
+        async with async_runtime.chat_lock(chat_id):
+            if photo:
+                await delivery_queue.async_send(chat_id, 'photo', photo=photo)
+            await delivery_queue.async_send(chat_id, 'message', text=text, reply_markup=reply_markup)
+
+    await asyncio.gather(*(send_to_chat(chat_id) for chat_id in chat_ids))
+
+async def async_fetch_eth_price_from_apis():
+    """fetch_eth_price_from_apis() with every source raced; the first valid price wins, the rest are cancelled"""
+    async def fetch(source):
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(Config.PRICE_FETCH_TIMEOUT):
+                async with async_runtime.session.get(source['url'], params=source['params'],
+                                                     headers={'User-Agent': 'Frictionless-Bot/1.0'}) as response:
+                    price = source['parser'](await response.json(content_type=None)) if response.status == 200 else 0
+        except Exception as e:
+            logger.warning(f"Failed to get price from {source['name']}: {e!r}")
+            price = 0
+        PRICE_LATENCY.observe(time.perf_counter() - started, source=source['name'])
+        if not price > 0:
+            PRICE_FAILURES.inc(source=source['name'])
+        return source['name'], price
+
+    tasks = [asyncio.create_task(fetch(source)) for source in ETH_PRICE_SOURCES]
+    try:
+        for completed in asyncio.as_completed(tasks):
+            name, price = await completed
+            if price > 0:
+                logger.info(f"ETH price updated from {name}: ${price}")
+                return price
+        return 0
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def async_get_eth_price():
+    """get_eth_price() for tasks"""
+    # The pool read is a blocking eth_call through the shared web3 client
+    price = await offload(current_eth_price) if price_oracle else current_eth_price()
+    if price is not None:
+        return price
+    return settle_eth_price(await async_fetch_eth_price_from_apis())
+
+async def async_send_campaign_summary(campaign):
+    """send_campaign_summary() for tasks; the chart is drawn in a worker thread"""
+    price_usd = await async_get_eth_price()
+    if price_usd == 0:
+        raise RuntimeError("Could not fetch ETH price - summary skipped")
+
+    photo, msg, reply_markup = await offload(render_campaign_summary, campaign, price_usd)
+    await async_send_to_chats(campaign.chat_ids or TELEGRAM_CHAT_IDS, msg, reply_markup, photo)
+
+async def async_summary_loop(campaign, initial_delay):
+    """run_campaign_summary() as a task"""
+    async_priority.set(Priority.SUMMARY)
+    logger.info(f"✅ Summary scheduled for {campaign.name} - interval: {campaign.summary_interval // 60} minutes")
+    await async_runtime.idle(initial_delay)
+
+    while not shutdown_event.is_set():
+        try:
+            await async_send_campaign_summary(campaign)
+            delay = next_summary_delay(campaign)
+        except Exception as e:
+            delay = next_summary_delay(campaign, e)
+        await async_runtime.idle(delay)
+
+async def async_token_price_loop():
+    """run_token_price_refresh() as a task"""
+    async_priority.set(Priority.SUMMARY)
+
+    while not shutdown_event.is_set():
+        try:
+            updated = await offload(token_prices.refresh)
+            logger.info(f"💲 Refreshed {updated} token price(s)")
+        except Exception as e:
+            logger.error(f"Token price refresh failed: {e}")
+        await async_runtime.idle(Config.TOKEN_PRICE_REFRESH_INTERVAL)
+
+# ---------------- GRACEFUL SHUTDOWN ---------------- #
+def _write_state(path, state):
+    """Atomically replace the state file; True on success"""
+    try:
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.error(f"Failed to save state snapshot to {path}: {e}")
+        return False
+    return True
 
-def send_campaign_summary():
-    """Send periodic fundraising campaign updates with enhanced visuals and proper cleanup"""
-    img_path = None
-    fig = None
-    
+_checkpointed_block = None
+
+def checkpoint_scan_position(path=None):
+    """Overwrite the state file with just the scan position.
+
+    Runs after every scan pass and once the startup snapshot is applied, so a crash
+    resumes where the last pass ended instead of replaying from an older snapshot,
+    and never restores caches or /stats a second time.
+    """
+    global _checkpointed_block
+    if last_checked == _checkpointed_block or shutdown_event.is_set():
+        return  # once shutting down, the full snapshot written by shutdown() wins
+    if _write_state(path or STATE_SNAPSHOT_PATH, {'saved_at': time.time(), 'last_checked': last_checked}):
+        _checkpointed_block = last_checked
+
+def save_state_snapshot(path=None):
+    """Write the scan position and warm caches to disk atomically; True on success"""
+    path = path or STATE_SNAPSHOT_PATH
+    state = {
+        'saved_at': time.time(),
+        'last_checked': last_checked,
+        'token_cache': dict(TOKEN_CACHE),
+        'token_prices': token_prices.snapshot(),
+        'eth_price': eth_price_cache,
+        'contribution_stats': contribution_stats.snapshot(),
+    }
+    if not _write_state(path, state):
+        return False
+    logger.info(f"💾 State snapshot saved to {path}: block {last_checked}, {len(state['token_cache'])} token(s), "
+                f"{len(state['token_prices'])} price(s)")
+    return True
+
+def load_state_snapshot(path=None):
+    """The state written by the last shutdown, or None"""
+    path = path or STATE_SNAPSHOT_PATH
+    if not os.path.exists(path):
+        return None
     try:
-        # Validation
-        if not CAMPAIGN_ADDRESS or not w3.is_address(CAMPAIGN_ADDRESS):
-            logger.error("Invalid campaign address")
-            return
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable state snapshot {path}: {e}")
+        return None
 
-        # Get balance using safe wrapper
-        bal_wei = safe_web3_call(lambda: w3.eth.get_balance(CAMPAIGN_ADDRESS))
-        bal_eth = w3.from_wei(bal_wei, 'ether')
-        
-        price_usd = get_eth_price()
-        if price_usd == 0:
-            logger.warning("Could not fetch ETH price - skipping summary")
+def warm_start(state, head):
+    """Restore cached state from a snapshot; returns the block to resume scanning after"""
+    global eth_price_cache
+
+    TOKEN_CACHE.update(state.get('token_cache') or {})
+    token_prices.restore(state.get('token_prices') or {})
+    if (state.get('eth_price') or {}).get('timestamp', 0) > eth_price_cache['timestamp']:
+        eth_price_cache = state['eth_price']
+    if state.get('contribution_stats'):
+        contribution_stats.restore(state['contribution_stats'])
+    logger.info(f"♻️ Warm start: {len(TOKEN_CACHE)} token(s), {len(token_prices)} price(s) and "
+                f"{len(contribution_stats)} stats series from snapshot")
+
+    saved = state.get('last_checked')
+    if saved is None or saved > head:
+        return head
+    if head - saved > Config.RESUME_MAX_BLOCKS:
+        logger.warning(f"Snapshot block {saved} is {head - saved} blocks behind the head "
+                       f"(> {Config.RESUME_MAX_BLOCKS}), starting from the head")
+        return head
+    logger.info(f"♻️ Resuming scan after block {saved} ({head - saved} block(s) behind the head)")
+    return saved
+
+_shutdown_lock = threading.Lock()
+_shutdown_done = False
+
+def shutdown(timeout=None):
+    """Stop the bot's workers in order within `timeout` seconds and snapshot its state.
+
+    The scanner finishes its current block (or window) and checkpoints it,
+    buffered notifications are flushed, in-flight sends and ledger rows are
+    given the remaining time, and caches are written for the next warm start.
+    Sends still failing stay in the persistent delivery queue.
+    """
+    global _shutdown_done
+    with _shutdown_lock:
+        if _shutdown_done:
             return
-            
-        current_usd = float(bal_eth) * price_usd
-        percent = min(100, (current_usd / CAMPAIGN_TARGET_USD) * 100)
+        _shutdown_done = True
 
-        # Status message logic
-        status_emoji, status_text = get_status_emoji_and_text(percent)
+    timeout = Config.SHUTDOWN_DRAIN_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
 
-        msg = (
-            f"{status_emoji} *{status_text}*\n\n"
-            f"💰 **Balance:** `{bal_eth:.4f} ETH`\n"
-            f"💵 **Value:** `${current_usd:,.2f}` / `${CAMPAIGN_TARGET_USD:,.2f}`\n"
-            f"📊 **Progress:** `{percent:.1f}%`"
-        )
+    def remaining():
+        return max(0.0, deadline - time.monotonic())
 
-        keyboard = [[InlineKeyboardButton("💰 Contribute Here", url="https://app.frictionless.network/contribute")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    logger.info(f"🛑 Shutting down, draining for up to {timeout}s...")
+    shutdown_event.set()
 
-        # Create chart
-        fig = create_enhanced_progress_chart(bal_eth, current_usd, percent)
-        
-        # Save with high quality
-        img_path = '/tmp/progress_enhanced.png'
-        fig.savefig(img_path, bbox_inches='tight', dpi=Config.IMAGE_DPI, 
-                   facecolor='#95C511', edgecolor='none', #changed face color from 1a1a1a
-                   transparent=True, pad_inches=0) #Reduced padding from .15
-
-        # Send to all Telegram chats
-        send_campaign_to_chats(img_path, msg, reply_markup)
-                
-    except Exception as e:
-        logger.error(f"Error in send_campaign_summary: {e}")
-    finally:
-        # Cleanup resources
-        if fig:
-            plt.close(fig)
-        if img_path and os.path.exists(img_path):
-            try:
-                os.remove(img_path)
-            except Exception as e:
-                logger.warning(f"Failed to cleanup image file: {e}")
+    for thread in (scanner_thread, merger_thread):
+        if thread is not None:
+            thread.join(remaining())
+            if thread.is_alive():
+                logger.warning(f"Scanner still busy at the deadline; snapshot keeps block {last_checked}")
+    if not async_runtime.finish_services(remaining()):
+        logger.warning(f"Async services still busy at the deadline; snapshot keeps block {last_checked}")
+    scheduler.join(remaining())
 
-def get_status_emoji_and_text(percent):
-    """Get appropriate emoji and status text based on progress percentage"""
-    if percent >= 100:
-        return "🎉", "GOAL ACHIEVED!"
-    elif percent >= 75:
-        return "🔥", "Almost There!"
-    elif percent >= 50:
-        return "📈", "Halfway Mark!"
-    elif percent >= 25:
-        return "💪", "Building Momentum"
-    else:
-        return "🚀", "Getting Started"
+    if not notification_coalescer.flush(remaining()):
+        logger.warning("A notification batch was still being delivered at the deadline")
+    if not async_runtime.drain(remaining()):
+        logger.warning("Some Telegram sends did not finish before the deadline")
+    async_runtime.stop(remaining())
+
+    if not ledger.flush(timeout=remaining()):
+        logger.warning(f"{ledger.pending()} ledger row(s) not written before the deadline")
 
-def send_campaign_to_chats(img_path, msg, reply_markup):
-    """Send campaign update to all configured chats with better error handling"""
-    for chat_id in TELEGRAM_CHAT_IDS:
+    save_state_snapshot()
+    logger.info("👋 Shutdown complete")
+
+def handle_sigterm(signum, frame):
+    shutdown()
+    sys.exit(0)
+
+# ---------------- SAMPLING PROFILER ---------------- #
+class SamplingProfiler:
+    """Wall-clock sampling profiler covering every thread of the process.
+
+    A helper thread reads sys._current_frames() every PROFILE_SAMPLE_INTERVAL
+    and counts each thread's stack. Nothing is instrumented, so the other
+    threads only give up the GIL for the moment a sample takes. Threads
+    blocked on RPC, Telegram or locks show up in their wait frames. Results
+    are collapsed stacks ("thread;outer;...;inner count" per line), which
+    flamegraph.pl, inferno and speedscope read as-is. One profile runs at a time.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def busy(self):
+        return self._lock.locked()
+
+    @staticmethod
+    def _label(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def sample(self, seconds):
+        """Profile for `seconds`; returns ({collapsed stack: samples}, sampling rounds)"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
         try:
-            # Send image
-            with open(img_path, 'rb') as img_file:
-                bot.send_photo(
-                    chat_id=chat_id, 
-                    photo=img_file, 
-                    timeout=Config.TELEGRAM_TIMEOUT
-                )
-            
-            # Send message
-            bot.send_message(
-                chat_id=chat_id, 
-                text=msg, 
-                parse_mode='Markdown', 
-                reply_markup=reply_markup, 
+            own = threading.get_ident()
+            stacks = {}
+            rounds = 0
+            next_sample = time.monotonic()
+            deadline = next_sample + seconds
+
+            while next_sample < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(self._label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(ident, f"thread-{ident}"))
+                    stack = ';'.join(reversed(labels))
+                    stacks[stack] = stacks.get(stack, 0) + 1
+                rounds += 1
+                next_sample += self.interval
+                time.sleep(max(0, next_sample - time.monotonic()))
+            return stacks, rounds
+        finally:
+            self._lock.release()
+
+profiler = SamplingProfiler(Config.PROFILE_SAMPLE_INTERVAL)
+
+def collapsed_stacks(stacks):
+    """Flamegraph input: one "frame;frame;... count" line per distinct stack"""
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+def summarize_profile(stacks, rounds, seconds):
+    """Short plain-text summary: samples per thread and the innermost frames seen most often"""
+    per_thread, leaves = {}, {}
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        per_thread[frames[0]] = per_thread.get(frames[0], 0) + count
+        leaves[frames[-1]] = leaves.get(frames[-1], 0) + count
+
+    total = sum(stacks.values()) or 1
+    lines = [f"🔬 {rounds} samples over {seconds:g}s, {len(per_thread)} thread(s)"]
+    lines.append("Busiest frames (share of all thread samples):")
+    for label, count in sorted(leaves.items(), key=lambda item: -item[1])[:Config.PROFILE_TOP_FRAMES]:
+        lines.append(f"{count / total:6.1%} {label}")
+    return '\n'.join(lines)
+
+def send_profile(chat_id, seconds):
+    """Profile in the background and send the collapsed stacks to `chat_id` as a document"""
+    with work_priority(Priority.INTERACTIVE):
+        try:
+            stacks, rounds = profiler.sample(seconds)
+            bot.send_document(
+                chat_id=chat_id,
+                document=io.BytesIO(collapsed_stacks(stacks).encode()),
+                filename=f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded",
+                caption=summarize_profile(stacks, rounds, seconds)[:1024],  # Bot API caption limit
                 timeout=Config.TELEGRAM_TIMEOUT
             )
-            
         except Exception as e:
-            logger.error(f"Failed to send campaign update to {chat_id}: {e}")
+            logger.error(f"Profile failed: {e}")
+            bot.send_message(chat_id=chat_id, text=f"❌ Profile failed: {e}")
 
-# ---------------- IMPROVED BACKGROUND THREADS ---------------- #
-def run_scanner():
-    """Background thread for blockchain scanning with better error handling"""
-    logger.info("✅ Scanner thread started")
-    consecutive_errors = 0
-    
-    while True:
+# ---------------- HISTORICAL BACKFILL ---------------- #
+# Provider messages for an eth_getLogs range or result set that is too big. Generic words such as
+# 'exceeded' or 'too many' are left out: they also appear in rate-limit errors, which must back off
+LOG_RANGE_TOO_LARGE_TERMS = (
+    'more than', 'too large', 'response size', 'block range', 'range is too', 'query timeout', '-32005'
+)
+
+def fetch_logs_adaptive(topics, from_block, to_block, window, on_progress=None):
+    """Yield logs for a block range using large eth_getLogs windows.
+
+    A window rejected as too large is halved and retried; after each success
+    the window grows again (up to BACKFILL_MAX_LOG_WINDOW).
+    """
+    start = from_block
+    while start <= to_block:
+        end = min(start + window - 1, to_block)
         try:
-            check_blocks()
-            consecutive_errors = 0  # Reset error counter on success
-            time.sleep(Config.BLOCK_CHECK_INTERVAL)
-            
+            logs = safe_web3_call(
+                lambda: w3.eth.get_logs({'fromBlock': start, 'toBlock': end, 'topics': topics}),
+                raise_on=LOG_RANGE_TOO_LARGE_TERMS
+            )
         except Exception as e:
-            consecutive_errors += 1
-            logger.error(f"🔥 Scanner loop error ({consecutive_errors}/{Config.SCANNER_MAX_CONSECUTIVE_ERRORS}): {repr(e)}")
-            
-            if consecutive_errors >= Config.SCANNER_MAX_CONSECUTIVE_ERRORS:
-                logger.critical("Too many consecutive scanner errors. Extending sleep time.")
-                time.sleep(Config.SCANNER_EXTENDED_SLEEP)
-                consecutive_errors = 0  # Reset counter
-            else:
-                time.sleep(Config.SCANNER_ERROR_SLEEP)
+            if window > 1 and not is_rate_limited(e) and any(term in str(e).lower() for term in LOG_RANGE_TOO_LARGE_TERMS):
+                window = max(1, window // 2)
+                logger.info(f"✂️ Log range {start}-{end} too large, splitting (window {window})")
+                continue
+            raise
+
+        if logs is None:
+            # safe_web3_call gives up on a rate limit without raising; never skip the range silently
+            raise RuntimeError(f"eth_getLogs {start}-{end} still rate limited after retries")
+
+        for log in logs:
+            yield log
+
+        if on_progress:
+            on_progress(end - start + 1)
+        start = end + 1
+        window = min(Config.BACKFILL_MAX_LOG_WINDOW, window * 2)
+
+class BackfillProgress:
+    """Periodic progress logging for long backfills (counts blocks per scan pass)"""
+
+    def __init__(self, label, total_blocks, passes):
+        self.label = label
+        self.passes = passes
+        self.total = total_blocks * passes
+        self.done = 0
+        self.started = time.time()
+        self.last_report = 0
+        self.events = 0
+
+    def advance(self, blocks):
+        self.done += blocks
+        self.report()
+
+    def report(self, force=False):
+        now = time.time()
+        if not force and now - self.last_report < Config.BACKFILL_PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-6)
+        rate = self.done / elapsed
+        eta = (self.total - self.done) / rate if rate else 0
+        logger.info(
+            f"📈 {self.label}: {self.done / max(self.total, 1) * 100:.1f}%, "
+            f"{rate / self.passes:,.0f} blocks/s, {self.events} events, ETA {eta:,.0f}s"
+        )
+
+def backfill_chunks(from_block, to_block, chunk_size, index=0, count=1):
+    """Interleaved block ranges owned by backfill shard `index` of `count`"""
+    if count == 1:
+        return [(from_block, to_block)]
+    return [
+        (start, min(start + chunk_size - 1, to_block))
+        for position, start in enumerate(range(from_block, to_block + 1, chunk_size))
+        if position % count == index
+    ]
+
+def backfill_range(start, end, window, config, include_eth, progress, block_timestamp):
+    """Scan one block range: ERC20 transfers via eth_getLogs, optionally native ETH per block"""
+    wallet_topics = ['0x' + addr[2:].lower().rjust(64, '0') for addr in config.wallets]
+    erc20_seen = set()
+
+    # ERC20 transfers: two windowed eth_getLogs passes (to / from any tracked wallet)
+    for topics in ([transfer_event_sig, None, wallet_topics], [transfer_event_sig, wallet_topics]):
+        for log in fetch_logs_adaptive(topics, start, end, window, progress.advance):
+            if len(log['topics']) != 3:
+                continue
+            key = (log['transactionHash'].hex(), log['logIndex'])
+            if key in erc20_seen:
+                continue
+            erc20_seen.add(key)
+            prefetch_token_info([log['address']])
+            if process_erc20_transfer(log, log['transactionHash'].hex(), block_timestamp(log['blockNumber']), config):
+                progress.events += 1
+
+    # Native ETH transfers are not logged, so they need a per-block pass
+    if include_eth:
+        erc20_txs = {tx_hash for tx_hash, _ in erc20_seen}
+        wallet_addresses = frozenset(addr.lower() for addr in config.wallets)
+        for number in range(start, end + 1):
+            timestamp, transactions = fetch_block_transactions(number, wallet_addresses)
+            for tx in transactions:
+                if not tx['value'] or tx['hash'].hex() in erc20_txs:
+                    continue  # the live scanner reports token transfers instead of ETH for these
+                receipt = safe_web3_call(lambda: w3.eth.get_transaction_receipt(tx['hash']))
+                if receipt.get('status') != 0 and process_eth_transfer(tx, timestamp, config):
+                    progress.events += 1
+            progress.advance(1)
+
+def run_backfill(from_block, to_block, window, include_eth=False, notify_events=True,
+                 shard=(0, 1), chunk_size=None, coordinator=None, job=None):
+    """Scan a historical block range for tracked-wallet transfers.
+
+    With a shard spec the range is cut into `chunk_size` chunks dealt out
+    round-robin, and progress is reported to the coordinator as a watermark.
+    """
+    index, count = shard
+    config = TrackingConfig(tracking.wallets, tracking.excluded, live=notify_events)
+    chunks = backfill_chunks(from_block, to_block, chunk_size or Config.BACKFILL_SHARD_CHUNK, index, count)
+    block_timestamps = {}
+
+    def block_timestamp(number):
+        if number not in block_timestamps:
+            block_timestamps[number] = safe_web3_call(lambda: w3.eth.get_block(number)).timestamp
+        return block_timestamps[number]
+
+    label = f"Backfill shard {index}/{count}" if count > 1 else "Backfill"
+    progress = BackfillProgress(label, sum(end - start + 1 for start, end in chunks), 3 if include_eth else 2)
+    logger.info(f"⏪ {label}: blocks {from_block}-{to_block} in {len(chunks)} chunk(s) for {len(config.wallets)} wallet(s)")
+
+    for position, (start, end) in enumerate(chunks):
+        backfill_range(start, end, window, config, include_eth, progress, block_timestamp)
+        notification_coalescer.flush()
+        if coordinator:
+            # Every block this shard owns up to the next chunk is done
+            watermark = chunks[position + 1][0] - 1 if position + 1 < len(chunks) else to_block
+            if not coordinator.heartbeat(job, index, watermark, finished=position + 1 == len(chunks)):
+                logger.critical(f"Lost lease on {job} shard {index}/{count}, stopping")
+                return False
+
+    progress.report(force=True)
+    ledger.flush()
+    logger.info(f"✅ {label} of blocks {from_block}-{to_block} complete")
+    return True
+
+def run_cli(argv):
+    """Entry point for `python bot.py <command>` one-off modes"""
+    global dry_run_output, shard_coordinator, notification_coalescer
+
+    parser = argparse.ArgumentParser(prog='bot.py', description='Frictionless bot command-line modes')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backfill_parser = subparsers.add_parser('backfill', help='scan a historical block range')
+    backfill_parser.add_argument('--from-block', type=int, required=True)
+    backfill_parser.add_argument('--to-block', type=int, help='default: current head (required with --shard)')
+    backfill_parser.add_argument('--window', type=int, default=Config.BACKFILL_LOG_WINDOW,
+                                 help='initial eth_getLogs block window')
+    backfill_parser.add_argument('--include-eth', action='store_true',
+                                 help='also scan full blocks for native ETH transfers (slow)')
+    backfill_parser.add_argument('--dry-run', metavar='FILE',
+                                 help='write notifications to a JSON-lines file instead of Telegram')
+    backfill_parser.add_argument('--no-notify', action='store_true', help='only regenerate ledger rows')
+    backfill_parser.add_argument('--no-ledger', action='store_true', help='do not write ledger rows')
+    backfill_parser.add_argument('--shard', type=parse_shard, metavar='i/N',
+                                 help='take every Nth chunk of the range, starting at chunk i; '
+                                      'notifications go through the shard merger')
+    backfill_parser.add_argument('--chunk-size', type=int, default=Config.BACKFILL_SHARD_CHUNK,
+                                 help='blocks per interleaved chunk when sharding')
+
+    scan_parser = subparsers.add_parser('scan', help='run one live scanner shard (wallets split by address)')
+    scan_parser.add_argument('--shard', type=parse_shard, metavar='i/N', required=True)
+
+    subparsers.add_parser('merge', help='run the shard merger in the foreground')
+
+    args = parser.parse_args(argv)
+
+    if args.command in ('scan', 'merge'):
+        # Finish the current block or merge pass on SIGTERM instead of dying mid-way
+        signal.signal(signal.SIGTERM, lambda signum, frame: shutdown_event.set())
+
+    if args.command == 'scan':
+        shard_coordinator = ShardCoordinator(SHARD_DB_PATH)
+        return run_shard_scanner(*args.shard)
+
+    if args.command == 'merge':
+        shard_coordinator = ShardCoordinator(SHARD_DB_PATH)
+        run_shard_merger()
+        return 0
+
+    if args.command == 'backfill':
+        if args.shard and args.to_block is None:
+            parser.error('--to-block is required with --shard so every shard agrees on the range')
+        to_block = args.to_block if args.to_block is not None else safe_web3_call(lambda: w3.eth.block_number)
+        if args.from_block > to_block:
+            parser.error('--from-block must not be after --to-block')
+        if args.no_ledger:
+            ledger.enabled = False
+        if args.dry_run:
+            dry_run_output = open(args.dry_run, 'w')
+
+        shard = args.shard or (0, 1)
+        job = None
+        if args.shard:
+            shard_coordinator = ShardCoordinator(SHARD_DB_PATH)
+            job = f"backfill:{args.from_block}-{to_block}" + (':dry-run' if args.dry_run else '')
+            shard_coordinator.acquire(job, shard[0], shard[1], args.from_block - 1, resume=False)
+            if not args.dry_run and not args.no_notify:
+                notification_coalescer = ShardOutbox(shard_coordinator, job)
 
-def run_summary():
-    """Background thread for periodic fundraising summaries with better error handling"""
-    if not ENABLE_CAMPAIGN_SUMMARY:
-        logger.info("📊 Campaign summary disabled via ENABLE_CAMPAIGN_SUMMARY")
-        return
-        
-    logger.info(f"✅ Summary thread started - interval: {SUMMARY_INTERVAL_MINUTES} minutes")
-    interval_seconds = SUMMARY_INTERVAL_MINUTES * 60
-    consecutive_errors = 0
-    
-    while True:
         try:
-            send_campaign_summary()
-            consecutive_errors = 0  # Reset error counter on success
-            logger.info(f"Next campaign summary in {SUMMARY_INTERVAL_MINUTES} minutes")
-            time.sleep(interval_seconds)
-            
-        except Exception as e:
-            consecutive_errors += 1
-            logger.error(f"Summary thread error ({consecutive_errors}/{Config.SUMMARY_MAX_CONSECUTIVE_ERRORS}): {e}")
-            
-            if consecutive_errors >= Config.SUMMARY_MAX_CONSECUTIVE_ERRORS:
-                logger.warning("Too many consecutive summary errors. Extending sleep time.")
-                time.sleep(Config.SUMMARY_EXTENDED_SLEEP)
-                consecutive_errors = 0  # Reset counter
-            else:
-                time.sleep(Config.SUMMARY_RETRY_SLEEP)
+            with work_priority(Priority.BACKFILL):
+                completed = run_backfill(args.from_block, to_block, args.window, args.include_eth, not args.no_notify,
+                                         shard, args.chunk_size, shard_coordinator, job)
+        finally:
+            if job:
+                shard_coordinator.release(job, shard[0])
+            if dry_run_output is not None:
+                dry_run_output.close()
+                logger.info(f"📝 Dry-run notifications written to {args.dry_run}")
+        return 0 if completed else 1
+    return 0
 
 # ---------------- TELEGRAM COMMANDS ---------------- #
 @admin_only
@@ -940,13 +4564,113 @@ def switches_command(update: Update, context: CallbackContext):
     """Handle /switches command"""
     switches = '\n'.join([
         f"{label}: `{addr}`" 
-        for addr, label in WALLETS_TO_TRACK.items()
+        for addr, label in tracking.wallets.items()
     ])
     update.message.reply_text(
         f"🔀 *Tracked Switches:*\n{switches}", 
         parse_mode='Markdown'
     )
 
+@admin_only
+def addswitch_command(update: Update, context: CallbackContext):
+    """Handle /addswitch <address> <label> [from_block] - start tracking a wallet, optionally backfilling"""
+    try:
+        if len(context.args) < 2 or not w3.is_address(context.args[0]):
+            update.message.reply_text("Usage: /addswitch <address> <label> [from_block]")
+            return
+
+        address = w3.to_checksum_address(context.args[0])
+        from_block = None
+        label_args = context.args[1:]
+        if len(label_args) > 1 and label_args[-1].isdigit():
+            from_block = int(label_args[-1])
+            label_args = label_args[:-1]
+        label = ' '.join(label_args)
+
+        wallets = dict(tracking.wallets)
+        wallets[address] = label
+        update_tracking(wallets=wallets)
+        reply = f"✅ Now tracking _{label}_: `{address}`"
+
+        if from_block is not None:
+            to_block = last_checked
+            if to_block - from_block + 1 > Config.WALLET_BACKFILL_MAX_BLOCKS:
+                from_block = to_block - Config.WALLET_BACKFILL_MAX_BLOCKS + 1
+            if from_block <= to_block:
+                threading.Thread(
+                    target=backfill_wallets,
+                    args=({address: label}, from_block, to_block),
+                    daemon=True
+                ).start()
+                reply += f"\n⏪ Backfilling blocks `{from_block}`-`{to_block}` into the ledger"
+
+        update.message.reply_text(reply, parse_mode='Markdown')
+    except Exception as e:
+        update.message.reply_text(f"❌ Error adding switch: {str(e)}")
+
+@admin_only
+def removeswitch_command(update: Update, context: CallbackContext):
+    """Handle /removeswitch <address> - stop tracking a wallet"""
+    try:
+        if not context.args or not w3.is_address(context.args[0]):
+            update.message.reply_text("Usage: /removeswitch <address>")
+            return
+
+        address = w3.to_checksum_address(context.args[0])
+        if address not in tracking.wallets:
+            update.message.reply_text("❌ That address is not tracked")
+            return
+
+        wallets = dict(tracking.wallets)
+        label = wallets.pop(address)
+        update_tracking(wallets=wallets)
+        update.message.reply_text(f"🗑 Stopped tracking _{label}_: `{address}`", parse_mode='Markdown')
+    except Exception as e:
+        update.message.reply_text(f"❌ Error removing switch: {str(e)}")
+
+@admin_only
+def exclude_command(update: Update, context: CallbackContext):
+    """Handle /exclude <address> - ignore outgoing transfers to an address"""
+    try:
+        if not context.args or not w3.is_address(context.args[0]):
+            update.message.reply_text("Usage: /exclude <address>")
+            return
+
+        update_tracking(excluded=tracking.excluded | {context.args[0].lower()})
+        update.message.reply_text(f"🚫 Excluding transfers to `{context.args[0]}`", parse_mode='Markdown')
+    except Exception as e:
+        update.message.reply_text(f"❌ Error updating exclusions: {str(e)}")
+
+@admin_only
+def unexclude_command(update: Update, context: CallbackContext):
+    """Handle /unexclude <address> - stop ignoring transfers to an address"""
+    try:
+        if not context.args or not w3.is_address(context.args[0]):
+            update.message.reply_text("Usage: /unexclude <address>")
+            return
+
+        update_tracking(excluded=tracking.excluded - {context.args[0].lower()})
+        update.message.reply_text(f"✅ No longer excluding `{context.args[0]}`", parse_mode='Markdown')
+    except Exception as e:
+        update.message.reply_text(f"❌ Error updating exclusions: {str(e)}")
+
+@admin_only
+def reloadwallets_command(update: Update, context: CallbackContext):
+    """Handle /reloadwallets - reload tracked wallets and exclusions from WALLETS_CONFIG_PATH"""
+    try:
+        loaded = load_tracking_file(WALLETS_CONFIG_PATH)
+        if loaded is None:
+            update.message.reply_text(f"❌ Config file not found: {WALLETS_CONFIG_PATH}")
+            return
+
+        wallets, excluded = loaded
+        config = update_tracking(wallets=wallets, excluded=excluded, persist=False)
+        update.message.reply_text(
+            f"🔄 Reloaded {len(config.wallets)} wallets and {len(config.excluded)} exclusions"
+        )
+    except Exception as e:
+        update.message.reply_text(f"❌ Error reloading wallets: {str(e)}")
+
 @admin_only
 def uptime_command(update: Update, context: CallbackContext):
     """Handle /uptime command"""
@@ -969,12 +4693,21 @@ def config_command(update: Update, context: CallbackContext):
                 price_mode = f"Static (${static_price})`"
             except ValueError:
                 price_mode = f"Invalid static price: {STATIC_ETH_PRICE}`"
+        elif price_oracle:
+            price_mode = f"On-chain pool {price_oracle.address} ({price_oracle.pool_type}), APIs as fallback`"
         else:
             price_mode = "Dynamic pricing`"
         
         # Safely display chat count without exposing IDs
         chat_count = len(TELEGRAM_CHAT_IDS)
         chat_status = f"{chat_count} configured"
+
+        campaign_text = ''.join(
+            f"• `{campaign.name}`: `{campaign.address[:10]}...{campaign.address[-8:]}`, "
+            f"target `${campaign.target_usd:,.2f}`, every `{campaign.summary_interval // 60} min`, "
+            f"`{len(campaign.chat_ids)}` chat(s){'' if campaign.summary_enabled else ' (summary off)'}\n"
+            for campaign in campaigns.values()
+        )
         
         config_text = (
             "*Bot Configuration:*\n\n"
@@ -984,24 +4717,162 @@ def config_command(update: Update, context: CallbackContext):
             f"• Last Checked: `{last_checked}`\n\n"
             f"👥 **Telegram:**\n"
             f"• Chat IDs: `{chat_status}`\n\n"
-            f"💰 **Campaign:**\n"
-            f"• Address: `{CAMPAIGN_ADDRESS[:10]}...{CAMPAIGN_ADDRESS[-8:] if CAMPAIGN_ADDRESS else 'Not set'}`\n"
-            f"• Target: `${CAMPAIGN_TARGET_USD:,.2f}`\n"
-            f"• Summary Enabled: `{ENABLE_CAMPAIGN_SUMMARY}`\n"
-            f"• Summary Interval: `{SUMMARY_INTERVAL_MINUTES} minutes`\n\n"
+            f"💰 **Campaigns ({len(campaigns)}):**\n"
+            f"{campaign_text}"
+            f"• Summary Enabled: `{ENABLE_CAMPAIGN_SUMMARY}`\n\n"
             f"🔍 **Tracking:**\n"
-            f"• Wallets: `{len(WALLETS_TO_TRACK)} addresses`\n"
+            f"• Wallets: `{len(tracking.wallets)} addresses`\n"
+            f"• Execution: `{'asyncio' if ASYNC_MODE else 'threads'}`\n"
             f"• Price Mode: `{price_mode}"
         )
         update.message.reply_text(config_text, parse_mode='Markdown')
     except Exception as e:
         update.message.reply_text(f"❌ Error getting configuration: {str(e)}")
 
+@admin_only
+def ledger_command(update: Update, context: CallbackContext):
+    """Handle /ledger [hours] command - transfer totals per token from the local ledger"""
+    try:
+        hours = float(context.args[0]) if context.args else Config.LEDGER_DEFAULT_WINDOW_HOURS
+        rows = ledger.totals_since(time.time() - hours * 3600)
+
+        if not rows:
+            update.message.reply_text(f"📒 No transfers recorded in the last {hours:g}h")
+            return
+
+        lines = []
+        for token_address, symbol, direction, count, total in rows:
+            # Native ETH rows have no token address
+            usd = token_prices.usd_value(token_address or TokenPriceCache.NATIVE, total)
+            usd_text = f" ≈ `${usd:,.2f}`" if usd is not None else ""
+            lines.append(f"• `{symbol}` {direction}: `{count}` transfers, `{total:,.4f}`{usd_text}")
+        update.message.reply_text(
+            f"📒 *Ledger - last {hours:g}h:*\n" + '\n'.join(lines),
+            parse_mode='Markdown'
+        )
+    except ValueError:
+        update.message.reply_text("Usage: /ledger [hours]")
+    except Exception as e:
+        update.message.reply_text(f"❌ Error querying ledger: {str(e)}")
+
+@admin_only
+def top_command(update: Update, context: CallbackContext):
+    """Handle /top [hours] command - most active contributors from the local ledger"""
+    try:
+        hours = float(context.args[0]) if context.args else Config.LEDGER_DEFAULT_WINDOW_HOURS
+        rows = ledger.top_counterparties(time.time() - hours * 3600, Config.LEDGER_TOP_LIMIT)
+
+        if not rows:
+            update.message.reply_text(f"🏆 No contributors recorded in the last {hours:g}h")
+            return
+
+        lines = [
+            f"{rank}. `{address[:8]}...{address[-6:]}` - `{count}` x `{symbol}` (`{total:,.4f}`)"
+            for rank, (address, symbol, count, total) in enumerate(rows, start=1)
+        ]
+        update.message.reply_text(
+            f"🏆 *Top contributors - last {hours:g}h:*\n" + '\n'.join(lines),
+            parse_mode='Markdown'
+        )
+    except ValueError:
+        update.message.reply_text("Usage: /top [hours]")
+    except Exception as e:
+        update.message.reply_text(f"❌ Error querying ledger: {str(e)}")
+
+@admin_only
+def stats_command(update: Update, context: CallbackContext):
+    """Handle /stats [1h|24h|7d] - rolling transfer totals by token and switch"""
+    window = context.args[0].lower() if context.args else Config.STATS_DEFAULT_WINDOW
+    if window not in Config.STATS_WINDOWS:
+        update.message.reply_text(f"Usage: /stats [{'|'.join(Config.STATS_WINDOWS)}]")
+        return
+
+    try:
+        now = time.time()
+        counts = {name: sum(row[4] for row in contribution_stats.totals(seconds, now))
+                  for name, seconds in Config.STATS_WINDOWS.items()}
+        rows = contribution_stats.totals(Config.STATS_WINDOWS[window], now)
+        if not rows:
+            update.message.reply_text(f"📊 No transfers in the last {window}")
+            return
+
+        by_token, by_switch = {}, {}
+        for token, symbol, switch, direction, count, amount, usd in rows:
+            totals = by_token.setdefault((symbol, direction), [0, 0.0, 0.0])
+            totals[0] += count
+            totals[1] += amount
+            totals[2] += usd
+            totals = by_switch.setdefault((tracking.wallets.get(switch, switch), direction), [0, 0.0])
+            totals[0] += count
+            totals[1] += usd
+
+        lines = [f"📊 *Transfers - last {window}:*", ' · '.join(f"{name}: `{count}`" for name, count in counts.items()), "",
+                 "🪙 *By token:*"]
+        for (symbol, direction), (count, amount, usd) in sorted(by_token.items(), key=lambda item: -item[1][2]):
+            usd_text = f" ≈ `${usd:,.2f}`" if usd else ""
+            lines.append(f"• `{symbol}` {direction}: `{count}` transfers, `{amount:,.4f}`{usd_text}")
+        lines += ["", "🔀 *By switch:*"]
+        for (label, direction), (count, usd) in sorted(by_switch.items(), key=lambda item: -item[1][1]):
+            usd_text = f" ≈ `${usd:,.2f}`" if usd else ""
+            lines.append(f"• `{label}` {direction}: `{count}` transfers{usd_text}")
+        update.message.reply_text('\n'.join(lines), parse_mode='Markdown')
+    except Exception as e:
+        update.message.reply_text(f"❌ Error reading stats: {str(e)}")
+
+@admin_only
+def deadletters_command(update: Update, context: CallbackContext):
+    """Handle /deadletters [retry|purge] - inspect, requeue or drop Telegram sends that gave up"""
+    try:
+        action = context.args[0].lower() if context.args else 'list'
+
+        if action == 'retry':
+            count = delivery_queue.retry_dead()
+            update.message.reply_text(f"🔁 Requeued {count} dead letter(s)")
+            return
+        if action == 'purge':
+            count = delivery_queue.purge_dead()
+            update.message.reply_text(f"🗑 Purged {count} dead letter(s)")
+            return
+        if action != 'list':
+            update.message.reply_text("Usage: /deadletters [retry|purge]")
+            return
+
+        # Plain text reply: queued messages carry their own Markdown
+        lines = [f"☠️ Dead letters: {delivery_queue.dead_count()} (queued for retry: {delivery_queue.pending()})"]
+        for row_id, chat_id, kind, text, attempts, last_error, created in delivery_queue.dead_letters(Config.DEAD_LETTERS_SHOWN):
+            lines.append(
+                f"• #{row_id} {chat_id} {kind}, {attempts} attempt(s), "
+                f"{time.strftime('%Y-%m-%d %H:%M', time.gmtime(created))} UTC\n  {(last_error or '')[:80]}"
+            )
+            if text:
+                lines.append(f"  {text[:60]}...")
+        update.message.reply_text('\n'.join(lines))
+    except Exception as e:
+        update.message.reply_text(f"❌ Error reading dead letters: {str(e)}")
+
+@admin_only
+def profile_command(update: Update, context: CallbackContext):
+    """Handle /profile [seconds] - sample every thread's stack and reply with a flamegraph-ready document"""
+    try:
+        seconds = float(context.args[0]) if context.args else Config.PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        seconds = 0
+    if not 0 < seconds <= Config.PROFILE_MAX_SECONDS:
+        update.message.reply_text(f"Usage: /profile [seconds] (up to {Config.PROFILE_MAX_SECONDS})")
+        return
+    if profiler.busy():
+        update.message.reply_text("⏳ A profile is already running")
+        return
+
+    # Sampling runs off the webhook thread; the result arrives as a document
+    update.message.reply_text(f"🔬 Profiling all threads for {seconds:g}s...")
+    threading.Thread(target=send_profile, args=(update.effective_chat.id, seconds), daemon=True).start()
+
 def commands_command(update: Update, context: CallbackContext):
     """Handle /commands command"""
     commands_text = (
         "*Available Commands:*\n\n"
-        "`/campaign` - Show current campaign status\n"
+        "`/campaign [name]` - Show current campaign status\n"
         "`/staking` - Get Frictionless staking link\n"
         "`/help` - Link to Frictionless Platform User Guide\n"
         "`/commands` - List all available commands"
@@ -1009,22 +4880,13 @@ def commands_command(update: Update, context: CallbackContext):
     update.message.reply_text(commands_text, parse_mode='Markdown')
 
 def campaign_command(update: Update, context: CallbackContext):
-    """Handle /campaign command - show current campaign status with visual progress"""
+    """Handle /campaign [name] command - show campaign status (this chat's campaigns by default)"""
     try:
         # Check if campaign summary is enabled
         if not ENABLE_CAMPAIGN_SUMMARY:
             update.message.reply_text("No active campaigns currently")
             return
         
-        # Validate campaign address
-        if not CAMPAIGN_ADDRESS or not w3.is_address(CAMPAIGN_ADDRESS):
-            update.message.reply_text("❌ Invalid campaign address configured")
-            return
-
-        # Get campaign balance using safe wrapper
-        bal_wei = safe_web3_call(lambda: w3.eth.get_balance(CAMPAIGN_ADDRESS))
-        bal_eth = w3.from_wei(bal_wei, 'ether')
-        
         # Get ETH price
         price_usd = get_eth_price()
         
@@ -1032,27 +4894,33 @@ def campaign_command(update: Update, context: CallbackContext):
             update.message.reply_text("❌ Could not fetch ETH price for campaign status")
             return
             
-        current_usd = float(bal_eth) * price_usd
-        percent = min(100, (current_usd / CAMPAIGN_TARGET_USD) * 100)
+        if context.args:
+            selected = [campaigns[context.args[0]]] if context.args[0] in campaigns else []
+            if not selected:
+                update.message.reply_text(f"❌ Unknown campaign. Available: {', '.join(campaigns)}")
+                return
+        else:
+            chat_id = str(update.effective_chat.id)
+            selected = [campaign for campaign in campaigns.values() if chat_id in campaign.chat_ids]
+            selected = selected or list(campaigns.values())
 
-        
-        # Choose emoji and status text based on progress
-        status_emoji, status_text = get_status_emoji_and_text(percent)
-
-        status_msg = (
-            f"{status_emoji} *{status_text}*\n\n"
-            f"💰 **Balance:** `{bal_eth:.4f} ETH`\n"
-            f"💵 **Value:** `${current_usd:,.2f}` / `${CAMPAIGN_TARGET_USD:,.2f}`\n"
-            f"📊 **Progress:** `{percent:.1f}%`"
-            
-        )
-        
         # Create proper inline keyboard
         keyboard = [[InlineKeyboardButton("💰 Contribute Here", url="https://app.frictionless.network/contribute")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Use reply_markup parameter
-        update.message.reply_text(status_msg, parse_mode='Markdown', reply_markup=reply_markup)
+
+        for campaign in selected:
+            # Balances are maintained by the scanner, no RPC needed here
+            bal_eth, current_usd, percent, token_lines = campaign.progress(price_usd)
+
+            # Choose emoji and status text based on progress
+            status_emoji, status_text = get_status_emoji_and_text(percent)
+
+            status_msg = build_campaign_status_message(
+                campaign, status_emoji, status_text, bal_eth, token_lines, current_usd, percent
+            )
+
+            # Use reply_markup parameter
+            update.message.reply_text(status_msg, parse_mode='Markdown', reply_markup=reply_markup)
         
     except Exception as e:
         logger.error(f"Error in campaign_command: {e}")
@@ -1095,6 +4963,34 @@ def home():
             'last_checked_block': last_checked
         }
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/profile', methods=['GET'])
+def profile():
+    """Collapsed-stack profile of every thread: GET /profile?seconds=N with "Authorization: Bearer <PROFILE_TOKEN>".
+
+    The request blocks for the whole window, so N is capped at PROFILE_HTTP_MAX_SECONDS
+    (the default window shrinks to fit) to finish before the web server's worker timeout;
+    longer profiles go through the /profile Telegram command.
+    """
+    if not PROFILE_TOKEN:
+        return "not found", 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {PROFILE_TOKEN}"):
+        return "unauthorized", 401
+
+    seconds = request.args.get('seconds', min(Config.PROFILE_DEFAULT_SECONDS, Config.PROFILE_HTTP_MAX_SECONDS), type=float)
+    if not 0 < seconds <= Config.PROFILE_HTTP_MAX_SECONDS:
+        return (f"seconds must be between 0 and {Config.PROFILE_HTTP_MAX_SECONDS} "
+                f"(use /profile in Telegram for longer profiles)"), 400
+    try:
+        stacks, rounds = profiler.sample(seconds)
+    except RuntimeError as e:
+        return str(e), 409
+    return collapsed_stacks(stacks), 200, {'Content-Type': 'text/plain; charset=utf-8', 'X-Profile-Samples': str(rounds)}
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Telegram webhook endpoint"""
@@ -1103,7 +4999,9 @@ def webhook():
             json_data = request.get_json(force=True)
             if json_data:
                 update = Update.de_json(json_data, bot)
-                dispatcher.process_update(update)
+                # Commands jump ahead of scanning, notifications and summaries for RPC and Telegram
+                with work_priority(Priority.INTERACTIVE):
+                    dispatcher.process_update(update)
                 return "ok", 200
             else:
                 logger.warning("Received webhook with no JSON data")
@@ -1123,25 +5021,101 @@ dispatcher.add_handler(CommandHandler("status", status_command))
 dispatcher.add_handler(CommandHandler("config", config_command))
 dispatcher.add_handler(CommandHandler("campaign", campaign_command))
 dispatcher.add_handler(CommandHandler("switches", switches_command))
+dispatcher.add_handler(CommandHandler("addswitch", addswitch_command))
+dispatcher.add_handler(CommandHandler("removeswitch", removeswitch_command))
+dispatcher.add_handler(CommandHandler("exclude", exclude_command))
+dispatcher.add_handler(CommandHandler("unexclude", unexclude_command))
+dispatcher.add_handler(CommandHandler("reloadwallets", reloadwallets_command))
 dispatcher.add_handler(CommandHandler("staking", staking_command))
 dispatcher.add_handler(CommandHandler("uptime", uptime_command))
+dispatcher.add_handler(CommandHandler("ledger", ledger_command))
+dispatcher.add_handler(CommandHandler("top", top_command))
+dispatcher.add_handler(CommandHandler("stats", stats_command))
+dispatcher.add_handler(CommandHandler("deadletters", deadletters_command))
+dispatcher.add_handler(CommandHandler("profile", profile_command))
 dispatcher.add_handler(CommandHandler("commands", commands_command))
 dispatcher.add_handler(CommandHandler("help", help_command))
 
+# Warm caches and the scan position from the last shutdown's snapshot (shard processes keep their own)
+if not CLI_MODE:
+    _snapshot = load_state_snapshot()
+    if _snapshot:
+        _resume_from = warm_start(_snapshot, last_checked)
+        if SCANNER_SHARDS == 0:
+            last_checked = _resume_from
+        checkpoint_scan_position()  # the snapshot is consumed; a crash must not apply it again
+
+# Seed campaign balances before the scanner starts applying deltas
+if not CLI_MODE:
+    try:
+        reconcile_campaigns(last_checked)
+    except Exception as e:
+        logger.error(f"Initial campaign reconciliation failed: {e}")
+
+# Queue depth and scanner lag gauges, read at scrape time
+register_metric(Gauge('bot_ledger_queue_depth', 'Ledger rows waiting to be written', ledger.pending))
+register_metric(Gauge('bot_notification_queue_depth', 'Notifications buffered for coalescing', notification_coalescer.pending))
+register_metric(Gauge('bot_blocks_behind', 'Blocks between chain head and last scanned block',
+                      lambda: max(0, latest_block_seen - last_checked)))
+register_metric(Gauge('bot_last_checked_block', 'Last fully scanned block', lambda: last_checked))
+register_metric(Gauge('bot_blocks_processed', 'Blocks processed since start', lambda: blocks_processed_count))
+register_metric(Gauge('bot_token_cache_size', 'Entries in the token metadata cache', lambda: len(TOKEN_CACHE)))
+register_metric(Gauge('bot_token_price_cache_size', 'Entries in the token USD price cache', lambda: len(token_prices)))
+register_metric(Gauge('bot_stats_series', 'Token/switch/direction series in the rolling /stats rings', lambda: len(contribution_stats)))
+register_metric(Gauge('bot_scheduled_jobs', 'Jobs waiting on the timer wheel', scheduler.pending))
+register_metric(Gauge('bot_telegram_retry_queue_depth', 'Telegram sends waiting for retry', delivery_queue.pending))
+register_metric(Gauge('bot_telegram_dead_letters', 'Telegram sends that gave up', delivery_queue.dead_count))
+
 # Start background threads
-scanner_thread = threading.Thread(target=run_scanner, daemon=True)
-scanner_thread.start()
+ledger.start()
+notification_coalescer.start()
+if not CLI_MODE:
+    delivery_queue.start()  # CLI runs leave their failed sends for the bot process to retry
 
-# Only start summary thread if enabled
-if ENABLE_CAMPAIGN_SUMMARY:
-    summary_thread = threading.Thread(target=run_summary, daemon=True)
-    summary_thread.start()
-else:
-    logger.info("📊 Campaign summary thread disabled")
+async_services = []
+scanner_thread = merger_thread = None
+if START_BACKGROUND_WORKERS and not CLI_MODE:
+    if SCANNER_SHARDS > 0:
+        # Scanning happens in `bot.py scan --shard i/N` processes; this one merges their output
+        shard_coordinator = ShardCoordinator(SHARD_DB_PATH)
+        register_metric(Gauge('bot_shard_outbox_depth', 'Shard outbox events awaiting merge', shard_coordinator.pending))
+        merger_thread = threading.Thread(target=run_shard_merger, daemon=True)
+        merger_thread.start()
+        if campaigns_by_address:
+            # Shards watch switch wallets only; campaign balances follow a campaign-only scan here
+            campaign_scan = TrackingConfig({}, (), campaign_addresses=campaigns_by_address)
+            scanner_thread = threading.Thread(target=run_scanner, kwargs={'config': campaign_scan}, daemon=True)
+            scanner_thread.start()
+    elif ASYNC_MODE:
+        async_services.append(async_scan_loop())
+    else:
+        scanner_thread = threading.Thread(target=run_scanner, args=(checkpoint_scan_position,), daemon=True)
+        scanner_thread.start()
+
+    if ASYNC_MODE:
+        # Summaries and the token price refresh become tasks, staggered like the timer wheel jobs
+        async_services.extend(
+            async_summary_loop(campaign, position * Config.SUMMARY_STAGGER_SECONDS)
+            for position, campaign in enumerate(summary_campaigns())
+        )
+        async_services.append(async_token_price_loop())
+    else:
+        # One timer wheel drives the summaries of every campaign and the token price refresh
+        schedule_campaign_summaries()
+        scheduler.schedule(0, run_token_price_refresh, name='token-prices')
+        scheduler.start()
+elif not CLI_MODE:
+    logger.info("⏸ Background workers disabled via START_BACKGROUND_WORKERS")
+
+if ASYNC_MODE and not CLI_MODE:
+    # Notifications go through the loop even when the background services are disabled
+    async_runtime.start(*async_services)
 
 # Setup webhook
 webhook_url = os.environ.get('WEBHOOK_URL')
-if webhook_url:
+if CLI_MODE:
+    pass  # one-off CLI modes leave the live bot's webhook alone
+elif webhook_url:
     try:
         # Clear any existing webhook first
         bot.delete_webhook()
@@ -1158,7 +5132,15 @@ if webhook_url:
 else:
     logger.warning("⚠️ No WEBHOOK_URL configured")
 
-logger.info("🚀 Frictionless Telegram Bot started successfully")
+if not CLI_MODE:
+    logger.info("🚀 Frictionless Telegram Bot started successfully")
+
+if not CLI_MODE:
+    # Covers interpreter exits that bypass the SIGTERM handler (e.g. a gunicorn worker's graceful exit)
+    atexit.register(shutdown)
 
 if __name__ == '__main__':
+    if CLI_MODE:
+        sys.exit(run_cli(sys.argv[1:]))
+    signal.signal(signal.SIGTERM, handle_sigterm)
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
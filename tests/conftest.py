@@ -0,0 +1,37 @@
+"""Shared fixtures: the bench stand-in node and Bot API, and bot.py imported against them."""
+import os
+import sys
+
+import pytest
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bench')
+sys.path.insert(0, BENCH_DIR)
+
+import fixtures  # noqa: E402
+import run_benchmark  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def chain():
+    """Small synthetic chain with ERC20, ETH and internal (trace-only) transfers to the watched addresses"""
+    return fixtures.synthetic_chain(blocks=12, txs_per_block=30, hit_rate=0.1, internal_rate=0.1)
+
+
+@pytest.fixture(scope='session')
+def stand_ins(chain):
+    process, rpc_url, telegram_url = run_benchmark.start_stand_ins(chain, 0.0)
+    yield rpc_url, telegram_url
+    process.terminate()
+
+
+@pytest.fixture(scope='session')
+def bot(stand_ins, tmp_path_factory):
+    rpc_url, telegram_url = stand_ins
+    data_dir = str(tmp_path_factory.mktemp('bot'))
+    return run_benchmark.import_bot(rpc_url, telegram_url, fixtures.DEFAULT_CAMPAIGN, data_dir, {})
+
+
+@pytest.fixture
+def rpc_calls(stand_ins):
+    """Callable returning the stand-in node's per-method call counts"""
+    return lambda: run_benchmark.fetch_stats(stand_ins[0])
@@ -0,0 +1,124 @@
+"""Internal ETH transfers from the stand-in node's trace_filter / trace_block."""
+import pytest
+
+import fixtures
+
+TRACKED = fixtures.DEFAULT_TRACKED.lower()
+CAMPAIGN = fixtures.DEFAULT_CAMPAIGN.lower()
+
+
+def block_range(chain):
+    numbers = sorted(int(number) for number in chain['blocks'])
+    return numbers[0], numbers[-1]
+
+
+def found_transfers(bot, chain, mode, monkeypatch):
+    monkeypatch.setattr(bot, 'INTERNAL_TRANSFERS', mode)
+    watched = {TRACKED, CAMPAIGN}
+    transactions = bot.fetch_transaction_traces(*block_range(chain), watched)
+    return {
+        (tx_hash, position, sender.lower(), recipient.lower(), value)
+        for tx_hash, (_, traces) in transactions.items()
+        for position, sender, recipient, value in bot.internal_value_transfers(traces)
+        if sender.lower() in watched or recipient.lower() in watched
+    }
+
+
+def expected_transfers(chain):
+    """Payout frames of the fixture that did not revert"""
+    expected = set()
+    for tx_hash, traces in chain['traces'].items():
+        for position, trace in enumerate(traces):
+            if trace['traceAddress'] and not trace.get('error'):
+                action = trace['action']
+                expected.add((tx_hash, position, action['from'].lower(), action['to'].lower(), int(action['value'], 16)))
+    return expected
+
+
+def test_trace_filter_and_trace_block_agree(bot, chain, monkeypatch):
+    by_filter = found_transfers(bot, chain, 'trace_filter', monkeypatch)
+    by_block = found_transfers(bot, chain, 'trace_block', monkeypatch)
+
+    assert by_filter == by_block == expected_transfers(chain)
+    assert by_filter  # the fixture has internal payouts to both watched addresses
+
+
+def test_reverted_payouts_are_skipped(bot, chain, monkeypatch):
+    reverted = {tx_hash for tx_hash, traces in chain['traces'].items() if any(t.get('error') for t in traces)}
+    assert reverted
+    assert not {transfer[0] for transfer in found_transfers(bot, chain, 'trace_filter', monkeypatch)} & reverted
+
+
+def frame(path, sender, recipient, value, error=False):
+    trace = {'type': 'call', 'traceAddress': path, 'subtraces': 0,
+             'action': {'callType': 'call', 'from': sender, 'to': recipient, 'value': hex(value)}}
+    if error:
+        trace['error'] = 'Reverted'
+    return trace
+
+
+def test_internal_value_transfers_frames(bot):
+    traces = [
+        frame([], '0xa', TRACKED, 5),           # top level: reported by process_eth_transfer instead
+        frame([0], '0xb', '0xc', 0, error=True),
+        frame([0, 0], '0xc', TRACKED, 7),       # under a reverted frame: moved nothing
+        frame([0, 0, 1], '0xc', TRACKED, 8),
+        frame([1], '0xb', TRACKED, 9),
+        frame([2], '0xb', TRACKED, 0),          # no value
+    ]
+    traces.append({'type': 'call', 'traceAddress': [3], 'subtraces': 0,
+                   'action': {'callType': 'delegatecall', 'from': '0xb', 'to': TRACKED, 'value': '0x1'}})
+
+    assert list(bot.internal_value_transfers(traces)) == [(4, '0xb', TRACKED, 9)]
+
+
+def test_trace_events_use_negative_log_index(bot, monkeypatch):
+    events = []
+    monkeypatch.setattr(bot.notification_coalescer, 'add', events.append)
+    counterparty = '0x00000000000000000000000000000000000000c1'
+    tracked = bot.w3.to_checksum_address(fixtures.DEFAULT_TRACKED)
+
+    bot.record_eth_transfer(counterparty, tracked, 10 ** 18, '0x' + 'ab' * 32, 1, 1_700_000_000, source='eth')
+    bot.record_eth_transfer(counterparty, tracked, 10 ** 18, '0x' + 'ab' * 32, 1, 1_700_000_000,
+                            source='trace', log_index=0)
+    bot.record_eth_transfer(counterparty, tracked, 10 ** 18, '0x' + 'ab' * 32, 1, 1_700_000_000,
+                            source='trace', log_index=3)
+
+    # One outbox key space with ERC20 logs (>= 0): top-level ETH is -1, trace position p is -2 - p
+    assert [event['log_index'] for event in events] == [-1, -2, -5]
+
+
+def test_rate_limited_trace_fails_the_range(bot, chain, monkeypatch):
+    monkeypatch.setattr(bot, 'INTERNAL_TRANSFERS', 'trace_filter')
+    monkeypatch.setattr(bot.Config, 'RATE_LIMIT_COOLDOWN', 0)
+
+    def throttled(tx_hash):
+        raise ValueError('429 Too Many Requests')
+
+    # safe_web3_call gives up on the rate limit and returns None; that must not pass for "no traces"
+    monkeypatch.setattr(bot.w3.tracing, 'trace_transaction', throttled)
+    with pytest.raises(RuntimeError):
+        bot.fetch_transaction_traces(*block_range(chain), {TRACKED, CAMPAIGN})
+
+
+def test_failed_range_is_retried(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'INTERNAL_TRANSFERS', 'trace_filter')
+    monkeypatch.setattr(bot, 'pending_internal_ranges', [])
+    config = bot.TrackingConfig({}, ())  # no campaign token stage
+    scanned = []
+    failing = [True]
+
+    def scan(start, end, config=None):
+        scanned.append((start, end))
+        if failing[0]:
+            raise RuntimeError('trace_filter still rate limited after retries')
+
+    monkeypatch.setattr(bot, 'scan_internal_transfers', scan)
+    bot.scan_range_stages(10, 19, config)
+    bot.scan_range_stages(20, 29, config)
+    assert bot.pending_internal_ranges == [(10, 29)]  # adjacent failures merge
+
+    failing[0] = False
+    bot.scan_range_stages(30, 39, config)
+    assert scanned[-2:] == [(10, 29), (30, 39)]
+    assert bot.pending_internal_ranges == []
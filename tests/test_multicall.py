@@ -0,0 +1,71 @@
+"""MulticallReader against the stand-in node's Multicall3 (aggregate3 / getEthBalance)."""
+import fixtures
+from web3 import Web3
+
+# The bot only passes checksummed addresses to web3
+TOKEN, WETH, USDC = (Web3.to_checksum_address(address) for address in (fixtures.DEFAULT_TOKEN, fixtures.WETH, fixtures.USDC))
+CAMPAIGN = Web3.to_checksum_address(fixtures.DEFAULT_CAMPAIGN)
+TRACKED = fixtures.DEFAULT_TRACKED
+NOT_A_TOKEN = Web3.to_checksum_address('0x00000000000000000000000000000000000bad01')
+
+
+def test_token_metadata_partial_failure(bot):
+    metadata = bot.multicall.token_metadata([TOKEN, WETH, NOT_A_TOKEN])
+
+    assert metadata[TOKEN] == {'symbol': 'BENCH', 'decimals': 6}
+    assert metadata[WETH] == {'symbol': 'WETH', 'decimals': 18}
+    # allowFailure: the reverting target only empties its own slots
+    assert metadata[NOT_A_TOKEN] == {'symbol': None, 'decimals': None}
+
+
+def test_balances(bot):
+    balances = bot.multicall.eth_balances([CAMPAIGN, TRACKED])
+    assert balances == {CAMPAIGN: 5 * 10 ** 18, TRACKED: 0}
+
+    pairs = [(TOKEN, CAMPAIGN), (NOT_A_TOKEN, CAMPAIGN)]
+    assert bot.multicall.token_balances(pairs) == {pairs[0]: 10 ** 9, pairs[1]: None}
+
+
+def test_batches_by_configured_size(bot, rpc_calls, monkeypatch):
+    monkeypatch.setattr(bot.Config, 'MULTICALL_BATCH_SIZE', 2)
+    tokens = [TOKEN, WETH, USDC, NOT_A_TOKEN, TOKEN]
+    calls = [(token, bot.multicall._encode(bot.multicall.erc20, 'decimals'), bot.multicall._decode_uint)
+             for token in tokens]
+
+    before = rpc_calls().get('eth_call', 0)
+    results = bot.multicall.execute(calls)
+
+    assert results == [6, 18, 6, None, 6]
+    assert rpc_calls()['eth_call'] - before == 3  # ceil(5 / 2) aggregate3 calls
+
+
+def test_single_call_fallback_without_multicall(bot, rpc_calls):
+    reader = bot.MulticallReader(NOT_A_TOKEN)  # no code at this address
+    assert not reader.is_available()
+
+    before = rpc_calls().get('eth_call', 0)
+    metadata = reader.token_metadata([TOKEN, NOT_A_TOKEN])
+
+    assert metadata == {TOKEN: {'symbol': 'BENCH', 'decimals': 6},
+                        NOT_A_TOKEN: {'symbol': None, 'decimals': None}}
+    assert rpc_calls()['eth_call'] - before == 4  # one eth_call per field
+
+
+def test_single_call_fallback_when_aggregate_fails(bot, monkeypatch):
+    monkeypatch.setattr(bot.Config, 'WEB3_RETRY_DELAY', 0)
+    reader = bot.MulticallReader(NOT_A_TOKEN)
+    reader._available = True  # aggregate3 reverts at this address
+
+    assert reader.token_metadata([WETH]) == {WETH: {'symbol': 'WETH', 'decimals': 18}}
+
+
+def test_decode_fallbacks(bot):
+    # bytes32 symbols (e.g. MKR) decode through the fallback
+    assert bot.MulticallReader._decode_symbol(b'MKR'.ljust(32, b'\x00')) == 'MKR'
+
+    def broken(data):
+        raise ValueError('undecodable')
+
+    symbol = bot.multicall._encode(bot.multicall.erc20, 'symbol')
+    results = bot.multicall.execute([(WETH, symbol, broken), (WETH, symbol, bot.MulticallReader._decode_symbol)])
+    assert results == [None, 'WETH']